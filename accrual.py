@@ -0,0 +1,47 @@
+"""Lazy resource accrual.
+
+Production is never swept into the resources table on a timer. Reads derive
+the current balance from the stored balance, last_collected, the production
+rates and the caps; the balance is written back (materialized) only when the
+country's resources are about to change. Accrual happens in whole hours and
+the clock advances by the hours credited, so frequent writes lose nothing.
+"""
+from config import RESOURCE_TYPES, RESOURCE_PRODUCTION, RESOURCE_CAPS, AI_PRODUCTION_MULTIPLIER
+from timeutil import NOW_SQL, HOUR
+
+
+def hours_due(table='resources'):
+    """SQL expression: whole hours of production owed to table's row"""
+    return f"MAX(0, ({NOW_SQL} - {table}.last_collected) / {HOUR})"
+
+def advanced_clock(table='resources'):
+    """SQL expression: last_collected moved forward by the hours credited"""
+    return f"{table}.last_collected + {hours_due(table)} * {HOUR}"
+
+def multiplier(table='resources'):
+    """SQL expression: production multiplier (AI countries produce more)"""
+    return (
+        f"(CASE WHEN (SELECT ac.is_ai_controlled FROM countries ac WHERE ac.id = {table}.country_id) "
+        f"THEN {AI_PRODUCTION_MULTIPLIER} ELSE 1.0 END)"
+    )
+
+def balance(resource, table='resources'):
+    """SQL expression: current balance of resource, including unmaterialized production"""
+    produced = f"CAST({RESOURCE_PRODUCTION[resource]} * {hours_due(table)} * {multiplier(table)} AS INTEGER)"
+    # Balances pushed over the cap (e.g. by tribute) are kept, they just stop growing
+    return f"MAX({table}.{resource}, MIN({table}.{resource} + {produced}, {RESOURCE_CAPS[resource]}))"
+
+def balance_columns(table='r'):
+    """SELECT-list fragment with the current balances named gold, iron, stone, food"""
+    return ', '.join(f"{balance(r, table)} AS {r}" for r in RESOURCE_TYPES)
+
+def materialize_sql(where):
+    """UPDATE statement that writes accrued balances for rows matching where"""
+    assignments = ',\n            '.join(f"{r} = {balance(r)}" for r in RESOURCE_TYPES)
+    return f'''
+        UPDATE resources
+        SET {assignments},
+            last_collected = {advanced_clock()}
+        WHERE {hours_due()} >= 1 AND ({where})
+        RETURNING country_id
+    '''
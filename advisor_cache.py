@@ -0,0 +1,79 @@
+"""Cache of advisor candidate tips.
+
+Each country has a state version that write paths bump after they commit.
+A cached tip list is served only while its version is current and its TTL
+has not run out (the TTL covers inputs no single write owns, such as the
+world's average army level and lazily accrued resources).
+"""
+import threading
+import time
+from collections import OrderedDict
+
+from config import ADVISOR_TIP_CACHE_SIZE, ADVISOR_TIP_CACHE_TTL_SECONDS
+
+
+class TipCache:
+    """Bounded LRU/TTL cache of candidate tips keyed on country state version"""
+
+    def __init__(self, max_entries=ADVISOR_TIP_CACHE_SIZE, ttl_seconds=ADVISOR_TIP_CACHE_TTL_SECONDS):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()  # country_id -> (version, expires_at, tips)
+        self._versions = {}
+        self._epoch = 0  # bumped by bump_all
+        self.hits = 0
+        self.misses = 0
+
+    def version(self, country_id):
+        """Current state version of a country; read it before computing tips"""
+        with self._lock:
+            return (self._epoch, self._versions.get(country_id, 0))
+
+    def get(self, country_id):
+        """Cached candidate tips, or None on a miss"""
+        with self._lock:
+            entry = self._entries.get(country_id)
+            current = (self._epoch, self._versions.get(country_id, 0))
+            if entry is None or entry[0] != current or entry[1] < time.monotonic():
+                if entry is not None:
+                    del self._entries[country_id]
+                self.misses += 1
+                return None
+            self._entries.move_to_end(country_id)
+            self.hits += 1
+            return entry[2]
+
+    def put(self, country_id, tips, version):
+        """Store tips computed from state at version (as returned by version())"""
+        with self._lock:
+            self._entries[country_id] = (version, time.monotonic() + self.ttl_seconds, list(tips))
+            self._entries.move_to_end(country_id)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def bump(self, *country_ids):
+        """Mark countries' state as changed"""
+        with self._lock:
+            for country_id in country_ids:
+                self._versions[country_id] = self._versions.get(country_id, 0) + 1
+
+    def bump_all(self):
+        """Mark every country's state as changed (season reset, bulk collection)"""
+        with self._lock:
+            self._epoch += 1
+            self._entries.clear()
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': self.hits / lookups if lookups else 0.0,
+                'size': len(self._entries),
+                'max_entries': self.max_entries,
+            }
+
+
+tip_cache = TipCache()
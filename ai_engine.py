@@ -0,0 +1,115 @@
+"""Batched AI tick.
+
+The whole world (armies, current resources, active alliances) is loaded once
+into arrays and every AI nation's move is decided in one vectorized pass.
+GameLogic.ai_decision_maker then applies the decisions in a single transaction.
+"""
+import numpy as np
+
+import accrual
+from alliance_index import alliances
+from config import RESOURCE_TYPES, MAX_ARMY_LEVEL, ARMY_UPGRADE_COST
+
+UPGRADE_CHANCE = 0.3
+DIPLOMACY_CHANCE = 0.4
+ATTACK_CHANCE = 0.6
+ALLIANCE_CHANCE = 0.4
+TRIBUTE_CHANCE = 0.2
+TRIBUTE_AMOUNT = 500
+ATTACK_POWER_PER_ENEMY_LEVEL = 60  # attack only if attack_power beats enemy level * this
+TRIBUTE_WEALTH_RATIO = 1.5  # pay tribute to nations this much richer
+
+# Row L holds the cost of upgrading to level L; unreachable levels cost infinity
+UPGRADE_COST_TABLE = np.full((MAX_ARMY_LEVEL + 2, len(RESOURCE_TYPES)), np.inf)
+for _level, _cost in ARMY_UPGRADE_COST.items():
+    UPGRADE_COST_TABLE[_level] = [_cost.get(r, 0) for r in RESOURCE_TYPES]
+
+# Decision kinds
+UPGRADE, WAR, ALLIANCE, TRIBUTE = 'army_upgrade', 'war_declared', 'alliance_proposed', 'tribute_sent'
+
+
+class World:
+    """Column arrays for every country, indexed by position in ids"""
+
+    def __init__(self, rows, alliance_pairs):
+        self.ids = np.array([row['country_id'] for row in rows], dtype=np.int64)
+        self.names = [row['name'] for row in rows]
+        self.is_ai = np.array([bool(row['is_ai_controlled']) for row in rows], dtype=bool)
+        self.level = np.array([row['level'] for row in rows], dtype=np.int64)
+        self.attack_power = np.array([row['attack_power'] for row in rows], dtype=np.int64)
+        self.resources = np.array(
+            [[row[r] for r in RESOURCE_TYPES] for row in rows], dtype=np.int64
+        ).reshape(len(rows), len(RESOURCE_TYPES))
+
+        index = {country_id: i for i, country_id in enumerate(self.ids.tolist())}
+        self.allied = np.zeros((len(rows), len(rows)), dtype=bool)
+        for country1_id, country2_id in alliance_pairs:
+            if country1_id in index and country2_id in index:
+                i, j = index[country1_id], index[country2_id]
+                self.allied[i, j] = self.allied[j, i] = True
+
+    @property
+    def gold(self):
+        return self.resources[:, RESOURCE_TYPES.index('gold')]
+
+
+def load_world(cursor):
+    """Load all army/resources state in one query, alliances from the index"""
+    cursor.execute(f'''
+        SELECT c.id as country_id, c.name, c.is_ai_controlled,
+               a.level, a.attack_power,
+               {accrual.balance_columns('r')}
+        FROM countries c
+        JOIN army a ON c.id = a.country_id
+        JOIN resources r ON c.id = r.country_id
+        ORDER BY c.id
+    ''')
+    return World(cursor.fetchall(), alliances.pairs())
+
+
+def decide(world, rng=None):
+    """Choose at most one action per AI nation.
+
+    Returns a list of (kind, country_index, target_index) in country order;
+    target_index is None for upgrades.
+    """
+    rng = rng if rng is not None else np.random.default_rng()
+    ai = np.flatnonzero(world.is_ai)
+    if ai.size == 0:
+        return []
+    n = world.ids.size
+    rolls = rng.random((ai.size, 5))
+
+    # 1. Upgrade army (30% chance if resources allow)
+    next_level = np.minimum(world.level[ai] + 1, MAX_ARMY_LEVEL + 1)
+    can_afford = (world.resources[ai] >= UPGRADE_COST_TABLE[next_level]).all(axis=1)
+    upgrade = (world.level[ai] < MAX_ARMY_LEVEL) & (rolls[:, 0] < UPGRADE_CHANCE) & can_afford
+
+    # 2. Diplomacy (40% chance) against a random nation that is not an ally
+    candidates = ~world.allied[ai]
+    candidates[np.arange(ai.size), ai] = False
+    keys = np.where(candidates, rng.random((ai.size, n)), -1.0)
+    target = keys.argmax(axis=1)
+    diplomacy = ~upgrade & (rolls[:, 1] < DIPLOMACY_CHANCE) & candidates.any(axis=1)
+
+    stronger = world.attack_power[ai] > world.level[target] * ATTACK_POWER_PER_ENEMY_LEVEL
+    war = diplomacy & stronger & (rolls[:, 2] < ATTACK_CHANCE)
+    alliance = diplomacy & ~war & (rolls[:, 3] < ALLIANCE_CHANCE)
+    tribute = (
+        diplomacy & ~war & ~alliance
+        & (world.gold[target] > world.gold[ai] * TRIBUTE_WEALTH_RATIO)
+        & (rolls[:, 4] < TRIBUTE_CHANCE)
+        & (world.gold[ai] >= TRIBUTE_AMOUNT)
+    )
+
+    decisions = []
+    for k, i in enumerate(ai.tolist()):
+        if upgrade[k]:
+            decisions.append((UPGRADE, i, None))
+        elif war[k]:
+            decisions.append((WAR, i, int(target[k])))
+        elif alliance[k]:
+            decisions.append((ALLIANCE, i, int(target[k])))
+        elif tribute[k]:
+            decisions.append((TRIBUTE, i, int(target[k])))
+    return decisions
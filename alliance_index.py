@@ -0,0 +1,144 @@
+"""In-memory index of active alliances.
+
+The alliances table stays the source of truth: the index is loaded from it
+once and every insert/end goes through here, which writes the row first and
+then updates the adjacency sets. After a rolled-back transaction call
+invalidate() so the next lookup reloads from the table.
+"""
+import threading
+
+from database import get_db_connection
+from timeutil import NOW_SQL
+
+
+class AllianceIndex:
+    """Adjacency sets of active alliances with write-through persistence"""
+
+    def __init__(self):
+        self._lock = threading.RLock()
+        self._allies = {}    # country_id -> {ally_id: alliance_id}
+        self._members = {}   # alliance_id -> (country1_id, country2_id)
+        self._loaded = False
+
+    def _ensure_loaded(self):
+        if not self._loaded:
+            self.load(get_db_connection().cursor())
+
+    def load(self, cursor):
+        """(Re)build the index from the active rows of the alliances table"""
+        cursor.execute('SELECT id, country1_id, country2_id FROM alliances WHERE end_date IS NULL')
+        with self._lock:
+            self._allies = {}
+            self._members = {}
+            for alliance_id, country1_id, country2_id in cursor.fetchall():
+                self._link(alliance_id, country1_id, country2_id)
+            self._loaded = True
+
+    def invalidate(self):
+        """Drop the index; it is reloaded on next use"""
+        with self._lock:
+            self._loaded = False
+
+    def _link(self, alliance_id, country1_id, country2_id):
+        self._members[alliance_id] = (country1_id, country2_id)
+        self._allies.setdefault(country1_id, {})[country2_id] = alliance_id
+        self._allies.setdefault(country2_id, {})[country1_id] = alliance_id
+
+    def _unlink(self, alliance_id):
+        country1_id, country2_id = self._members.pop(alliance_id)
+        self._allies.get(country1_id, {}).pop(country2_id, None)
+        self._allies.get(country2_id, {}).pop(country1_id, None)
+
+    # ---- reads ----
+
+    def are_allied(self, country1_id, country2_id):
+        return self.alliance_between(country1_id, country2_id) is not None
+
+    def alliance_between(self, country1_id, country2_id):
+        """Id of the active alliance between two countries, or None"""
+        with self._lock:
+            self._ensure_loaded()
+            return self._allies.get(country1_id, {}).get(country2_id)
+
+    def allies(self, country_id):
+        """{ally_id: alliance_id} for every active ally of country_id"""
+        with self._lock:
+            self._ensure_loaded()
+            return dict(self._allies.get(country_id, {}))
+
+    def ally_count(self, country_id):
+        with self._lock:
+            self._ensure_loaded()
+            return len(self._allies.get(country_id, {}))
+
+    def members(self, alliance_id):
+        """(country1_id, country2_id) of an active alliance, or None"""
+        with self._lock:
+            self._ensure_loaded()
+            return self._members.get(alliance_id)
+
+    def pairs(self):
+        """All active alliances as (country1_id, country2_id) tuples"""
+        with self._lock:
+            self._ensure_loaded()
+            return list(self._members.values())
+
+    # ---- writes ----
+
+    def add(self, cursor, country1_id, country2_id):
+        """Persist a new alliance and index it; returns the alliance id"""
+        with self._lock:
+            self._ensure_loaded()
+            # Reforming an alliance reuses the row of the ended one (country pairs are unique)
+            cursor.execute(f'''
+                INSERT INTO alliances (country1_id, country2_id)
+                VALUES (?, ?)
+                ON CONFLICT (country1_id, country2_id)
+                DO UPDATE SET start_date = {NOW_SQL}, end_date = NULL, broken_by = NULL
+                RETURNING id
+            ''', (country1_id, country2_id))
+            alliance_id = cursor.fetchone()[0]
+            self._link(alliance_id, country1_id, country2_id)
+            return alliance_id
+
+    def end(self, cursor, alliance_ids, broken_by=None):
+        """End the given active alliances; returns their (country1_id, country2_id) pairs"""
+        alliance_ids = list(alliance_ids)
+        if not alliance_ids:
+            return []
+        with self._lock:
+            self._ensure_loaded()
+            placeholders = ', '.join('?' * len(alliance_ids))
+            cursor.execute(f'''
+                UPDATE alliances
+                SET end_date = {NOW_SQL}, broken_by = ?
+                WHERE id IN ({placeholders}) AND end_date IS NULL
+            ''', (broken_by, *alliance_ids))
+            ended = []
+            for alliance_id in alliance_ids:
+                if alliance_id in self._members:
+                    ended.append(self._members[alliance_id])
+                    self._unlink(alliance_id)
+            return ended
+
+    def end_involving(self, cursor, country_ids, broken_by=None):
+        """End every active alliance any of country_ids belongs to"""
+        with self._lock:
+            self._ensure_loaded()
+            alliance_ids = {
+                alliance_id
+                for country_id in country_ids
+                for alliance_id in self._allies.get(country_id, {}).values()
+            }
+            return self.end(cursor, sorted(alliance_ids), broken_by)
+
+    def end_all(self, cursor):
+        """End every active alliance (season reset)"""
+        with self._lock:
+            cursor.execute(f'UPDATE alliances SET end_date = {NOW_SQL} WHERE end_date IS NULL')
+            self._allies = {}
+            self._members = {}
+            self._loaded = True
+
+
+alliances = AllianceIndex()
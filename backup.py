@@ -0,0 +1,202 @@
+"""Online backups through the SQLite backup API.
+
+    python backup.py [DEST_DIR] [--keep N] [--every SECONDS]
+
+The copy is taken PAGES_PER_STEP pages at a time with a pause between
+steps. Each step is a short read transaction and, in WAL mode, readers
+never block the writer, so the AI tick and collect_resources keep running
+during a backup. If another connection writes between two steps, SQLite
+restarts the copy. After MAX_RESTARTS restarts the rest is copied in one
+step, which is still only a read.
+
+Every copy is written to a .part file, checked with PRAGMA integrity_check,
+and only then renamed into place. The newest `keep` copies of each database
+are kept.
+"""
+import argparse
+import glob
+import logging
+import os
+import sqlite3
+import sys
+import threading
+import time
+from collections import namedtuple
+
+from season_archive import ARCHIVE_PATH
+
+logger = logging.getLogger(__name__)
+
+# database.DB_PATH; not imported because importing database migrates the schema
+DB_PATH = 'game.db'
+
+BACKUP_DIR = 'backups'
+PAGES_PER_STEP = 256
+STEP_PAUSE = 0.05  # seconds between steps
+MAX_RESTARTS = 3
+KEEP = 7
+
+BackupResult = namedtuple('BackupResult', 'source path pages seconds restarts ok')
+
+
+class _CopyRest(Exception):
+    """Raised from the progress callback to stop stepping and copy the rest at once"""
+
+
+class _Progress:
+    """backup() progress callback: pauses between steps and counts restarts"""
+
+    def __init__(self, pause):
+        self.pause = pause
+        self.pages = 0
+        self.restarts = 0
+        self._remaining = None
+
+    def __call__(self, status, remaining, total):
+        if self._remaining is not None and remaining > self._remaining:
+            self.restarts += 1  # the source changed under us and the copy started over
+        self._remaining = remaining
+        self.pages = total
+        logger.debug("Backup progress: %d/%d pages", total - remaining, total)
+        if remaining and self.restarts < MAX_RESTARTS:
+            time.sleep(self.pause)
+        elif remaining:
+            raise _CopyRest()
+
+
+def _copy(src, dst, pages, pause):
+    progress = _Progress(pause)
+    try:
+        src.backup(dst, pages=pages, progress=progress)
+    except _CopyRest:
+        src.backup(dst, pages=-1)
+    return progress
+
+
+def integrity_ok(path):
+    conn = sqlite3.connect(f'file:{path}?mode=ro', uri=True)
+    try:
+        return conn.execute('PRAGMA integrity_check').fetchone()[0] == 'ok'
+    finally:
+        conn.close()
+
+
+def backup(source=DB_PATH, dest_dir=BACKUP_DIR, pages=PAGES_PER_STEP, pause=STEP_PAUSE):
+    """Copy source into dest_dir as <name>-<UTC time>.db; returns a BackupResult
+
+    A copy that fails the integrity check is deleted and reported with ok=False.
+    """
+    os.makedirs(dest_dir, exist_ok=True)
+    name = os.path.splitext(os.path.basename(source))[0]
+    path = os.path.join(dest_dir, f"{name}-{time.strftime('%Y%m%d-%H%M%S', time.gmtime())}.db")
+    partial = f'{path}.part'
+
+    started = time.monotonic()
+    src = sqlite3.connect(f'file:{source}?mode=ro', uri=True)
+    dst = sqlite3.connect(partial)
+    try:
+        progress = _copy(src, dst, pages, pause)
+        # The copy inherits WAL mode; make it a self-contained single file
+        dst.execute('PRAGMA journal_mode = DELETE')
+    except Exception:
+        dst.close()
+        os.remove(partial)
+        raise
+    finally:
+        dst.close()
+        src.close()
+
+    ok = integrity_ok(partial)
+    if ok:
+        os.replace(partial, path)
+    else:
+        os.remove(partial)
+        path = None
+    result = BackupResult(source, path, progress.pages, time.monotonic() - started, progress.restarts, ok)
+    if ok:
+        logger.info("Backed up %s to %s: %d pages in %.2fs (%d restart(s))",
+                    source, path, result.pages, result.seconds, result.restarts)
+    else:
+        logger.error("Backup of %s failed its integrity check", source)
+    return result
+
+
+def prune(source=DB_PATH, dest_dir=BACKUP_DIR, keep=KEEP):
+    """Delete all but the newest keep copies of source; returns the deleted paths"""
+    name = os.path.splitext(os.path.basename(source))[0]
+    # Timestamps sort lexically, so the oldest copies come first
+    copies = sorted(glob.glob(os.path.join(dest_dir, f'{name}-*.db')))
+    stale = copies[:-keep] if keep else copies
+    for path in stale:
+        os.remove(path)
+    return stale
+
+
+def backup_all(sources=(DB_PATH, ARCHIVE_PATH), dest_dir=BACKUP_DIR, keep=KEEP):
+    """Back up and prune every existing source; returns the BackupResults"""
+    results = []
+    for source in sources:
+        if not os.path.exists(source):
+            continue
+        result = backup(source, dest_dir)
+        if result.ok:
+            prune(source, dest_dir, keep)
+        results.append(result)
+    return results
+
+
+class BackupScheduler:
+    """Daemon thread running backup_all every interval seconds"""
+
+    def __init__(self, interval, dest_dir=BACKUP_DIR, keep=KEEP, sources=(DB_PATH, ARCHIVE_PATH)):
+        self.interval = interval
+        self.dest_dir = dest_dir
+        self.keep = keep
+        self.sources = sources
+        self.last_results = []
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name='backup', daemon=True)
+            self._thread.start()
+        return self
+
+    def stop(self, timeout=None):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+            self._thread = None
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            try:
+                self.last_results = backup_all(self.sources, self.dest_dir, self.keep)
+            except Exception:
+                logger.exception("Scheduled backup failed")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Online backup of the game databases')
+    parser.add_argument('dest_dir', nargs='?', default=BACKUP_DIR)
+    parser.add_argument('--keep', type=int, default=KEEP)
+    parser.add_argument('--every', type=float, help='keep running, backing up every SECONDS')
+    args = parser.parse_args(argv)
+    logging.basicConfig(level=logging.INFO)
+
+    if args.every:
+        scheduler = BackupScheduler(args.every, args.dest_dir, args.keep).start()
+        try:
+            while True:
+                time.sleep(3600)
+        except KeyboardInterrupt:
+            scheduler.stop()
+        return 0
+
+    results = backup_all(dest_dir=args.dest_dir, keep=args.keep)
+    return 0 if all(result.ok for result in results) else 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -14,6 +14,8 @@ OWNER_TELEGRAM_ID = 8588773170
 SEASON_DURATION_DAYS = 30
 ADVISOR_TIP_INTERVAL_HOURS = 6
 AI_ACTION_INTERVAL_MINUTES = 30
+ADVISOR_TIP_CACHE_SIZE = 1024  # countries whose candidate tips are cached
+ADVISOR_TIP_CACHE_TTL_SECONDS = 300
 
 # Country definitions with unique bonuses
 COUNTRIES = [
@@ -34,7 +36,9 @@ COUNTRIES = [
 # Resource configuration
 RESOURCE_TYPES = ['gold', 'iron', 'stone', 'food']
 STARTING_RESOURCES = {'gold': 1000, 'iron': 500, 'stone': 500, 'food': 1500}
-RESOURCE_PRODUCTION = {'gold': 50, 'iron': 30, 'stone': 30, 'food': 100}
+RESOURCE_PRODUCTION = {'gold': 50, 'iron': 30, 'stone': 30, 'food': 100}  # per hour
+RESOURCE_CAPS = {'gold': 1000000, 'iron': 500000, 'stone': 500000, 'food': 2000000}
+AI_PRODUCTION_MULTIPLIER = 1.2  # AI collects 1.2x resources
 
 # Army configuration
 MAX_ARMY_LEVEL = 10
@@ -0,0 +1,89 @@
+"""Per-country war counters kept in daily buckets.
+
+declare_war and friends record into country_counters as they write their
+events, so rolling-window stats read at most WINDOW_DAYS rows by primary key
+instead of scanning the events table. Buckets older than the window are
+pruned as new ones are written. The table is created and backfilled by a
+migration in database.py.
+"""
+import events
+from timeutil import NOW_SQL, DAY, ago_sql
+
+WINDOW_DAYS = 30
+
+# Current day number (days since the Unix epoch, UTC)
+TODAY_SQL = f"({NOW_SQL} / {DAY})"
+
+COUNTER_COLUMNS = ('attacks_launched', 'attacks_received', 'alliances_formed', 'betrayals')
+
+
+def create_table(cursor):
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS country_counters (
+            country_id INTEGER NOT NULL,
+            day INTEGER NOT NULL,  -- days since epoch
+            attacks_launched INTEGER NOT NULL DEFAULT 0,
+            attacks_received INTEGER NOT NULL DEFAULT 0,
+            alliances_formed INTEGER NOT NULL DEFAULT 0,
+            betrayals INTEGER NOT NULL DEFAULT 0,
+            PRIMARY KEY (country_id, day),
+            FOREIGN KEY (country_id) REFERENCES countries(id)
+        ) WITHOUT ROWID
+    ''')
+
+
+def backfill(cursor):
+    """Rebuild the buckets inside the window from the events table"""
+    cursor.execute('DELETE FROM country_counters')
+    for column, event_type, country_column in (
+        ('attacks_launched', events.WAR, 'country1_id'),
+        ('attacks_received', events.WAR, 'country2_id'),
+        ('alliances_formed', events.ALLIANCE, 'country1_id'),
+        ('alliances_formed', events.ALLIANCE, 'country2_id'),
+        ('betrayals', events.BETRAYAL, 'country1_id'),
+    ):
+        cursor.execute(f'''
+            INSERT INTO country_counters (country_id, day, {column})
+            SELECT {country_column}, timestamp / {DAY} AS day, COUNT(*)
+            FROM events
+            WHERE event_type = ? AND {country_column} IS NOT NULL
+              AND timestamp > {ago_sql(WINDOW_DAYS * DAY)}
+            GROUP BY {country_column}, day
+            ON CONFLICT (country_id, day) DO UPDATE SET {column} = {column} + excluded.{column}
+        ''', (event_type,))
+
+
+def _increment(cursor, country_id, column):
+    cursor.execute(f'''
+        INSERT INTO country_counters (country_id, day, {column})
+        VALUES (?, {TODAY_SQL}, 1)
+        ON CONFLICT (country_id, day) DO UPDATE SET {column} = {column} + 1
+    ''', (country_id,))
+    cursor.execute(f'''
+        DELETE FROM country_counters
+        WHERE country_id = ? AND day <= {TODAY_SQL} - {WINDOW_DAYS}
+    ''', (country_id,))
+
+
+def record_war(cursor, attacker_id, defender_id):
+    _increment(cursor, attacker_id, 'attacks_launched')
+    _increment(cursor, defender_id, 'attacks_received')
+
+
+def record_alliance(cursor, country1_id, country2_id):
+    _increment(cursor, country1_id, 'alliances_formed')
+    _increment(cursor, country2_id, 'alliances_formed')
+
+
+def record_betrayal(cursor, breaker_id):
+    _increment(cursor, breaker_id, 'betrayals')
+
+
+def window_totals(cursor, country_id, days=WINDOW_DAYS):
+    """{counter: total} over the last `days` daily buckets (days <= WINDOW_DAYS)"""
+    cursor.execute(f'''
+        SELECT {', '.join(f'COALESCE(SUM({c}), 0)' for c in COUNTER_COLUMNS)}
+        FROM country_counters
+        WHERE country_id = ? AND day > {TODAY_SQL} - ?
+    ''', (country_id, days))
+    return dict(zip(COUNTER_COLUMNS, cursor.fetchone()))
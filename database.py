@@ -1,15 +1,73 @@
 import sqlite3
-import os
+import threading
 from datetime import datetime
 from config import COUNTRIES
+import counters
+import events
+import season_archive
+from migrations import migrate, rebuild_with_epoch_columns, high_water, restore_high_water
+from timeutil import NOW_SQL
+from writer import WriteQueue
 
 DB_PATH = 'game.db'
 
+# Applied to every connection handed out by get_db_connection
+CONNECTION_PRAGMAS = (
+    'PRAGMA journal_mode = WAL',       # readers never wait for the writer
+    'PRAGMA synchronous = NORMAL',     # safe with WAL, avoids an fsync per commit
+    'PRAGMA cache_size = -16000',      # ~16 MB page cache per connection
+    'PRAGMA mmap_size = 268435456',    # 256 MB memory-mapped reads
+    'PRAGMA busy_timeout = 5000',      # wait up to 5s for the write lock
+    'PRAGMA temp_store = MEMORY',
+)
+STATEMENT_CACHE_SIZE = 256
+
+# Secondary indexes, one per hot access path (checked by query_plans.py)
+INDEXES = (
+    # Advisor attack counts: event_type = WAR AND country2_id = ? AND timestamp > ?,
+    # and the batch version grouped by country2_id
+    'CREATE INDEX IF NOT EXISTS idx_events_type_target_time ON events (event_type, country2_id, timestamp)',
+    # Counter backfill grouped by the acting country
+    'CREATE INDEX IF NOT EXISTS idx_events_type_actor_time ON events (event_type, country1_id, timestamp)',
+    # Only active alliances are ever read; ended rows stay out of the index
+    'CREATE INDEX IF NOT EXISTS idx_alliances_active ON alliances (country1_id, country2_id) WHERE end_date IS NULL',
+    'CREATE INDEX IF NOT EXISTS idx_alliances_active_c2 ON alliances (country2_id, country1_id) WHERE end_date IS NULL',
+    # Players of a country (advisor, season winner), in id order within a country
+    'CREATE INDEX IF NOT EXISTS idx_players_country ON players (country_id)',
+)
+
+# Timestamp columns stored as integer epoch seconds (migration 4)
+EPOCH_COLUMNS = {
+    'players': ('joined_at', 'last_active'),
+    'countries': ('created_at',),
+    'army': ('last_upgrade',),
+    'resources': ('last_collected',),
+    'alliances': ('start_date', 'end_date'),
+    'events': ('timestamp',),
+    'seasons': ('start_time', 'end_time'),
+}
+
+_local = threading.local()
+_schema_lock = threading.Lock()
+_schema_ready = False
+
 def init_db():
-    """Initialize database with all required tables"""
+    """Bring the database schema up to date (a single SELECT when it already is)"""
     conn = sqlite3.connect(DB_PATH)
+    try:
+        migrate(conn, 'game', MIGRATIONS)
+    finally:
+        conn.close()
+
+def _create_tables(conn, db):
+    """Migration 1: base tables and seed rows"""
     cursor = conn.cursor()
     
+    # main.py's schema has its own players/countries tables under the same names
+    columns = [row[1] for row in cursor.execute('PRAGMA table_info(players)')]
+    if columns and 'telegram_id' not in columns:
+        raise RuntimeError(f"{DB_PATH} holds the bot schema (main.py); give the game logic its own database file")
+    
     # Players table
     cursor.execute('''
         CREATE TABLE IF NOT EXISTS players (
@@ -107,53 +165,168 @@ def init_db():
         )
     ''')
     
-    # Insert default countries if not exists
-    cursor.execute('SELECT COUNT(*) FROM countries')
-    if cursor.fetchone()[0] == 0:
-        for country in COUNTRIES:
-            cursor.execute('''
-                INSERT INTO countries (name, is_ai_controlled, unique_bonus, bonus_description)
-                VALUES (?, ?, ?, ?)
-            ''', (country['name'], True, country['bonus'], country['bonus_desc']))
+    # Default countries (names are unique, so existing ones are kept)
+    cursor.executemany('''
+        INSERT OR IGNORE INTO countries (name, is_ai_controlled, unique_bonus, bonus_description)
+        VALUES (?, ?, ?, ?)
+    ''', [(country['name'], True, country['bonus'], country['bonus_desc']) for country in COUNTRIES])
     
-    # Insert owner player if not exists
-    cursor.execute('SELECT COUNT(*) FROM players WHERE telegram_id = ?', (8588773170,))
-    if cursor.fetchone()[0] == 0:
-        cursor.execute('''
-            INSERT INTO players (telegram_id, username, is_owner)
-            VALUES (?, ?, ?)
-        ''', (8588773170, 'BotOwner', True))
-    
-    # Initialize army and resources for all countries
-    cursor.execute('SELECT id FROM countries')
-    country_ids = [row[0] for row in cursor.fetchall()]
-    
-    for country_id in country_ids:
-        # Army
-        cursor.execute('SELECT COUNT(*) FROM army WHERE country_id = ?', (country_id,))
-        if cursor.fetchone()[0] == 0:
-            cursor.execute('''
-                INSERT INTO army (country_id, level, attack_power, defense, speed)
-                VALUES (?, 1, 50, 50, 50)
-            ''', (country_id,))
-        
-        # Resources
-        cursor.execute('SELECT COUNT(*) FROM resources WHERE country_id = ?', (country_id,))
-        if cursor.fetchone()[0] == 0:
-            cursor.execute('''
-                INSERT INTO resources (country_id, gold, iron, stone, food)
-                VALUES (?, 1000, 500, 500, 1500)
-            ''', (country_id,))
+    # Owner player
+    cursor.execute('''
+        INSERT OR IGNORE INTO players (telegram_id, username, is_owner)
+        VALUES (?, ?, ?)
+    ''', (8588773170, 'BotOwner', True))
     
-    conn.commit()
-    conn.close()
+    # Army and resources for every country that has none yet
+    cursor.execute('''
+        INSERT OR IGNORE INTO army (country_id, level, attack_power, defense, speed)
+        SELECT id, 1, 50, 50, 50 FROM countries
+    ''')
+    cursor.execute('''
+        INSERT OR IGNORE INTO resources (country_id, gold, iron, stone, food)
+        SELECT id, 1000, 500, 500, 1500 FROM countries
+    ''')
 
-def get_db_connection():
-    """Get a database connection"""
-    conn = sqlite3.connect(DB_PATH)
+def _create_indexes(conn, db):
+    """Migration 2: secondary indexes"""
+    for statement in INDEXES:
+        conn.execute(statement)
+
+def _create_counters(conn, db):
+    """Migration 3: per-country daily counters, backfilled from events"""
+    cursor = conn.cursor()
+    counters.create_table(cursor)
+    counters.backfill(cursor)
+
+def _epoch_timestamps(conn, db):
+    """Migration 4: timestamps as integer epoch seconds"""
+    for table, columns in EPOCH_COLUMNS.items():
+        rebuild_with_epoch_columns(conn, table, columns)
+    _create_indexes(conn, db)
+    # Counters backfilled by migration 3 bucketed text timestamps
+    counters.backfill(conn.cursor())
+
+def _legacy_event_columns():
+    """SELECT list converting a text event log row to the compact columns"""
+    type_code = ' '.join(f"WHEN '{name}' THEN {code}" for name, code in events.TYPE_CODES.items())
+    war_outcome = ' '.join(
+        f"WHEN description LIKE '% and {text} %' THEN {code}"
+        for code, text in events.WAR_RESULTS.items() if code != events.VICTORY
+    )
+    return f'''
+        id,
+        CASE event_type {type_code} ELSE 0 END,
+        CASE WHEN event_type = 'war' THEN CASE {war_outcome} ELSE {events.VICTORY} END END,
+        country1_id,
+        country2_id,
+        CASE event_type
+            WHEN 'army_upgrade' THEN CAST(substr(description, instr(description, 'Level ') + 6) AS INTEGER)
+            WHEN 'tribute' THEN CAST(substr(description, instr(description, ' sent ') + 6) AS INTEGER)
+        END,
+        timestamp,
+        season_id
+    '''
+
+def _compact_events(conn, db):
+    """Migration 5: integer-coded event log, descriptions rendered on read
+
+    Ids stay AUTOINCREMENT and keep their high-water mark, so an id is never
+    reused once a season is archived (exports resume by id).
+    """
+    conn.execute(f'''
+        CREATE TABLE events_compact (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            event_type INTEGER NOT NULL,  -- events.py type code
+            outcome INTEGER,              -- events.py outcome code (wars)
+            country1_id INTEGER,
+            country2_id INTEGER,
+            value INTEGER,                -- army level, tribute amount
+            timestamp INTEGER DEFAULT ({NOW_SQL}),
+            season_id INTEGER,
+            FOREIGN KEY (country1_id) REFERENCES countries(id),
+            FOREIGN KEY (country2_id) REFERENCES countries(id)
+        )
+    ''')
+    conn.execute(f'''
+        INSERT INTO events_compact (id, event_type, outcome, country1_id, country2_id, value, timestamp, season_id)
+        SELECT {_legacy_event_columns()} FROM events
+    ''')
+    seq = high_water(conn, 'events')
+    conn.execute('DROP TABLE events')
+    conn.execute('ALTER TABLE events_compact RENAME TO events')
+    restore_high_water(conn, 'events', seq)
+    _create_indexes(conn, db)
+    # Earlier backfills matched the text event types
+    counters.backfill(conn.cursor())
+
+def _create_season_rollups(conn, db):
+    """Migration 6: per-country season summaries (see season_archive)"""
+    season_archive.create_rollups_table(conn.cursor())
+
+# Append only; the applied count is stored in schema_migrations
+MIGRATIONS = (
+    _create_tables,
+    _create_indexes,
+    _create_counters,
+    _epoch_timestamps,
+    _compact_events,
+    _create_season_rollups,
+)
+
+class PersistentConnection(sqlite3.Connection):
+    """Long-lived per-thread connection; close() only discards uncommitted work"""
+
+    def close(self):
+        if self.in_transaction:
+            self.rollback()
+
+    def shutdown(self):
+        super().close()
+
+
+def _ensure_schema():
+    """Migrate once per process, before the first connection is opened"""
+    global _schema_ready
+    if not _schema_ready:
+        with _schema_lock:
+            if not _schema_ready:
+                init_db()
+                _schema_ready = True
+
+def _connect():
+    _ensure_schema()
+    conn = sqlite3.connect(
+        DB_PATH,
+        factory=PersistentConnection,
+        cached_statements=STATEMENT_CACHE_SIZE,
+    )
     conn.row_factory = sqlite3.Row
+    for pragma in CONNECTION_PRAGMAS:
+        conn.execute(pragma)
+    return conn
+
+def _connect_writer():
+    conn = _connect()
+    # Finished seasons are moved into the archive by the writer
+    season_archive.attach(conn)
     return conn
 
-# Initialize DB on import
-if not os.path.exists(DB_PATH):
-    init_db()
\ No newline at end of file
+def get_db_connection():
+    """Get this thread's database connection (opened once, WAL mode)"""
+    conn = getattr(_local, 'conn', None)
+    if conn is None:
+        conn = _local.conn = _connect()
+    return conn
+
+# The only connection that writes; GameLogic mutations are submitted to it
+writer = WriteQueue(_connect_writer, name='game-writer')
+
+def close_db_connection():
+    """Really close this thread's connection, e.g. when a worker thread exits"""
+    conn = getattr(_local, 'conn', None)
+    if conn is not None:
+        conn.shutdown()
+        _local.conn = None
+
+if __name__ == '__main__':
+    init_db()
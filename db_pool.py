@@ -0,0 +1,267 @@
+import itertools
+import logging
+import sqlite3
+import threading
+import time
+import weakref
+from collections import OrderedDict
+from contextlib import contextmanager
+from functools import lru_cache
+
+logger = logging.getLogger(__name__)
+
+# Seconds a connection may sit idle before it is pinged on the next borrow
+HEALTH_CHECK_INTERVAL = 30
+
+# Prepared statements kept per connection (SQLite statement cache / PostgreSQL PREPARE)
+STATEMENT_CACHE_SIZE = 256
+
+PREPARABLE_VERBS = ('SELECT', 'INSERT', 'UPDATE', 'DELETE')
+
+
+@lru_cache(maxsize=STATEMENT_CACHE_SIZE)
+def translate_placeholders(query, style='pyformat'):
+    """Rewrite qmark (?) placeholders to psycopg2 (%s) or PREPARE ($n) style.
+
+    Question marks inside quoted literals are left alone and every literal %
+    is escaped for psycopg2. Returns (translated_query, placeholder_count).
+    """
+    out = []
+    count = 0
+    quote = None
+    for ch in query:
+        if ch == '%' and style == 'pyformat':
+            out.append('%%')
+        elif quote:
+            out.append(ch)
+            if ch == quote:
+                quote = None
+        elif ch in ("'", '"'):
+            quote = ch
+            out.append(ch)
+        elif ch == '?':
+            count += 1
+            out.append('%s' if style == 'pyformat' else f'${count}')
+        else:
+            out.append(ch)
+    return ''.join(out), count
+
+
+class SQLitePool:
+    """One persistent SQLite connection per thread"""
+
+    backend = 'sqlite'
+
+    def __init__(self, path):
+        self.path = path
+        self._local = threading.local()
+
+    def _connect(self):
+        conn = sqlite3.connect(
+            self.path,
+            check_same_thread=False,
+            cached_statements=STATEMENT_CACHE_SIZE,
+        )
+        logger.debug("SQLite connection opened for thread %s", threading.current_thread().name)
+        return conn
+
+    def open_connection(self):
+        """A connection outside the per-thread pool, e.g. for a dedicated writer thread"""
+        return self._connect()
+
+    def _is_healthy(self, conn):
+        try:
+            conn.execute('SELECT 1').fetchone()
+            return True
+        except sqlite3.Error:
+            return False
+
+    @contextmanager
+    def connection(self):
+        """Borrow this thread's connection; nested borrows reuse it"""
+        conn = getattr(self._local, 'conn', None)
+        idle = time.monotonic() - getattr(self._local, 'last_used', 0)
+        if conn is not None and idle > HEALTH_CHECK_INTERVAL and not self._is_healthy(conn):
+            logger.warning("⚠️ SQLite connection failed health check, reconnecting")
+            try:
+                conn.close()
+            except sqlite3.Error:
+                pass
+            conn = None
+        if conn is None:
+            conn = self._connect()
+            self._local.conn = conn
+
+        try:
+            yield conn
+        except Exception:
+            conn.rollback()
+            raise
+        finally:
+            self._local.last_used = time.monotonic()
+
+    def execute(self, conn, query, params=()):
+        """Run a qmark-style query; SQLite caches the compiled statement itself"""
+        cursor = conn.cursor()
+        cursor.execute(query, params)
+        return cursor
+
+    def executemany(self, conn, query, seq_of_params):
+        cursor = conn.cursor()
+        cursor.executemany(query, seq_of_params)
+        return cursor
+
+    def close(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is not None:
+            conn.close()
+            self._local.conn = None
+
+
+class PostgresPool:
+    """Thread-safe PostgreSQL pool with per-connection prepared statements"""
+
+    backend = 'postgres'
+
+    def __init__(self, dsn, maxconn=10):
+        from psycopg2.pool import ThreadedConnectionPool
+
+        # putconn() closes a returned connection once minconn are idle, so keep
+        # them all open: a reconnect costs a fresh TLS handshake
+        self._pool = ThreadedConnectionPool(maxconn, maxconn, dsn, sslmode='require')
+        # ThreadedConnectionPool raises when exhausted; make borrowers wait instead
+        self._slots = threading.BoundedSemaphore(maxconn)
+        self._local = threading.local()
+        # Keyed by the connection itself, so a closed connection's entries go with it
+        self._last_used = weakref.WeakKeyDictionary()
+        self._prepared = weakref.WeakKeyDictionary()
+        self._lock = threading.Lock()
+        self._statement_ids = itertools.count(1)
+        logger.info("✅ PostgreSQL pool ready (%s connections)", maxconn)
+
+    def _is_healthy(self, conn):
+        if conn.closed:
+            return False
+        idle = time.monotonic() - self._last_used.get(conn, 0)
+        if idle <= HEALTH_CHECK_INTERVAL:
+            return True
+        try:
+            with conn.cursor() as cursor:
+                cursor.execute('SELECT 1')
+            conn.rollback()
+            return True
+        except Exception:
+            return False
+
+    def _acquire(self):
+        self._slots.acquire()
+        try:
+            while True:
+                conn = self._pool.getconn()
+                if self._is_healthy(conn):
+                    return conn
+                logger.warning("⚠️ Dropping unhealthy PostgreSQL connection")
+                self._forget(conn)
+                self._pool.putconn(conn, close=True)
+        except Exception:
+            self._slots.release()
+            raise
+
+    def _forget(self, conn):
+        with self._lock:
+            self._last_used.pop(conn, None)
+            self._prepared.pop(conn, None)
+
+    def _release(self, conn, broken=False):
+        if broken or conn.closed:
+            self._forget(conn)
+        else:
+            with self._lock:
+                self._last_used[conn] = time.monotonic()
+        try:
+            self._pool.putconn(conn, close=broken or bool(conn.closed))
+        finally:
+            self._slots.release()
+
+    @contextmanager
+    def connection(self):
+        """Borrow a pooled connection; nested borrows in one thread reuse it"""
+        conn = getattr(self._local, 'conn', None)
+        if conn is not None:
+            yield conn
+            return
+
+        conn = self._acquire()
+        self._local.conn = conn
+        broken = False
+        try:
+            yield conn
+        except Exception:
+            try:
+                conn.rollback()
+            except Exception:
+                broken = True
+            raise
+        finally:
+            self._local.conn = None
+            self._release(conn, broken)
+
+    def _statement_name(self, conn, query):
+        """Name of the server-side prepared statement for query, preparing it if needed"""
+        with self._lock:
+            cache = self._prepared.setdefault(conn, OrderedDict())
+        name = cache.get(query)
+        if name is not None:
+            cache.move_to_end(query)
+            return name
+
+        prepared_query, _ = translate_placeholders(query, style='numeric')
+        name = f"stmt_{next(self._statement_ids)}"
+        with conn.cursor() as cursor:
+            cursor.execute(f'PREPARE {name} AS {prepared_query}')
+        cache[query] = name
+        if len(cache) > STATEMENT_CACHE_SIZE:
+            _, evicted = cache.popitem(last=False)
+            with conn.cursor() as cursor:
+                cursor.execute(f'DEALLOCATE {evicted}')
+        return name
+
+    def execute(self, conn, query, params=()):
+        """Run a qmark-style query, reusing a server-side prepared plan for DML"""
+        cursor = conn.cursor()
+        verb = query.lstrip().split(None, 1)[0].upper() if query.strip() else ''
+        if verb in PREPARABLE_VERBS:
+            name = self._statement_name(conn, query)
+            if params:
+                cursor.execute(f"EXECUTE {name} ({', '.join(['%s'] * len(params))})", params)
+            else:
+                cursor.execute(f'EXECUTE {name}')
+        else:
+            translated, _ = translate_placeholders(query)
+            cursor.execute(translated, params or None)
+        return cursor
+
+    def executemany(self, conn, query, seq_of_params):
+        """Run a qmark-style query once per parameter tuple"""
+        translated, _ = translate_placeholders(query)
+        cursor = conn.cursor()
+        cursor.executemany(translated, seq_of_params)
+        return cursor
+
+    def close(self):
+        self._pool.closeall()
+
+
+def create_pool(database_url, sqlite_path='game.db'):
+    """Build the pool for DATABASE_URL, falling back to SQLite like the old connector"""
+    if database_url and database_url.startswith('postgres'):
+        try:
+            # تبدیل postgres:// به postgresql://
+            return PostgresPool(database_url.replace('postgres://', 'postgresql://'))
+        except ImportError:
+            logger.warning("⚠️ psycopg2 نصب نشده، از SQLite استفاده می‌شود")
+        except Exception as e:
+            logger.error(f"❌ خطا در اتصال به PostgreSQL: {e}")
+
+    logger.info("✅ استفاده از SQLite با اتصال پایدار برای هر thread")
+    return SQLitePool(sqlite_path)
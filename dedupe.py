@@ -0,0 +1,137 @@
+"""Replay filter for Telegram updates.
+
+Telegram redelivers a webhook update whose request timed out, so the same
+update_id (and callback query id) can arrive twice. DedupeWindow remembers
+the most recent keys in a bounded in-memory set and answers "already seen"
+without touching a handler or the database.
+
+With a path, keys are also written to a small SQLite file of their own
+(never game.db, so the writer is not contended), flushed in batches by a
+background thread, and the window is reloaded from it on startup. A key seen
+just before a crash and not yet flushed can be processed once more.
+"""
+import logging
+import sqlite3
+import threading
+from collections import OrderedDict
+
+import timeutil
+
+logger = logging.getLogger(__name__)
+
+WINDOW_SIZE = 10000
+FLUSH_INTERVAL = 1.0  # seconds between writes of new keys to the file
+
+
+def update_keys(update):
+    """Dedupe keys of a telebot Update: its update_id and callback query id"""
+    keys = [f'u:{update.update_id}']
+    if update.callback_query is not None:
+        keys.append(f'c:{update.callback_query.id}')
+    return keys
+
+
+class DedupeWindow:
+    """Bounded set of recently seen keys, optionally persisted to SQLite"""
+
+    def __init__(self, size=WINDOW_SIZE, path=None, flush_interval=FLUSH_INTERVAL):
+        self.size = size
+        self.path = path
+        self.flush_interval = flush_interval
+        self._keys = OrderedDict()  # insertion order = age
+        self._pending = []          # keys not yet flushed to the file
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+        self.duplicates = 0
+        if path:
+            self._load()
+            self._thread = threading.Thread(target=self._run, name='dedupe-flush', daemon=True)
+            self._thread.start()
+
+    def seen(self, *keys):
+        """True if any key was seen before; otherwise record them all and return False"""
+        with self._lock:
+            if any(key in self._keys for key in keys):
+                self.duplicates += 1
+                return True
+            for key in keys:
+                self._keys[key] = None
+                if self.path:
+                    self._pending.append(key)
+            while len(self._keys) > self.size:
+                self._keys.popitem(last=False)
+            return False
+
+    def forget(self, *keys):
+        """Unrecord keys whose update was not accepted, so a redelivery is processed"""
+        with self._lock:
+            for key in keys:
+                self._keys.pop(key, None)
+            self._pending = [key for key in self._pending if key not in keys]
+        if self.path:
+            conn = self._connect()
+            try:
+                conn.executemany('DELETE FROM seen_updates WHERE key = ?', [(key,) for key in keys])
+                conn.commit()
+            finally:
+                conn.close()
+
+    def close(self):
+        if self._thread is not None:
+            self._stop.set()
+            self._thread.join()
+            self._thread = None
+            self.flush()
+
+    # ---- persistence ----
+
+    def _connect(self):
+        conn = sqlite3.connect(self.path)
+        conn.execute('PRAGMA journal_mode = WAL')
+        conn.execute('PRAGMA synchronous = NORMAL')
+        conn.execute('''
+            CREATE TABLE IF NOT EXISTS seen_updates (
+                key TEXT PRIMARY KEY,
+                seen_at INTEGER NOT NULL
+            )
+        ''')
+        return conn
+
+    def _load(self):
+        conn = self._connect()
+        try:
+            rows = conn.execute(
+                'SELECT key FROM seen_updates ORDER BY rowid DESC LIMIT ?', (self.size,)
+            ).fetchall()
+        finally:
+            conn.close()
+        for (key,) in reversed(rows):
+            self._keys[key] = None
+
+    def flush(self):
+        """Write pending keys and drop rows that fell out of the window"""
+        with self._lock:
+            pending, self._pending = self._pending, []
+        if not pending:
+            return
+        conn = self._connect()
+        try:
+            now = timeutil.now()
+            conn.executemany('INSERT OR IGNORE INTO seen_updates (key, seen_at) VALUES (?, ?)',
+                             [(key, now) for key in pending])
+            conn.execute('''
+                DELETE FROM seen_updates WHERE rowid <= (
+                    SELECT rowid FROM seen_updates ORDER BY rowid DESC LIMIT 1 OFFSET ?
+                )
+            ''', (self.size,))
+            conn.commit()
+        finally:
+            conn.close()
+
+    def _run(self):
+        while not self._stop.wait(self.flush_interval):
+            try:
+                self.flush()
+            except Exception:
+                logger.exception("Dedupe flush failed")
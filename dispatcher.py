@@ -0,0 +1,117 @@
+"""Bounded worker pool that keeps each key's items in order.
+
+Items are partitioned by key (a Telegram user or chat id) onto a fixed
+worker, so one player's updates are handled one at a time and in arrival
+order while different players run in parallel. Every worker has a bounded
+queue; when a partition is full, submit() waits up to put_timeout and then
+refuses the item, so the caller can push back (the webhook answers 503 and
+Telegram redelivers later) instead of buffering without limit.
+"""
+import logging
+import queue
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+WORKERS = 8
+CAPACITY = 1024      # queued items across all workers
+PUT_TIMEOUT = 0.5    # seconds submit() waits for room in a full partition
+HIGH_WATER = 0.8     # fraction of capacity that logs a saturation warning
+WARN_INTERVAL = 30   # seconds between saturation warnings
+
+_STOP = object()
+
+
+class OrderedDispatcher:
+    """Per-key ordered, bounded worker pool calling handle(item)"""
+
+    def __init__(self, handle, workers=WORKERS, capacity=CAPACITY, put_timeout=PUT_TIMEOUT, name='dispatcher'):
+        self.handle = handle
+        self.put_timeout = put_timeout
+        self.name = name
+        self.capacity = capacity
+        per_worker = max(1, capacity // workers)
+        self._queues = [queue.Queue(per_worker) for _ in range(workers)]
+        self._threads = []
+        self._lock = threading.Lock()
+        self._last_warning = 0.0
+        self.accepted = 0
+        self.rejected = 0
+        self.processed = 0
+        self.failed = 0
+        self.max_depth = 0
+
+    def start(self):
+        if not self._threads:
+            for index, items in enumerate(self._queues):
+                thread = threading.Thread(target=self._run, args=(items,), name=f'{self.name}-{index}', daemon=True)
+                thread.start()
+                self._threads.append(thread)
+        return self
+
+    # ---- caller side ----
+
+    def submit(self, key, item):
+        """Queue item behind key's earlier items; returns False if the pool is saturated"""
+        items = self._queues[hash(key) % len(self._queues)]
+        try:
+            items.put(item, timeout=self.put_timeout)
+        except queue.Full:
+            with self._lock:
+                self.rejected += 1
+            logger.warning("%s saturated, rejected an item (depth %d)", self.name, self.depth())
+            return False
+
+        depth = self.depth()
+        with self._lock:
+            self.accepted += 1
+            self.max_depth = max(self.max_depth, depth)
+            warn = depth >= self.capacity * HIGH_WATER and time.monotonic() - self._last_warning > WARN_INTERVAL
+            if warn:
+                self._last_warning = time.monotonic()
+        if warn:
+            logger.warning("%s queue depth %d of %d", self.name, depth, self.capacity)
+        return True
+
+    def depth(self):
+        return sum(items.qsize() for items in self._queues)
+
+    def stats(self):
+        """Queue depth and counters, e.g. for the health endpoint"""
+        with self._lock:
+            return {
+                'depth': self.depth(),
+                'capacity': self.capacity,
+                'max_depth': self.max_depth,
+                'worker_depths': [items.qsize() for items in self._queues],
+                'accepted': self.accepted,
+                'rejected': self.rejected,
+                'processed': self.processed,
+                'failed': self.failed,
+            }
+
+    def close(self, timeout=None):
+        """Finish the queued items and stop the workers"""
+        for items in self._queues:
+            items.put(_STOP)
+        for thread in self._threads:
+            thread.join(timeout)
+        self._threads = []
+
+    # ---- worker side ----
+
+    def _run(self, items):
+        while True:
+            item = items.get()
+            if item is _STOP:
+                break
+            try:
+                self.handle(item)
+            except Exception:
+                logger.exception("%s handler failed", self.name)
+                with self._lock:
+                    self.failed += 1
+            else:
+                with self._lock:
+                    self.processed += 1
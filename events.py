@@ -0,0 +1,93 @@
+"""Compact event log.
+
+An events row holds only small integers: the event type, an outcome code,
+the two countries, a numeric value (army level, tribute amount) and the
+epoch timestamp. The English description is rendered from TEMPLATES when
+the event is read (news channel, history), so no text is stored per row.
+
+Codes are persisted: never renumber them, only add new ones.
+"""
+
+# Event types
+ARMY_UPGRADE = 1
+WAR = 2
+ALLIANCE = 3
+TRIBUTE = 4
+BETRAYAL = 5
+SEASON_START = 6
+SEASON_END = 7
+AI_ACTION = 8
+
+# Legacy text event_type -> code (migration of the old text log)
+TYPE_CODES = {
+    'army_upgrade': ARMY_UPGRADE,
+    'war': WAR,
+    'alliance': ALLIANCE,
+    'tribute': TRIBUTE,
+    'betrayal': BETRAYAL,
+    'season_start': SEASON_START,
+    'season_end': SEASON_END,
+    'ai_action': AI_ACTION,
+}
+
+# War outcomes, from the attacker's side
+DECISIVE_VICTORY = 1
+VICTORY = 2
+PYRRHIC_VICTORY = 3
+DEFEAT = 4
+
+WAR_RESULTS = {
+    DECISIVE_VICTORY: 'decisively defeated',
+    VICTORY: 'defeated',
+    PYRRHIC_VICTORY: 'barely defeated',
+    DEFEAT: 'was defeated by',
+}
+
+TEMPLATES = {
+    ARMY_UPGRADE: "{country1} upgraded its army to Level {value}",
+    WAR: "{country1} attacked {country2} and {result} them",
+    ALLIANCE: "{country1} and {country2} formed an alliance",
+    TRIBUTE: "{country1} sent {value} gold tribute to {country2}",
+    BETRAYAL: "{country1} betrayed and broke alliance with {country2}",
+    SEASON_START: "A new season has begun",
+    SEASON_END: "The season has ended",
+    AI_ACTION: "{country1} made a move",
+}
+
+INSERT_SQL = '''
+    INSERT INTO events (event_type, outcome, country1_id, country2_id, value, season_id)
+    VALUES (?, ?, ?, ?, ?, ?)
+'''
+
+RECENT_SQL = '''
+    SELECT id, event_type, outcome, country1_id, country2_id, value, timestamp
+    FROM events
+    ORDER BY id DESC
+    LIMIT ?
+'''
+
+
+def log(cursor, event_type, country1_id=None, country2_id=None, outcome=None, value=None, season_id=None):
+    """Append an event row"""
+    cursor.execute(INSERT_SQL, (event_type, outcome, country1_id, country2_id, value, season_id))
+
+
+def describe(name, event_type, country1_id=None, country2_id=None, outcome=None, value=None):
+    """English description of an event; name maps a country id to its name"""
+    template = TEMPLATES.get(event_type, "Event {type}")
+    return template.format(
+        type=event_type,
+        country1=name(country1_id) if country1_id is not None else '',
+        country2=name(country2_id) if country2_id is not None else '',
+        result=WAR_RESULTS.get(outcome, ''),
+        value=value,
+    )
+
+
+def recent(cursor, name, limit=20):
+    """Latest events, newest first, as (timestamp, description)"""
+    cursor.execute(RECENT_SQL, (limit,))
+    return [
+        (row[6], describe(name, row[1], row[3], row[4], row[2], row[5]))
+        for row in cursor.fetchall()
+    ]
@@ -0,0 +1,230 @@
+"""Streaming export of the game history as gzip-compressed NDJSON.
+
+    python export.py TABLE OUT_DIR [--season N] [--from-id A] [--to-id B] [--state FILE]
+
+Rows are read in key order through a streaming cursor (fetchmany on
+SQLite, a named server-side cursor on PostgreSQL) and written one JSON
+object per line, so memory stays constant whatever the table size. Reads
+go through their own read-only connection and never block the bot; event
+descriptions get their country names from a join on that connection.
+
+With --state, the last exported key is kept in a JSON file and the next run
+starts after it, so the export can run incrementally (e.g. hourly) without
+rescanning. Each table and set of filters (--season, --from-id, --to-id)
+has its own entry, so a filtered run never moves the cursor of an
+unfiltered one. The state only advances once the output file is complete.
+"""
+import argparse
+import contextlib
+import gzip
+import json
+import os
+import sqlite3
+import sys
+from collections import namedtuple
+
+import events
+from db_pool import create_pool, translate_placeholders
+from season_archive import ARCHIVE_PATH
+
+# database.DB_PATH; not imported because importing database may create the schema
+DB_PATH = 'game.db'
+
+# Rows fetched per round trip
+BATCH_SIZE = 1000
+
+# database: 'game' (game.db), 'archive' (game_archive.db) or 'bot' (main.py's DATABASE_URL)
+# key is what --from-id/--to-id and resuming filter on; archived events and
+# rollups are written a whole season at a time, so they resume by season.
+Source = namedtuple('Source', 'database table key order season_column')
+
+SOURCES = {
+    'events': Source('game', 'events', 'id', 'id', 'season_id'),
+    'archived_events': Source('archive', 'events', 'archived_season', 'archived_season, id', 'season_id'),
+    'season_rollups': Source('game', 'season_rollups', 'season_id', 'season_id, country_id', 'season_id'),
+    'battles': Source('bot', 'battles', 'id', 'id', None),
+    'diplomacy': Source('bot', 'diplomacy', 'id', 'id', None),
+}
+
+# Sources whose rows get a rendered 'description' (see events.py), and the
+# schema their countries table is in on the export connection
+DESCRIBED = {'events': '', 'archived_events': 'live.'}
+
+# Country names for the description, dropped from the exported row
+NAMES_JOIN = '''
+    LEFT JOIN {schema}countries c1 ON c1.id = t.country1_id
+    LEFT JOIN {schema}countries c2 ON c2.id = t.country2_id
+'''
+
+
+def build_query(source, season=None, from_id=None, to_id=None, after=None, names_schema=None):
+    """SELECT for a source with its filters, in key order; returns (query, params)
+
+    With names_schema (e.g. '' or 'live.'), country names are joined in from
+    that schema's countries table as country1_name and country2_name.
+    """
+    conditions = []
+    params = []
+    if season is not None:
+        if source.season_column is None:
+            raise ValueError(f"{source.table} has no season column")
+        conditions.append(f't.{source.season_column} = ?')
+        params.append(season)
+    if from_id is not None:
+        conditions.append(f't.{source.key} >= ?')
+        params.append(from_id)
+    if to_id is not None:
+        conditions.append(f't.{source.key} <= ?')
+        params.append(to_id)
+    if after is not None:
+        conditions.append(f't.{source.key} > ?')
+        params.append(after)
+    columns, join = 't.*', ''
+    if names_schema is not None:
+        columns += ', c1.name AS country1_name, c2.name AS country2_name'
+        join = NAMES_JOIN.format(schema=names_schema)
+    where = f" WHERE {' AND '.join(conditions)}" if conditions else ''
+    order = ', '.join(f't.{column.strip()}' for column in source.order.split(','))
+    return f'SELECT {columns} FROM {source.table} t{join}{where} ORDER BY {order}', params
+
+
+def _sqlite_rows(path, query, params, attach=None):
+    conn = sqlite3.connect(f'file:{path}?mode=ro', uri=True)
+    try:
+        if attach:
+            for schema, attached in attach.items():
+                conn.execute('ATTACH DATABASE ? AS ' + schema, (f'file:{attached}?mode=ro',))
+        cursor = conn.execute(query, params)
+        columns = [column[0] for column in cursor.description]
+        while True:
+            rows = cursor.fetchmany(BATCH_SIZE)
+            if not rows:
+                break
+            for row in rows:
+                yield dict(zip(columns, row))
+    finally:
+        conn.close()
+
+
+def _bot_rows(query, params):
+    pool = create_pool(os.environ.get('DATABASE_URL', 'sqlite:///game.db'))
+    if pool.backend == 'sqlite':
+        yield from _sqlite_rows(pool.path, query, params)
+        return
+    with pool.connection() as conn:
+        # Named cursor: rows stay on the server and arrive itersize at a time
+        cursor = conn.cursor(name='export')
+        cursor.itersize = BATCH_SIZE
+        cursor.execute(translate_placeholders(query)[0], params)
+        columns = None
+        for row in cursor:
+            if columns is None:
+                columns = [column[0] for column in cursor.description]
+            yield dict(zip(columns, row))
+        cursor.close()
+        conn.rollback()
+    pool.close()
+
+
+def stream(name, season=None, from_id=None, to_id=None, after=None):
+    """Yield the rows of a source as dicts, in key order"""
+    source = SOURCES[name]
+    query, params = build_query(source, season, from_id, to_id, after, DESCRIBED.get(name))
+    if source.database == 'bot':
+        rows = _bot_rows(query, params)
+    elif source.database == 'archive':
+        rows = _sqlite_rows(ARCHIVE_PATH, query, params, attach={'live': DB_PATH})
+    else:
+        rows = _sqlite_rows(DB_PATH, query, params)
+    for row in rows:
+        if name in DESCRIBED:
+            names = {
+                row['country1_id']: row.pop('country1_name'),
+                row['country2_id']: row.pop('country2_name'),
+            }
+            row['description'] = events.describe(
+                names.get, row['event_type'], row['country1_id'], row['country2_id'],
+                row['outcome'], row['value'],
+            )
+        yield row
+
+
+def state_key(name, season=None, from_id=None, to_id=None):
+    """State entry of an export: the source name plus any filters"""
+    filters = [
+        f'{label}={value}'
+        for label, value in (('season', season), ('from_id', from_id), ('to_id', to_id))
+        if value is not None
+    ]
+    return ':'.join([name] + filters)
+
+
+def load_state(path):
+    if path and os.path.exists(path):
+        with open(path) as f:
+            return json.load(f)
+    return {}
+
+
+def save_state(path, state):
+    """Write the state file atomically"""
+    tmp = f'{path}.tmp'
+    with open(tmp, 'w') as f:
+        json.dump(state, f)
+    os.replace(tmp, path)
+
+
+def export(name, out_dir, season=None, from_id=None, to_id=None, state_path=None):
+    """Export one source to OUT_DIR/<name>-<first>-<last>.ndjson.gz
+
+    Returns (path, row count); path is None when there was nothing new.
+    """
+    state = load_state(state_path)
+    entry = state_key(name, season, from_id, to_id)
+    key = SOURCES[name].key
+    partial = os.path.join(out_dir, f'{name}.ndjson.gz.part')
+    first = last = None
+    count = 0
+    try:
+        with gzip.open(partial, 'wt', encoding='utf-8') as out:
+            for row in stream(name, season, from_id, to_id, after=state.get(entry)):
+                out.write(json.dumps(row, ensure_ascii=False, separators=(',', ':')))
+                out.write('\n')
+                if first is None:
+                    first = row[key]
+                last = row[key]
+                count += 1
+    except BaseException:
+        # The partial may never have been created (e.g. out_dir is missing)
+        with contextlib.suppress(FileNotFoundError):
+            os.remove(partial)
+        raise
+
+    if not count:
+        os.remove(partial)
+        return None, 0
+    path = os.path.join(out_dir, f'{name}-{first}-{last}.ndjson.gz')
+    os.replace(partial, path)
+    if state_path:
+        state[entry] = last
+        save_state(state_path, state)
+    return path, count
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Export game history as gzip NDJSON')
+    parser.add_argument('table', choices=sorted(SOURCES))
+    parser.add_argument('out_dir')
+    parser.add_argument('--season', type=int)
+    parser.add_argument('--from-id', type=int)
+    parser.add_argument('--to-id', type=int)
+    parser.add_argument('--state', help='JSON file holding the last exported key per table and filters')
+    args = parser.parse_args(argv)
+
+    path, count = export(args.table, args.out_dir, args.season, args.from_id, args.to_id, args.state)
+    print(f'{count} row(s)' + (f' -> {path}' if path else ''))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
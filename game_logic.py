@@ -1,183 +1,210 @@
+import logging
 import random
-import math
-from datetime import datetime, timedelta
-from database import get_db_connection
-from config import (
-    RESOURCE_PRODUCTION, ADVISOR_TIP_INTERVAL_HOURS, 
-    AI_ACTION_INTERVAL_MINUTES, MAX_ARMY_LEVEL, ARMY_UPGRADE_COST
-)
+from database import get_db_connection, writer
+import accrual
+import ledger
+import counters
+import events
+import season_archive
+import ai_engine
+from alliance_index import alliances
+from advisor_cache import tip_cache
+from refdata import reference
+from timeutil import NOW_SQL
+from modifiers import army_stats
+from queries import ADVISOR_PLAYERS_SQL, RECENT_ATTACKS_SQL, RECENT_ATTACKS_BY_COUNTRY_SQL
+from config import OWNER_TELEGRAM_ID, MAX_ARMY_LEVEL, ARMY_UPGRADE_COST
+
+logger = logging.getLogger(__name__)
+
+# Materialize accrued resources for every country, optionally within a country id
+# range; parameters are (start, start, end)
+COLLECT_RESOURCES_SQL = accrual.materialize_sql('? IS NULL OR country_id BETWEEN ? AND ?')
+
+# Unique bonus reminders for the advisor
+BONUS_TIPS = {
+    'cavalry_speed': "🐎 Remember your Persian cavalry speed bonus when planning rapid strikes!",
+    'fortress_defense': "🏰 Your Roman fortress defense excels in holding cities - let enemies come to you!",
+    'nile_bounty': "🌾 Egypt's Nile bounty ensures stable food supply - focus resources on army expansion.",
+    'great_wall': "🧱 China's Great Wall bonus makes border defense highly effective against invasions.",
+    'phalanx': "🛡️ Greek phalanx formation gives infantry advantage - perfect for holding defensive lines.",
+    'hanging_gardens': "🌿 Babylon's Hanging Gardens boost all resource production - economic powerhouse!",
+    'siege_masters': "💥 Assyrian siege masters excel at taking fortified positions - target enemy capitals!",
+    'naval_supremacy': "⚓ Carthage dominates seas - control coastal regions and trade routes for advantage.",
+    'elephant_warfare': "🐘 Indian war elephants crush infantry formations - devastating in open battles.",
+    'companion_cavalry': "🐎 Macedonian companion cavalry delivers devastating charges - perfect for breaking enemy lines.",
+    'iron_masters': "⚒️ Hittite iron mastery ensures superior weapons - maintain technological edge.",
+    'trade_network': "💰 Phoenician trade networks generate wealth - fund larger armies than neighbors.",
+}
+
+
+def _reload_caches(conn):
+    """Rebuild in-memory state written ahead of the commit after a rollback"""
+    reference.invalidate()
+    alliances.invalidate()
+    alliances.load(conn.cursor())
+
+
+writer.on_rollback(_reload_caches)
+
 
 class GameLogic:
     """Core game mechanics including AI behavior and advisor logic"""
     
     @staticmethod
-    def collect_resources():
-        """Periodically collect resources for all countries"""
-        conn = get_db_connection()
-        cursor = conn.cursor()
-        
-        # Get all countries with their last collection time
-        cursor.execute('''
-            SELECT r.country_id, r.last_collected, 
-                   r.gold, r.iron, r.stone, r.food,
-                   c.is_ai_controlled
-            FROM resources r
-            JOIN countries c ON r.country_id = c.id
-        ''')
-        countries = cursor.fetchall()
-        
-        now = datetime.now()
-        updated_countries = []
+    def collect_resources(chunk_size=None):
+        """Materialize accrued resources for every country in one set-based UPDATE
+
+        Balances accrue lazily (see accrual), so this sweep is no longer needed
+        on a timer; it is kept for bulk settlement. With chunk_size each block
+        of country ids is its own writer command, so other writes can be
+        committed between blocks.
+        """
+        if chunk_size:
+            conn = get_db_connection()
+            low, high = conn.execute('SELECT MIN(country_id), MAX(country_id) FROM resources').fetchone()
+            conn.close()
+            ranges = [(start, start + chunk_size - 1)
+                      for start in range(low, high + 1, chunk_size)] if low is not None else []
+        else:
+            ranges = [(None, None)]
         
-        for country in countries:
-            last_collected = datetime.strptime(country['last_collected'], '%Y-%m-%d %H:%M:%S')
-            hours_passed = (now - last_collected).total_seconds() / 3600
-            
-            if hours_passed >= 1:  # Collect resources every hour
-                # Calculate production with AI bonus (AI collects 1.2x resources)
-                multiplier = 1.2 if country['is_ai_controlled'] else 1.0
-                
-                new_gold = country['gold'] + int(RESOURCE_PRODUCTION['gold'] * hours_passed * multiplier)
-                new_iron = country['iron'] + int(RESOURCE_PRODUCTION['iron'] * hours_passed * multiplier)
-                new_stone = country['stone'] + int(RESOURCE_PRODUCTION['stone'] * hours_passed * multiplier)
-                new_food = country['food'] + int(RESOURCE_PRODUCTION['food'] * hours_passed * multiplier)
-                
-                # Cap resources to prevent infinite growth
-                new_gold = min(new_gold, 1000000)
-                new_iron = min(new_iron, 500000)
-                new_stone = min(new_stone, 500000)
-                new_food = min(new_food, 2000000)
-                
-                cursor.execute('''
-                    UPDATE resources 
-                    SET gold = ?, iron = ?, stone = ?, food = ?, last_collected = ?
-                    WHERE country_id = ?
-                ''', (new_gold, new_iron, new_stone, new_food, now, country['country_id']))
-                
-                updated_countries.append(country['country_id'])
-        
-        conn.commit()
-        conn.close()
-        return updated_countries
+        futures = [writer.submit(GameLogic._collect_range, start, end) for start, end in ranges]
+        return [country_id for future in futures for country_id in future.result()]
     
     @staticmethod
-    def ai_decision_maker():
-        """AI makes strategic decisions: upgrade army, form alliances, declare war"""
-        conn = get_db_connection()
+    def _collect_range(start, end, conn):
+        """Writer command: materialize resources for country ids start..end (all if None)"""
         cursor = conn.cursor()
+        cursor.execute(COLLECT_RESOURCES_SQL, (start, start, end))
+        updated_countries = [row['country_id'] for row in cursor.fetchall()]
+        writer.after_commit(tip_cache.bump, *updated_countries)
+        return updated_countries
+
+    @staticmethod
+    def ai_decision_maker(rng=None, conn=None):
+        """AI makes strategic decisions: upgrade army, form alliances, declare war
         
-        # Get all AI-controlled countries with their stats
-        cursor.execute('''
-            SELECT c.id as country_id, c.name, c.unique_bonus,
-                   a.level, a.attack_power, a.defense,
-                   r.gold, r.iron, r.stone, r.food
-            FROM countries c
-            JOIN army a ON c.id = a.country_id
-            JOIN resources r ON c.id = r.country_id
-            WHERE c.is_ai_controlled = 1
-        ''')
-        ai_countries = cursor.fetchall()
+        Decisions for every AI nation are computed in one vectorized pass over
+        the world state (see ai_engine) and applied as a single writer command.
+        """
+        if conn is None:
+            return writer.call(GameLogic.ai_decision_maker, rng)
         
+        cursor = conn.cursor()
+
+        world = ai_engine.load_world(cursor)
         actions_taken = []
         
-        for ai in ai_countries:
-            # 1. Decide whether to upgrade army (30% chance if resources allow)
-            if ai['level'] < MAX_ARMY_LEVEL and random.random() < 0.3:
-                upgrade_cost = ARMY_UPGRADE_COST.get(ai['level'] + 1, {})
-                can_afford = (
-                    ai['gold'] >= upgrade_cost.get('gold', 0) and
-                    ai['iron'] >= upgrade_cost.get('iron', 0) and
-                    ai['stone'] >= upgrade_cost.get('stone', 0) and
-                    ai['food'] >= upgrade_cost.get('food', 0)
-                )
-                
-                if can_afford:
-                    GameLogic.upgrade_army(ai['country_id'], conn)
+        for kind, i, t in ai_engine.decide(world, rng):
+            country_id = int(world.ids[i])
+            if kind == ai_engine.UPGRADE:
+                if GameLogic.upgrade_army(country_id, conn):
                     actions_taken.append({
-                        'type': 'army_upgrade',
-                        'country': ai['name'],
-                        'level': ai['level'] + 1
+                        'type': kind,
+                        'country': world.names[i],
+                        'level': int(world.level[i]) + 1
                     })
-                    continue  # Only one action per AI per cycle
+                continue
             
-            # 2. Evaluate diplomatic options (40% chance)
-            if random.random() < 0.4:
-                # Get potential targets (not already at war or allied)
-                cursor.execute('''
-                    SELECT c.id, c.name, c.is_ai_controlled,
-                           a.level as enemy_level, r.gold as enemy_gold
-                    FROM countries c
-                    LEFT JOIN alliances al ON (al.country1_id = ? AND al.country2_id = c.id AND al.end_date IS NULL)
-                                      OR (al.country2_id = ? AND al.country1_id = c.id AND al.end_date IS NULL)
-                    JOIN army a ON c.id = a.country_id
-                    JOIN resources r ON c.id = r.country_id
-                    WHERE c.id != ? AND al.id IS NULL
-                    ORDER BY RANDOM() LIMIT 5
-                ''', (ai['country_id'], ai['country_id'], ai['country_id']))
-                targets = cursor.fetchall()
-                
-                if targets:
-                    # Choose target based on strategy
-                    target = random.choice(targets)
-                    
-                    # If target is weak and AI is strong, attack (60% chance)
-                    if ai['attack_power'] > target['enemy_level'] * 60 and random.random() < 0.6:
-                        GameLogic.declare_war(ai['country_id'], target['id'], conn)
-                        actions_taken.append({
-                            'type': 'war_declared',
-                            'attacker': ai['name'],
-                            'defender': target['name']
-                        })
-                    # If target is strong, propose alliance (40% chance)
-                    elif random.random() < 0.4:
-                        GameLogic.propose_alliance(ai['country_id'], target['id'], conn)
-                        actions_taken.append({
-                            'type': 'alliance_proposed',
-                            'country1': ai['name'],
-                            'country2': target['name']
-                        })
-                    # Otherwise send tribute to stronger nation (20% chance)
-                    elif target['enemy_gold'] > ai['gold'] * 1.5 and random.random() < 0.2:
-                        if ai['gold'] >= 500:
-                            GameLogic.send_tribute(ai['country_id'], target['id'], 500, conn)
-                            actions_taken.append({
-                                'type': 'tribute_sent',
-                                'sender': ai['name'],
-                                'receiver': target['name']
-                            })
-        
-        conn.commit()
-        conn.close()
+            target_id = int(world.ids[t])
+            if kind == ai_engine.WAR:
+                success, _ = GameLogic.declare_war(country_id, target_id, conn)
+                action = {'type': kind, 'attacker': world.names[i], 'defender': world.names[t]}
+            elif kind == ai_engine.ALLIANCE:
+                success, _ = GameLogic.propose_alliance(country_id, target_id, conn)
+                action = {'type': kind, 'country1': world.names[i], 'country2': world.names[t]}
+            else:
+                success, _ = GameLogic.send_tribute(country_id, target_id, ai_engine.TRIBUTE_AMOUNT, conn)
+                action = {'type': kind, 'sender': world.names[i], 'receiver': world.names[t]}
+            if success:
+                actions_taken.append(action)
+        
+        if actions_taken:
+            writer.after_commit(tip_cache.bump_all)
         return actions_taken
     
     @staticmethod
     def advisor_generate_tips(country_id):
         """Generate strategic tips for human players based on their situation"""
+        tips = tip_cache.get(country_id)
+        if tips is not None:
+            return random.choice(tips) if tips else None
+        version = tip_cache.version(country_id)
+        
         conn = get_db_connection()
         cursor = conn.cursor()
         
         # Get player country data
-        cursor.execute('''
-            SELECT p.telegram_id, c.name as country_name, c.unique_bonus,
-                   a.level, a.attack_power, a.defense, a.speed,
-                   r.gold, r.iron, r.stone, r.food,
-                   (SELECT COUNT(*) FROM alliances al 
-                    WHERE (al.country1_id = c.id OR al.country2_id = c.id) 
-                    AND al.end_date IS NULL) as alliance_count
-            FROM players p
-            JOIN countries c ON p.country_id = c.id
-            JOIN army a ON c.id = a.country_id
-            JOIN resources r ON c.id = r.country_id
-            WHERE p.country_id = ? AND p.telegram_id != ?
-        ''', (country_id, 8588773170))  # Exclude owner
+        cursor.execute(ADVISOR_PLAYERS_SQL + ' AND p.country_id = ?',
+                       (OWNER_TELEGRAM_ID, country_id))  # Exclude owner
         
         player_data = cursor.fetchone()
         if not player_data:
             conn.close()
             return None
         
+        avg_army_level = cursor.execute('SELECT AVG(level) FROM army').fetchone()[0] or 1
+        
+        # War risk assessment
+        cursor.execute(RECENT_ATTACKS_SQL, (country_id,))
+        recent_attacks = cursor.fetchone()[0]
+        
+        conn.close()
+        
+        tips = GameLogic._advisor_candidate_tips(dict(player_data), avg_army_level, recent_attacks)
+        tip_cache.put(country_id, tips, version)
+        if tips:
+            # Return one random tip to avoid overwhelming player
+            return random.choice(tips)
+        return None
+    
+    @staticmethod
+    def advisor_generate_tips_batch():
+        """Generate tips for every human player in one sweep
+        
+        Shared aggregates and recent attacks are computed once with grouped
+        queries. Returns {country_id: tip or None}; countries are visited in id
+        order, so with the same random seed the tips match calling
+        advisor_generate_tips per country in that order.
+        """
+        conn = get_db_connection()
+        cursor = conn.cursor()
+        
+        cursor.execute(ADVISOR_PLAYERS_SQL + ' ORDER BY p.country_id, p.id', (OWNER_TELEGRAM_ID,))
+        players = cursor.fetchall()
+        versions = {row['country_id']: tip_cache.version(row['country_id']) for row in players}
+        
+        avg_army_level = cursor.execute('SELECT AVG(level) FROM army').fetchone()[0] or 1
+        
+        cursor.execute(RECENT_ATTACKS_BY_COUNTRY_SQL)
+        recent_attacks = {row[0]: row[1] for row in cursor.fetchall()}
+        
+        conn.close()
+        
+        tips_by_country = {}
+        for player_data in players:
+            country_id = player_data['country_id']
+            if country_id in tips_by_country:
+                continue
+            tips = GameLogic._advisor_candidate_tips(
+                dict(player_data), avg_army_level, recent_attacks.get(country_id, 0)
+            )
+            tip_cache.put(country_id, tips, versions[country_id])
+            tips_by_country[country_id] = random.choice(tips) if tips else None
+        
+        # Hit rate of the per-player lookups (advisor_generate_tips) since startup
+        cache = tip_cache.stats()
+        logger.info("Advisor pass: %d countries; tip cache %d hits, %d misses (%.0f%%), %d/%d entries",
+                    len(tips_by_country), cache['hits'], cache['misses'], cache['hit_rate'] * 100,
+                    cache['size'], cache['max_entries'])
+        return tips_by_country
+    
+    @staticmethod
+    def _advisor_candidate_tips(data, avg_army_level, recent_attacks):
+        """All tips that apply to one player's country"""
         tips = []
-        data = dict(player_data)
+        alliance_count = alliances.ally_count(data['country_id'])
         
         # Resource deficiency warnings
         if data['food'] < 500:
@@ -189,170 +216,82 @@ class GameLogic:
             tips.append(f"💰 Treasury running low ({data['gold']} gold). Secure more income sources.")
         
         # Army strength analysis
-        avg_army_level = cursor.execute('SELECT AVG(level) FROM army').fetchone()[0] or 1
         if data['level'] < avg_army_level - 1:
             tips.append(f"⚔️ Your army (Level {data['level']}) is weaker than regional average (Level {avg_army_level:.1f}). Consider upgrading soon.")
         elif data['level'] > avg_army_level + 1:
             tips.append(f"🛡️ Your army (Level {data['level']}) is stronger than neighbors. Perfect time to expand your territory!")
         
         # Alliance advice
-        if data['alliance_count'] == 0:
+        if alliance_count == 0:
             tips.append("🤝 You have no alliances. Forming strategic partnerships could protect you from coordinated attacks.")
-        elif data['alliance_count'] >= 3:
-            tips.append(f"👑 You have {data['alliance_count']} active alliances. Be cautious of overextension and potential betrayal risks.")
+        elif alliance_count >= 3:
+            tips.append(f"👑 You have {alliance_count} active alliances. Be cautious of overextension and potential betrayal risks.")
         
         # Unique bonus reminder
-        bonus_tips = {
-            'cavalry_speed': "🐎 Remember your Persian cavalry speed bonus when planning rapid strikes!",
-            'fortress_defense': "🏰 Your Roman fortress defense excels in holding cities - let enemies come to you!",
-            'nile_bounty': "🌾 Egypt's Nile bounty ensures stable food supply - focus resources on army expansion.",
-            'great_wall': "🧱 China's Great Wall bonus makes border defense highly effective against invasions.",
-            'phalanx': "🛡️ Greek phalanx formation gives infantry advantage - perfect for holding defensive lines.",
-            'hanging_gardens': "🌿 Babylon's Hanging Gardens boost all resource production - economic powerhouse!",
-            'siege_masters': "💥 Assyrian siege masters excel at taking fortified positions - target enemy capitals!",
-            'naval_supremacy': "⚓ Carthage dominates seas - control coastal regions and trade routes for advantage.",
-            'elephant_warfare': "🐘 Indian war elephants crush infantry formations - devastating in open battles.",
-            'companion_cavalry': "🐎 Macedonian companion cavalry delivers devastating charges - perfect for breaking enemy lines.",
-            'iron_masters': "⚒️ Hittite iron mastery ensures superior weapons - maintain technological edge.",
-            'trade_network': "💰 Phoenician trade networks generate wealth - fund larger armies than neighbors.",
-        }
-        
-        if data['unique_bonus'] in bonus_tips:
-            tips.append(bonus_tips[data['unique_bonus']])
-        
-        # War risk assessment
-        cursor.execute('''
-            SELECT COUNT(*) as hostile_count
-            FROM events e
-            WHERE e.event_type = 'war' 
-              AND e.country2_id = ? 
-              AND e.timestamp > datetime('now', '-7 days')
-        ''', (country_id,))
-        recent_attacks = cursor.fetchone()[0]
+        if data['unique_bonus'] in BONUS_TIPS:
+            tips.append(BONUS_TIPS[data['unique_bonus']])
         
         if recent_attacks > 0:
             tips.append(f"⚔️ You've been attacked {recent_attacks} times recently. Strengthen defenses or seek powerful allies!")
         
-        conn.close()
-        
-        if tips:
-            # Return one random tip to avoid overwhelming player
-            return random.choice(tips)
-        return None
+        return tips
     
     @staticmethod
     def upgrade_army(country_id, conn=None):
         """Upgrade army level if resources allow"""
-        close_conn = False
         if conn is None:
-            conn = get_db_connection()
-            close_conn = True
+            return writer.call(GameLogic.upgrade_army, country_id)
         
         cursor = conn.cursor()
         
-        # Get current army and resources
+        # Get current army level and the country's bonus
         cursor.execute('''
-            SELECT a.level, r.gold, r.iron, r.stone, r.food
+            SELECT a.level, c.unique_bonus
             FROM army a
-            JOIN resources r ON a.country_id = r.country_id
+            JOIN countries c ON a.country_id = c.id
             WHERE a.country_id = ?
         ''', (country_id,))
         army_data = cursor.fetchone()
         
         if not army_data or army_data['level'] >= MAX_ARMY_LEVEL:
-            if close_conn:
-                conn.close()
             return False
         
         current_level = army_data['level']
         upgrade_cost = ARMY_UPGRADE_COST.get(current_level + 1, {})
         
-        # Check if can afford upgrade
-        if (army_data['gold'] < upgrade_cost.get('gold', 0) or
-            army_data['iron'] < upgrade_cost.get('iron', 0) or
-            army_data['stone'] < upgrade_cost.get('stone', 0) or
-            army_data['food'] < upgrade_cost.get('food', 0)):
-            if close_conn:
-                conn.close()
+        # Deduct resources if the country can afford all of them (settles accrual too)
+        if not ledger.debit(cursor, country_id, upgrade_cost):
             return False
         
-        # Calculate new stats with bonus progression
+        # New stats with bonus progression come from the precomputed table
         new_level = current_level + 1
-        base_attack = 50 + (new_level - 1) * 25
-        base_defense = 50 + (new_level - 1) * 25
-        base_speed = 50 + (new_level - 1) * 15
-        
-        # Apply country-specific bonuses
-        cursor.execute('SELECT unique_bonus FROM countries WHERE id = ?', (country_id,))
-        bonus = cursor.fetchone()['unique_bonus']
-        
-        if bonus == 'cavalry_speed':
-            base_speed = int(base_speed * 1.2)
-        elif bonus == 'fortress_defense':
-            base_defense = int(base_defense * 1.25)
-        elif bonus == 'phalanx':
-            base_attack = int(base_attack * 1.2)
-        elif bonus == 'siege_masters':
-            base_attack = int(base_attack * 1.25)
-        elif bonus == 'elephant_warfare':
-            base_attack = int(base_attack * 1.2)
-        elif bonus == 'companion_cavalry':
-            base_attack = int(base_attack * 1.25)
-            base_speed = int(base_speed * 1.15)
-        
-        # Deduct resources
-        cursor.execute('''
-            UPDATE resources
-            SET gold = gold - ?, iron = iron - ?, stone = stone - ?, food = food - ?
-            WHERE country_id = ?
-        ''', (
-            upgrade_cost['gold'], upgrade_cost['iron'], 
-            upgrade_cost['stone'], upgrade_cost['food'], country_id
-        ))
+        base_attack, base_defense, base_speed = army_stats(new_level, army_data['unique_bonus'])
         
         # Upgrade army
-        cursor.execute('''
+        cursor.execute(f'''
             UPDATE army
-            SET level = ?, attack_power = ?, defense = ?, speed = ?, last_upgrade = CURRENT_TIMESTAMP
+            SET level = ?, attack_power = ?, defense = ?, speed = ?, last_upgrade = {NOW_SQL}
             WHERE country_id = ?
         ''', (new_level, base_attack, base_defense, base_speed, country_id))
         
         # Log event
-        cursor.execute('''
-            INSERT INTO events (event_type, description, country1_id, season_id)
-            VALUES (?, ?, ?, (SELECT id FROM seasons WHERE is_active = 1 LIMIT 1))
-        ''', (
-            'army_upgrade',
-            f"Army upgraded to Level {new_level}",
-            country_id
-        ))
-        
-        if close_conn:
-            conn.commit()
-            conn.close()
+        events.log(cursor, events.ARMY_UPGRADE, country_id, value=new_level,
+                   season_id=reference.active_season_id())
+        
+        writer.after_commit(tip_cache.bump, country_id)
         
         return True
     
     @staticmethod
     def declare_war(attacker_id, defender_id, conn=None):
         """Declare war between two countries"""
-        close_conn = False
         if conn is None:
-            conn = get_db_connection()
-            close_conn = True
+            return writer.call(GameLogic.declare_war, attacker_id, defender_id)
         
         cursor = conn.cursor()
         
         # Check if already at war or allied
-        cursor.execute('''
-            SELECT id FROM alliances 
-            WHERE ((country1_id = ? AND country2_id = ?) OR (country1_id = ? AND country2_id = ?))
-            AND end_date IS NULL
-        ''', (attacker_id, defender_id, defender_id, attacker_id))
-        
-        if cursor.fetchone():
-            if close_conn:
-                conn.close()
+        if alliances.are_allied(attacker_id, defender_id):
             return False, "Cannot declare war on an ally"
         
         # Get army strengths
@@ -367,255 +306,158 @@ class GameLogic:
         defender_strength = defender_power * random.uniform(0.9, 1.1)
         
         if attacker_strength > defender_strength * 1.3:  # Decisive victory
-            outcome = "decisive_victory"
-            result_text = "decisively defeated"
+            outcome = events.DECISIVE_VICTORY
         elif attacker_strength > defender_strength * 0.9:  # Victory
-            outcome = "victory"
-            result_text = "defeated"
+            outcome = events.VICTORY
         elif attacker_strength > defender_strength * 0.7:  # Pyrrhic victory
-            outcome = "pyrrhic_victory"
-            result_text = "barely defeated"
+            outcome = events.PYRRHIC_VICTORY
         else:  # Defeat
-            outcome = "defeat"
-            result_text = "was defeated by"
-        
-        # Get country names
-        cursor.execute('SELECT name FROM countries WHERE id = ?', (attacker_id,))
-        attacker_name = cursor.fetchone()['name']
-        
-        cursor.execute('SELECT name FROM countries WHERE id = ?', (defender_id,))
-        defender_name = cursor.fetchone()['name']
+            outcome = events.DEFEAT
         
         # Log war event
-        description = f"{attacker_name} attacked {defender_name} and {result_text} them"
-        cursor.execute('''
-            INSERT INTO events (event_type, description, country1_id, country2_id, season_id)
-            VALUES (?, ?, ?, ?, (SELECT id FROM seasons WHERE is_active = 1 LIMIT 1))
-        ''', ('war', description, attacker_id, defender_id))
-        
+        events.log(cursor, events.WAR, attacker_id, defender_id, outcome=outcome,
+                   season_id=reference.active_season_id())
+        counters.record_war(cursor, attacker_id, defender_id)
+
         # Break any existing alliances involving these countries
-        cursor.execute('''
-            UPDATE alliances
-            SET end_date = CURRENT_TIMESTAMP, broken_by = ?
-            WHERE ((country1_id = ? OR country2_id = ?) OR (country1_id = ? OR country2_id = ?))
-            AND end_date IS NULL
-        ''', (attacker_id, attacker_id, attacker_id, defender_id, defender_id))
-        
-        if close_conn:
-            conn.commit()
-            conn.close()
+        ended = alliances.end_involving(cursor, (attacker_id, defender_id), broken_by=attacker_id)
+        
+        writer.after_commit(tip_cache.bump, attacker_id, defender_id, *(c for pair in ended for c in pair))
         
-        return True, description
+        return True, events.describe(reference.name, events.WAR, attacker_id, defender_id, outcome=outcome)
     
     @staticmethod
     def propose_alliance(country1_id, country2_id, conn=None):
         """Create an alliance between two countries"""
-        close_conn = False
         if conn is None:
-            conn = get_db_connection()
-            close_conn = True
+            return writer.call(GameLogic.propose_alliance, country1_id, country2_id)
         
         cursor = conn.cursor()
         
         # Check if already allied or at war recently
-        cursor.execute('''
-            SELECT id FROM alliances 
-            WHERE ((country1_id = ? AND country2_id = ?) OR (country1_id = ? AND country2_id = ?))
-            AND end_date IS NULL
-        ''', (country1_id, country2_id, country2_id, country1_id))
-        
-        if cursor.fetchone():
-            if close_conn:
-                conn.close()
+        if alliances.are_allied(country1_id, country2_id):
             return False, "Already allied"
         
         # Create alliance
-        cursor.execute('''
-            INSERT INTO alliances (country1_id, country2_id)
-            VALUES (?, ?)
-        ''', (country1_id, country2_id))
-        
-        # Get country names
-        cursor.execute('SELECT name FROM countries WHERE id = ?', (country1_id,))
-        country1_name = cursor.fetchone()['name']
-        
-        cursor.execute('SELECT name FROM countries WHERE id = ?', (country2_id,))
-        country2_name = cursor.fetchone()['name']
+        alliances.add(cursor, country1_id, country2_id)
         
         # Log event
-        description = f"{country1_name} and {country2_name} formed an alliance"
-        cursor.execute('''
-            INSERT INTO events (event_type, description, country1_id, country2_id, season_id)
-            VALUES (?, ?, ?, ?, (SELECT id FROM seasons WHERE is_active = 1 LIMIT 1))
-        ''', ('alliance', description, country1_id, country2_id))
+        events.log(cursor, events.ALLIANCE, country1_id, country2_id,
+                   season_id=reference.active_season_id())
+        counters.record_alliance(cursor, country1_id, country2_id)
         
-        if close_conn:
-            conn.commit()
-            conn.close()
+        writer.after_commit(tip_cache.bump, country1_id, country2_id)
         
-        return True, description
+        return True, events.describe(reference.name, events.ALLIANCE, country1_id, country2_id)
     
     @staticmethod
     def send_tribute(sender_id, receiver_id, amount, conn=None):
         """Send gold tribute from one country to another"""
-        close_conn = False
         if conn is None:
-            conn = get_db_connection()
-            close_conn = True
+            return writer.call(GameLogic.send_tribute, sender_id, receiver_id, amount)
         
         cursor = conn.cursor()
         
-        # Check sender has enough gold
-        cursor.execute('SELECT gold FROM resources WHERE country_id = ?', (sender_id,))
-        if cursor.fetchone()['gold'] < amount:
-            if close_conn:
-                conn.close()
+        # Transfer gold in one conditional statement (settles accrual on both sides)
+        if not ledger.transfer(cursor, sender_id, receiver_id, {'gold': amount}):
             return False, "Insufficient gold"
         
-        # Transfer gold
-        cursor.execute('''
-            UPDATE resources 
-            SET gold = gold - ? 
-            WHERE country_id = ?
-        ''', (amount, sender_id))
-        
-        cursor.execute('''
-            UPDATE resources 
-            SET gold = gold + ? 
-            WHERE country_id = ?
-        ''', (amount, receiver_id))
-        
-        # Get country names
-        cursor.execute('SELECT name FROM countries WHERE id = ?', (sender_id,))
-        sender_name = cursor.fetchone()['name']
-        
-        cursor.execute('SELECT name FROM countries WHERE id = ?', (receiver_id,))
-        receiver_name = cursor.fetchone()['name']
-        
         # Log event
-        description = f"{sender_name} sent {amount} gold tribute to {receiver_name}"
-        cursor.execute('''
-            INSERT INTO events (event_type, description, country1_id, country2_id, season_id)
-            VALUES (?, ?, ?, ?, (SELECT id FROM seasons WHERE is_active = 1 LIMIT 1))
-        ''', ('tribute', description, sender_id, receiver_id))
+        events.log(cursor, events.TRIBUTE, sender_id, receiver_id, value=amount,
+                   season_id=reference.active_season_id())
         
-        if close_conn:
-            conn.commit()
-            conn.close()
+        writer.after_commit(tip_cache.bump, sender_id, receiver_id)
         
-        return True, description
+        return True, events.describe(reference.name, events.TRIBUTE, sender_id, receiver_id, value=amount)
     
     @staticmethod
     def break_alliance(alliance_id, breaker_id, conn=None):
         """Break an existing alliance"""
-        close_conn = False
         if conn is None:
-            conn = get_db_connection()
-            close_conn = True
+            return writer.call(GameLogic.break_alliance, alliance_id, breaker_id)
         
         cursor = conn.cursor()
         
         # Get alliance details
-        cursor.execute('''
-            SELECT country1_id, country2_id 
-            FROM alliances 
-            WHERE id = ? AND end_date IS NULL
-        ''', (alliance_id,))
-        alliance = cursor.fetchone()
-        
-        if not alliance:
-            if close_conn:
-                conn.close()
+        members = alliances.members(alliance_id)
+        
+        if not members:
             return False, "Alliance not found or already broken"
+        alliance = {'country1_id': members[0], 'country2_id': members[1]}
         
         # Break alliance
-        cursor.execute('''
-            UPDATE alliances
-            SET end_date = CURRENT_TIMESTAMP, broken_by = ?
-            WHERE id = ?
-        ''', (breaker_id, alliance_id))
-        
-        # Get country names
-        cursor.execute('SELECT name FROM countries WHERE id IN (?, ?)', 
-                      (alliance['country1_id'], alliance['country2_id']))
-        countries = [row['name'] for row in cursor.fetchall()]
-        
-        breaker_name = countries[0] if alliance['country1_id'] == breaker_id else countries[1]
-        victim_name = countries[1] if alliance['country1_id'] == breaker_id else countries[0]
+        alliances.end(cursor, [alliance_id], broken_by=breaker_id)
         
+        victim_id = alliance['country1_id'] if alliance['country2_id'] == breaker_id else alliance['country2_id']
         # Log betrayal event
-        description = f"{breaker_name} betrayed and broke alliance with {victim_name}"
-        cursor.execute('''
-            INSERT INTO events (event_type, description, country1_id, country2_id, season_id)
-            VALUES (?, ?, ?, ?, (SELECT id FROM seasons WHERE is_active = 1 LIMIT 1))
-        ''', ('betrayal', description, breaker_id, alliance['country1_id'] if alliance['country2_id'] == breaker_id else alliance['country2_id']))
+        events.log(cursor, events.BETRAYAL, breaker_id, victim_id,
+                   season_id=reference.active_season_id())
+        counters.record_betrayal(cursor, breaker_id)
         
-        if close_conn:
-            conn.commit()
-            conn.close()
+        writer.after_commit(tip_cache.bump, *members)
         
-        return True, description
+        return True, events.describe(reference.name, events.BETRAYAL, breaker_id, victim_id)
     
     @staticmethod
-    def start_season():
+    def start_season(conn=None):
         """Start a new season"""
-        conn = get_db_connection()
+        if conn is None:
+            return writer.call(GameLogic.start_season)
+        
         cursor = conn.cursor()
         
-        # End any active season
-        cursor.execute('''
+        # End any active season, archiving it before the army is reset
+        previous_season_id = reference.active_season_id()
+        if previous_season_id is not None:
+            season_archive.close_season(cursor, previous_season_id)
+            writer.after_commit(writer.defer, GameLogic.purge_archived_season, previous_season_id)
+        cursor.execute(f'''
             UPDATE seasons 
-            SET end_time = CURRENT_TIMESTAMP, is_active = FALSE 
+            SET end_time = {NOW_SQL}, is_active = FALSE 
             WHERE is_active = TRUE
         ''')
         
         # Create new season
-        cursor.execute('''
+        cursor.execute(f'''
             INSERT INTO seasons (start_time, is_active)
-            VALUES (CURRENT_TIMESTAMP, TRUE)
+            VALUES ({NOW_SQL}, TRUE)
         ''')
         
         season_id = cursor.lastrowid
-        
+        reference.set_active_season(season_id)
+
         # Reset resources for all countries to starting values
-        cursor.execute('''
+        cursor.execute(f'''
             UPDATE resources 
-            SET gold = 1000, iron = 500, stone = 500, food = 1500, last_collected = CURRENT_TIMESTAMP
+            SET gold = 1000, iron = 500, stone = 500, food = 1500, last_collected = {NOW_SQL}
         ''')
         
         # Reset army levels to 1 for all countries
-        cursor.execute('''
+        cursor.execute(f'''
             UPDATE army 
-            SET level = 1, attack_power = 50, defense = 50, speed = 50, last_upgrade = CURRENT_TIMESTAMP
+            SET level = 1, attack_power = 50, defense = 50, speed = 50, last_upgrade = {NOW_SQL}
         ''')
         
         # Break all alliances
-        cursor.execute('''
-            UPDATE alliances 
-            SET end_date = CURRENT_TIMESTAMP 
-            WHERE end_date IS NULL
-        ''')
-        
-        conn.commit()
-        conn.close()
+        alliances.end_all(cursor)
         
+        writer.after_commit(tip_cache.bump_all)
+
         return season_id
     
     @staticmethod
-    def end_season():
+    def end_season(conn=None):
         """End current season and determine winner (human player only)"""
-        conn = get_db_connection()
+        if conn is None:
+            return writer.call(GameLogic.end_season)
+        
         cursor = conn.cursor()
         
         # Get active season
-        cursor.execute('SELECT id FROM seasons WHERE is_active = TRUE LIMIT 1')
-        season = cursor.fetchone()
-        if not season:
-            conn.close()
+        season_id = reference.active_season_id()
+        if season_id is None:
             return None, "No active season"
-        
-        season_id = season['id']
-        
+
         # Find strongest human-controlled country by army power
         cursor.execute('''
             SELECT c.id as country_id, c.name, a.attack_power + a.defense as power, p.telegram_id
@@ -625,36 +467,39 @@ class GameLogic:
             WHERE c.is_ai_controlled = FALSE AND p.telegram_id != ?
             ORDER BY power DESC
             LIMIT 1
-        ''', (8588773170,))  # Exclude owner
+        ''', (OWNER_TELEGRAM_ID,))  # Exclude owner
         
         winner = cursor.fetchone()
         
         # End season
-        cursor.execute('''
+        cursor.execute(f'''
             UPDATE seasons 
-            SET end_time = CURRENT_TIMESTAMP, 
+            SET end_time = {NOW_SQL}, 
                 is_active = FALSE,
                 winner_country_id = ?,
                 winner_player_id = (SELECT id FROM players WHERE country_id = ? LIMIT 1)
             WHERE id = ?
         ''', (winner['country_id'] if winner else None, winner['country_id'] if winner else None, season_id))
-        
-        conn.commit()
-        conn.close()
-        
+        season_archive.close_season(cursor, season_id)
+        writer.after_commit(writer.defer, GameLogic.purge_archived_season, season_id)
+        reference.set_active_season(None)
+
         if winner:
             return winner['country_id'], winner['name'], winner['telegram_id']
         return None, "No human players participated", None
     
+    @staticmethod
+    def purge_archived_season(season_id, conn=None):
+        """Delete a closed season from the live tables once its archive copy has committed"""
+        if conn is None:
+            return writer.call(GameLogic.purge_archived_season, season_id)
+        
+        season_archive.purge_season(conn.cursor(), season_id)
+    
     @staticmethod
     def is_season_active():
         """Check if a season is currently active"""
-        conn = get_db_connection()
-        cursor = conn.cursor()
-        cursor.execute('SELECT COUNT(*) FROM seasons WHERE is_active = TRUE')
-        active = cursor.fetchone()[0] > 0
-        conn.close()
-        return active
+        return reference.active_season_id() is not None
     
     @staticmethod
     def get_country_stats(country_id):
@@ -662,19 +507,10 @@ class GameLogic:
         conn = get_db_connection()
         cursor = conn.cursor()
         
-        cursor.execute('''
+        cursor.execute(f'''
             SELECT c.name, c.is_ai_controlled, c.unique_bonus, c.bonus_description,
                    a.level, a.attack_power, a.defense, a.speed,
-                   r.gold, r.iron, r.stone, r.food,
-                   (SELECT COUNT(*) FROM alliances al 
-                    WHERE (al.country1_id = c.id OR al.country2_id = c.id) 
-                    AND al.end_date IS NULL) as alliance_count,
-                   (SELECT COUNT(*) FROM events e 
-                    WHERE e.country1_id = c.id AND e.event_type = 'war' 
-                    AND e.timestamp > datetime('now', '-30 days')) as attacks_launched,
-                   (SELECT COUNT(*) FROM events e 
-                    WHERE e.country2_id = c.id AND e.event_type = 'war' 
-                    AND e.timestamp > datetime('now', '-30 days')) as attacks_received
+                   {accrual.balance_columns('r')}
             FROM countries c
             JOIN army a ON c.id = a.country_id
             JOIN resources r ON c.id = r.country_id
@@ -682,5 +518,31 @@ class GameLogic:
         ''', (country_id,))
         
         stats = cursor.fetchone()
+        if not stats:
+            conn.close()
+            return None
+        
+        # Alliance count from the index, 30-day war totals from the daily counters
+        stats = dict(stats)
+        stats['alliance_count'] = alliances.ally_count(country_id)
+        totals = counters.window_totals(cursor, country_id)
+        stats['attacks_launched'] = totals['attacks_launched']
+        stats['attacks_received'] = totals['attacks_received']
+        conn.close()
+        return stats
+    
+    @staticmethod
+    def get_recent_events(limit=20):
+        """Latest events for the news channel, newest first, as (timestamp, description)"""
+        conn = get_db_connection()
+        recent = events.recent(conn.cursor(), reference.name, limit)
+        conn.close()
+        return recent
+    
+    @staticmethod
+    def get_season_history(country_id, limit=10):
+        """A country's results in past seasons, newest first"""
+        conn = get_db_connection()
+        seasons = season_archive.history(conn.cursor(), country_id, limit)
         conn.close()
-        return dict(stats) if stats else None
\ No newline at end of file
+        return seasons
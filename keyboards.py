@@ -1,50 +1,66 @@
 from telegram import InlineKeyboardButton, InlineKeyboardMarkup
-from database import get_db_connection
+from alliance_index import alliances
+from refdata import reference
+from router import CallbackRouter
+
+# callback_data vocabulary of these keyboards; a handler module registers
+# its functions on the same routes with routes.route(...)
+routes = CallbackRouter()
+for _name in ('owner_add_player', 'owner_view_countries', 'owner_start_season', 'owner_end_season',
+              'owner_reset_game', 'owner_send_global', 'owner_type_global', 'owner_back',
+              'player_status', 'player_resources', 'player_army', 'player_diplomacy',
+              'player_alliances', 'player_refresh', 'player_army_back', 'player_diplomacy_back',
+              'no_action', 'cancel_action'):
+    routes.define(_name)
+routes.define('assign_country', int)
+routes.define('upgrade_army', int)
+routes.define('diplomacy_target', int)
+routes.define('diplomacy_back', int)
+routes.define('alliance_propose', int, int)
+routes.define('war_declare', int, int)
+routes.define('tribute_send', int, int)
+routes.define('alliance_manage', int, int)
+routes.define('alliance_break', int, int)
+routes.define('confirm', str)
 
 def owner_main_menu():
     """Owner main menu keyboard"""
     return InlineKeyboardMarkup([
-        [InlineKeyboardButton("👥 Add Player", callback_data='owner_add_player')],
-        [InlineKeyboardButton("🌍 View Countries", callback_data='owner_view_countries')],
-        [InlineKeyboardButton("▶️ Start Season", callback_data='owner_start_season')],
-        [InlineKeyboardButton("⏹️ End Season", callback_data='owner_end_season')],
-        [InlineKeyboardButton("🔄 Reset Game", callback_data='owner_reset_game')],
-        [InlineKeyboardButton("📢 Send Global Message", callback_data='owner_send_global')],
+        [InlineKeyboardButton("👥 Add Player", callback_data=routes.encode('owner_add_player'))],
+        [InlineKeyboardButton("🌍 View Countries", callback_data=routes.encode('owner_view_countries'))],
+        [InlineKeyboardButton("▶️ Start Season", callback_data=routes.encode('owner_start_season'))],
+        [InlineKeyboardButton("⏹️ End Season", callback_data=routes.encode('owner_end_season'))],
+        [InlineKeyboardButton("🔄 Reset Game", callback_data=routes.encode('owner_reset_game'))],
+        [InlineKeyboardButton("📢 Send Global Message", callback_data=routes.encode('owner_send_global'))],
     ])
 
 def get_ai_countries_keyboard():
     """Keyboard with AI-controlled countries for player assignment"""
-    conn = get_db_connection()
-    cursor = conn.cursor()
-    cursor.execute('''
-        SELECT c.id, c.name 
-        FROM countries c 
-        WHERE c.is_ai_controlled = 1
-        ORDER BY c.name
-    ''')
-    countries = cursor.fetchall()
-    conn.close()
+    countries = sorted(
+        (country for country in reference.countries() if country.is_ai_controlled),
+        key=lambda country: country.name
+    )
     
     buttons = []
     for country in countries:
         buttons.append([InlineKeyboardButton(
-            f"🌍 {country['name']}", 
-            callback_data=f'assign_country_{country["id"]}'
+            f"🌍 {country.name}", 
+            callback_data=routes.encode('assign_country', country.id)
         )])
     
-    buttons.append([InlineKeyboardButton("🔙 Back", callback_data='owner_back')])
+    buttons.append([InlineKeyboardButton("🔙 Back", callback_data=routes.encode('owner_back'))])
     return InlineKeyboardMarkup(buttons)
 
 def player_main_menu(country_name, resources, army_level):
     """Player main menu with resources and army status"""
     resource_text = f"💰{resources['gold']} 🏗️{resources['iron']} ⛏️{resources['stone']} 🌾{resources['food']}"
     return InlineKeyboardMarkup([
-        [InlineKeyboardButton(f"🏰 {country_name} | Lvl {army_level}", callback_data='player_status')],
-        [InlineKeyboardButton(resource_text, callback_data='player_resources')],
-        [InlineKeyboardButton("⚔️ Army Management", callback_data='player_army')],
-        [InlineKeyboardButton("🤝 Diplomacy", callback_data='player_diplomacy')],
-        [InlineKeyboardButton("📜 Alliances", callback_data='player_alliances')],
-        [InlineKeyboardButton("🔄 Refresh", callback_data='player_refresh')],
+        [InlineKeyboardButton(f"🏰 {country_name} | Lvl {army_level}", callback_data=routes.encode('player_status'))],
+        [InlineKeyboardButton(resource_text, callback_data=routes.encode('player_resources'))],
+        [InlineKeyboardButton("⚔️ Army Management", callback_data=routes.encode('player_army'))],
+        [InlineKeyboardButton("🤝 Diplomacy", callback_data=routes.encode('player_diplomacy'))],
+        [InlineKeyboardButton("📜 Alliances", callback_data=routes.encode('player_alliances'))],
+        [InlineKeyboardButton("🔄 Refresh", callback_data=routes.encode('player_refresh'))],
     ])
 
 def army_upgrade_keyboard(country_id, current_level, can_upgrade):
@@ -53,95 +69,74 @@ def army_upgrade_keyboard(country_id, current_level, can_upgrade):
     if current_level < 10 and can_upgrade:
         buttons.append([InlineKeyboardButton(
             f"⬆️ Upgrade to Level {current_level + 1}", 
-            callback_data=f'upgrade_army_{country_id}'
+            callback_data=routes.encode('upgrade_army', country_id)
         )])
-    buttons.append([InlineKeyboardButton("🔙 Back", callback_data='player_army_back')])
+    buttons.append([InlineKeyboardButton("🔙 Back", callback_data=routes.encode('player_army_back'))])
     return InlineKeyboardMarkup(buttons)
 
 def diplomacy_keyboard(country_id):
     """Keyboard for diplomatic actions"""
-    conn = get_db_connection()
-    cursor = conn.cursor()
-    
-    # Get all other countries
-    cursor.execute('''
-        SELECT c.id, c.name, c.is_ai_controlled 
-        FROM countries c 
-        WHERE c.id != ?
-        ORDER BY c.is_ai_controlled DESC, c.name
-    ''', (country_id,))
-    other_countries = cursor.fetchall()
-    
-    conn.close()
+    # All other countries, AI-controlled first
+    other_countries = sorted(
+        (country for country in reference.countries() if country.id != country_id),
+        key=lambda country: (not country.is_ai_controlled, country.name)
+    )
     
     buttons = []
     for country in other_countries:
-        prefix = "🤖" if country['is_ai_controlled'] else "👑"
+        prefix = "🤖" if country.is_ai_controlled else "👑"
         buttons.append([InlineKeyboardButton(
-            f"{prefix} {country['name']}", 
-            callback_data=f'diplomacy_target_{country["id"]}'
+            f"{prefix} {country.name}", 
+            callback_data=routes.encode('diplomacy_target', country.id)
         )])
     
-    buttons.append([InlineKeyboardButton("🔙 Back", callback_data='player_diplomacy_back')])
+    buttons.append([InlineKeyboardButton("🔙 Back", callback_data=routes.encode('player_diplomacy_back'))])
     return InlineKeyboardMarkup(buttons)
 
 def diplomacy_action_keyboard(country_id, target_id):
     """Keyboard for specific diplomatic actions with a target country"""
     return InlineKeyboardMarkup([
-        [InlineKeyboardButton("🤝 Propose Alliance", callback_data=f'alliance_propose_{country_id}_{target_id}')],
-        [InlineKeyboardButton("⚔️ Declare War", callback_data=f'war_declare_{country_id}_{target_id}')],
-        [InlineKeyboardButton("💰 Send Tribute (500 gold)", callback_data=f'tribute_send_{country_id}_{target_id}')],
-        [InlineKeyboardButton("🔙 Back", callback_data=f'diplomacy_back_{country_id}')],
+        [InlineKeyboardButton("🤝 Propose Alliance", callback_data=routes.encode('alliance_propose', country_id, target_id))],
+        [InlineKeyboardButton("⚔️ Declare War", callback_data=routes.encode('war_declare', country_id, target_id))],
+        [InlineKeyboardButton("💰 Send Tribute (500 gold)", callback_data=routes.encode('tribute_send', country_id, target_id))],
+        [InlineKeyboardButton("🔙 Back", callback_data=routes.encode('diplomacy_back', country_id))],
     ])
 
 def alliance_management_keyboard(country_id):
     """Keyboard showing current alliances and options"""
-    conn = get_db_connection()
-    cursor = conn.cursor()
-    
-    # Get active alliances
-    cursor.execute('''
-        SELECT a.id, c1.name as country1, c2.name as country2, c1.id as cid1, c2.id as cid2
-        FROM alliances a
-        JOIN countries c1 ON a.country1_id = c1.id
-        JOIN countries c2 ON a.country2_id = c2.id
-        WHERE (a.country1_id = ? OR a.country2_id = ?) AND a.end_date IS NULL
-    ''', (country_id, country_id))
-    alliances = cursor.fetchall()
-    conn.close()
+    # Active alliances from the index, ally names from the reference cache
+    allies = alliances.allies(country_id)
     
     buttons = []
-    for alliance in alliances:
-        other_country = alliance['country2'] if alliance['cid1'] == country_id else alliance['country1']
-        other_cid = alliance['cid2'] if alliance['cid1'] == country_id else alliance['cid1']
+    for other_cid, alliance_id in sorted(allies.items(), key=lambda item: item[1]):
         buttons.append([InlineKeyboardButton(
-            f"🤝 {other_country}", 
-            callback_data=f'alliance_manage_{alliance["id"]}_{other_cid}'
+            f"🤝 {reference.name(other_cid) or other_cid}", 
+            callback_data=routes.encode('alliance_manage', alliance_id, other_cid)
         )])
     
     if not buttons:
-        buttons.append([InlineKeyboardButton("No active alliances", callback_data='no_action')])
+        buttons.append([InlineKeyboardButton("No active alliances", callback_data=routes.encode('no_action'))])
     
-    buttons.append([InlineKeyboardButton("🔙 Back to Diplomacy", callback_data='player_diplomacy')])
+    buttons.append([InlineKeyboardButton("🔙 Back to Diplomacy", callback_data=routes.encode('player_diplomacy'))])
     return InlineKeyboardMarkup(buttons)
 
 def alliance_action_keyboard(alliance_id, other_country_id):
     """Keyboard for alliance actions (maintain/break)"""
     return InlineKeyboardMarkup([
-        [InlineKeyboardButton("💔 Break Alliance", callback_data=f'alliance_break_{alliance_id}_{other_country_id}')],
-        [InlineKeyboardButton("✅ Maintain Alliance", callback_data='player_alliances')],
+        [InlineKeyboardButton("💔 Break Alliance", callback_data=routes.encode('alliance_break', alliance_id, other_country_id))],
+        [InlineKeyboardButton("✅ Maintain Alliance", callback_data=routes.encode('player_alliances'))],
     ])
 
 def confirmation_keyboard(action_data, confirm_text="✅ Confirm", cancel_text="❌ Cancel"):
     """Generic confirmation keyboard"""
     return InlineKeyboardMarkup([
-        [InlineKeyboardButton(confirm_text, callback_data=f'confirm_{action_data}')],
-        [InlineKeyboardButton(cancel_text, callback_data='cancel_action')],
+        [InlineKeyboardButton(confirm_text, callback_data=routes.encode('confirm', action_data))],
+        [InlineKeyboardButton(cancel_text, callback_data=routes.encode('cancel_action'))],
     ])
 
 def global_message_keyboard():
     """Keyboard for owner to send global messages"""
     return InlineKeyboardMarkup([
-        [InlineKeyboardButton("✏️ Type Message", callback_data='owner_type_global')],
-        [InlineKeyboardButton("🔙 Back", callback_data='owner_back')],
+        [InlineKeyboardButton("✏️ Type Message", callback_data=routes.encode('owner_type_global'))],
+        [InlineKeyboardButton("🔙 Back", callback_data=routes.encode('owner_back'))],
     ])
\ No newline at end of file
@@ -0,0 +1,108 @@
+"""Resource ledger: conditional debits and transfers.
+
+Each operation is a single UPDATE that settles accrued production (see
+accrual) and applies the change in the same statement, guarded so that no
+balance can go negative. Success is read from the rows changed: a debit either
+happens completely or not at all, so concurrent spenders cannot overspend
+and no read-check-write window exists.
+
+Amounts are dicts {resource: amount} over RESOURCE_TYPES; missing resources
+count as zero.
+"""
+from functools import lru_cache
+
+import accrual
+from config import RESOURCE_TYPES
+
+
+def _amounts(amounts):
+    return tuple(int(amounts.get(resource, 0)) for resource in RESOURCE_TYPES)
+
+
+def _settle_set_clause(delta_sql):
+    """SET clause writing balance + delta for every resource and advancing the clock
+
+    delta_sql maps a resource name to an SQL expression of its change.
+    """
+    assignments = ',\n            '.join(
+        f"{resource} = {accrual.balance(resource)} + {delta_sql(resource)}"
+        for resource in RESOURCE_TYPES
+    )
+    return f'''{assignments},
+            last_collected = {accrual.advanced_clock()}'''
+
+
+DEBIT_SQL = f'''
+    UPDATE resources
+    SET {_settle_set_clause(lambda resource: f'-:{resource}')}
+    WHERE country_id = :country_id
+      AND {' AND '.join(f"{accrual.balance(r)} >= :{r}" for r in RESOURCE_TYPES)}
+'''
+
+@lru_cache(maxsize=64)
+def _transfers_sql(count):
+    """One UPDATE applying count transfers, all or nothing
+
+    moves lists the transfers, net sums them per country. The guard is an
+    uncorrelated subquery, so SQLite evaluates it once against the balances
+    before any row is changed: either every country can cover its net debit
+    and exists, or nothing is updated.
+    """
+    columns = ', '.join(RESOURCE_TYPES)
+    values = ', '.join(['(?, ?, ' + ', '.join('?' * len(RESOURCE_TYPES)) + ')'] * count)
+    negated = ', '.join(f'-{r} AS {r}' for r in RESOURCE_TYPES)
+    sums = ', '.join(f'SUM({r}) AS {r}' for r in RESOURCE_TYPES)
+    shortfall = ' OR '.join(f"{accrual.balance(r, 'cur')} + net.{r} < 0" for r in RESOURCE_TYPES)
+    return f'''
+        WITH moves (sender_id, receiver_id, {columns}) AS (VALUES {values}),
+        net AS (
+            SELECT country_id, {sums}
+            FROM (
+                SELECT sender_id AS country_id, {negated} FROM moves
+                UNION ALL
+                SELECT receiver_id, {columns} FROM moves
+            )
+            GROUP BY country_id
+        )
+        UPDATE resources
+        SET {_settle_set_clause(lambda resource: f'net.{resource}')}
+        FROM net
+        WHERE resources.country_id = net.country_id
+          AND NOT EXISTS (
+              SELECT 1 FROM net JOIN resources cur ON cur.country_id = net.country_id
+              WHERE {shortfall}
+          )
+          AND (SELECT COUNT(*) FROM net JOIN resources cur ON cur.country_id = net.country_id)
+              = (SELECT COUNT(*) FROM net)
+        RETURNING resources.country_id
+    '''
+
+
+def debit(cursor, country_id, cost):
+    """Spend cost from country_id if it can afford all of it; returns success"""
+    params = dict(zip(RESOURCE_TYPES, _amounts(cost)), country_id=country_id)
+    cursor.execute(DEBIT_SQL, params)
+    return cursor.rowcount == 1
+
+
+def transfer(cursor, sender_id, receiver_id, amounts):
+    """Move amounts from sender to receiver; returns success"""
+    return transfer_many(cursor, [(sender_id, receiver_id, amounts)])
+
+
+def transfer_many(cursor, transfers):
+    """Apply [(sender_id, receiver_id, amounts), ...] in one statement, all or nothing
+
+    A country may appear in several transfers; only its net change has to be
+    covered. Returns success.
+    """
+    transfers = list(transfers)
+    if not transfers:
+        return True
+    params = []
+    for sender_id, receiver_id, amounts in transfers:
+        params.extend((sender_id, receiver_id, *_amounts(amounts)))
+    # rowcount is not reported for statements starting with WITH, count RETURNING rows instead
+    updated = cursor.execute(_transfers_sql(len(transfers)), params).fetchall()
+    countries = {country_id for sender_id, receiver_id, _ in transfers for country_id in (sender_id, receiver_id)}
+    return len(updated) == len(countries)
@@ -1,11 +1,22 @@
 import os
 import logging
 import random
-import sqlite3
+from functools import partial
 from datetime import datetime, timedelta
 from flask import Flask, request, jsonify
 import telebot
 from telebot.types import InlineKeyboardMarkup, InlineKeyboardButton
+from db_pool import create_pool
+from migrations import migrate
+from writer import WriteQueue
+from backup import BackupScheduler
+from dispatcher import OrderedDispatcher
+from dedupe import DedupeWindow, update_keys
+from throttle import RateLimiter, Coalescer
+from router import CallbackRouter
+from screens import ScreenCache
+from queries import SCORE_SQL, TOP_PLAYERS_SQL, RECENT_BATTLES_SQL
+import timeutil
 
 # ========== تنظیمات از Environment Variables ==========
 TOKEN = os.environ.get('BOT_TOKEN', '')
@@ -14,16 +25,23 @@ CHANNEL_ID = os.environ.get('CHANNEL_ID', '')
 DATABASE_URL = os.environ.get('DATABASE_URL', 'sqlite:///game.db')
 WEBHOOK_URL = os.environ.get('RENDER_EXTERNAL_URL', '')  # Render خودش اینو میده
 BOT_USERNAME = os.environ.get('BOT_USERNAME', '@YourBotUsername')
+BACKUP_INTERVAL = int(os.environ.get('BACKUP_INTERVAL', '0'))  # ثانیه؛ ۰ یعنی غیرفعال
+UPDATE_WORKERS = int(os.environ.get('UPDATE_WORKERS', '8'))
+UPDATE_QUEUE_SIZE = int(os.environ.get('UPDATE_QUEUE_SIZE', '1024'))
+UPDATE_DEDUPE_DB = os.environ.get('UPDATE_DEDUPE_DB', '')  # خالی یعنی فقط در حافظه
 
 # بررسی وجود توکن
 if not TOKEN:
     logging.error("❌ BOT_TOKEN تنظیم نشده است!")
     exit(1)
 
-# ایجاد ربات
-bot = telebot.TeleBot(TOKEN)
+# ایجاد ربات (threaded=False: آپدیت‌ها را update_dispatcher پردازش می‌کند)
+bot = telebot.TeleBot(TOKEN, threaded=False)
 app = Flask(__name__)
 
+# مسیریاب دکمه‌ها؛ callback_data فشرده با callback_router.encode ساخته می‌شود
+callback_router = CallbackRouter()
+
 # تنظیمات لاگ
 logging.basicConfig(
     format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
@@ -32,167 +50,211 @@ logging.basicConfig(
 logger = logging.getLogger(__name__)
 
 # ========== توابع کمکی دیتابیس ==========
-def get_db_connection():
-    """ایجاد اتصال به دیتابیس"""
-    try:
-        # برای Render (PostgreSQL)
-        if DATABASE_URL and DATABASE_URL.startswith('postgres'):
-            import psycopg2
-            # تبدیل postgres:// به postgresql://
-            db_url = DATABASE_URL.replace('postgres://', 'postgresql://')
-            conn = psycopg2.connect(db_url, sslmode='require')
-            logger.info("✅ اتصال به PostgreSQL برقرار شد")
-            return conn
-    except ImportError:
-        logger.warning("⚠️ psycopg2 نصب نشده، از SQLite استفاده می‌شود")
-    except Exception as e:
-        logger.error(f"❌ خطا در اتصال به PostgreSQL: {e}")
-    
-    # SQLite برای توسعه محلی و Fallback
-    conn = sqlite3.connect('game.db', check_same_thread=False)
-    logger.info("✅ اتصال به SQLite برقرار شد")
-    return conn
+# استخر اتصال: PostgreSQL با pool امن برای thread و SQLite با یک اتصال پایدار برای هر thread
+db_pool = create_pool(DATABASE_URL)
 
-def init_database():
-    """اولیه‌سازی دیتابیس"""
-    conn = get_db_connection()
+def _migration_tables(conn, db):
+    """مهاجرت ۱: جدول‌ها و کشورهای پیش‌فرض"""
     cursor = conn.cursor()
-    
-    try:
-        # ========== جدول بازیکنان ==========
-        cursor.execute('''
-            CREATE TABLE IF NOT EXISTS players (
-                user_id INTEGER PRIMARY KEY,
-                username TEXT,
-                country TEXT,
-                gold INTEGER DEFAULT 1000,
-                iron INTEGER DEFAULT 500,
-                stone INTEGER DEFAULT 500,
-                food INTEGER DEFAULT 1000,
-                wood INTEGER DEFAULT 500,
-                army_infantry INTEGER DEFAULT 50,
-                army_archer INTEGER DEFAULT 30,
-                army_cavalry INTEGER DEFAULT 20,
-                army_spearman INTEGER DEFAULT 40,
-                army_thief INTEGER DEFAULT 10,
-                defense_wall INTEGER DEFAULT 50,
-                defense_tower INTEGER DEFAULT 20,
-                defense_gate INTEGER DEFAULT 30,
-                mine_gold_level INTEGER DEFAULT 1,
-                mine_iron_level INTEGER DEFAULT 1,
-                mine_stone_level INTEGER DEFAULT 1,
-                farm_level INTEGER DEFAULT 1,
-                barracks_level INTEGER DEFAULT 1,
-                join_date TIMESTAMP,
-                last_active TIMESTAMP,
-                diplomacy_notifications INTEGER DEFAULT 1
-            )
-        ''')
-        
-        # ========== جدول کشورها ==========
-        cursor.execute('''
-            CREATE TABLE IF NOT EXISTS countries (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                name TEXT UNIQUE,
-                special_resource TEXT,
-                controller TEXT DEFAULT 'AI',
-                player_id INTEGER,
-                capital_x INTEGER DEFAULT 100,
-                capital_y INTEGER DEFAULT 100
-            )
-        ''')
-        
-        # ========== کشورهای پیش‌فرض ==========
-        countries = [
-            ('پارس', 'اسب', 100, 100),
-            ('روم', 'آهن', 200, 100),
-            ('مصر', 'طلا', 100, 200),
-            ('چین', 'غذا', 200, 200),
-            ('یونان', 'سنگ', 150, 150),
-            ('بابل', 'دانش', 50, 150),
-            ('آشور', 'نفت', 150, 50),
-            ('کارتاژ', 'کشتی', 250, 100),
-            ('هند', 'ادویه', 100, 250),
-            ('مقدونیه', 'فیل', 200, 50)
-        ]
-        
-        for name, resource, x, y in countries:
-            cursor.execute('INSERT OR IGNORE INTO countries (name, special_resource, capital_x, capital_y) VALUES (?, ?, ?, ?)', 
-                          (name, resource, x, y))
-        
-        # ========== جدول نبردها ==========
-        cursor.execute('''
-            CREATE TABLE IF NOT EXISTS battles (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                attacker_id INTEGER,
-                defender_id INTEGER,
-                attacker_country TEXT,
-                defender_country TEXT,
-                result TEXT,
-                attacker_losses INTEGER,
-                defender_losses INTEGER,
-                gold_looted INTEGER DEFAULT 0,
-                iron_looted INTEGER DEFAULT 0,
-                food_looted INTEGER DEFAULT 0,
-                battle_date TIMESTAMP
-            )
-        ''')
-        
-        # ========== جدول دیپلماسی ==========
-        cursor.execute('''
-            CREATE TABLE IF NOT EXISTS diplomacy (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                from_player_id INTEGER,
-                to_player_id INTEGER,
-                from_country TEXT,
-                to_country TEXT,
-                relation_type TEXT,
-                status TEXT DEFAULT 'pending',
-                message TEXT,
-                created_at TIMESTAMP,
-                expires_at TIMESTAMP
-            )
-        ''')
-        
-        conn.commit()
-        logger.info("✅ دیتابیس اولیه‌سازی شد")
-        
-    except Exception as e:
-        logger.error(f"❌ خطا در اولیه‌سازی دیتابیس: {e}")
-        conn.rollback()
-    finally:
-        conn.close()
+
+    # ========== جدول بازیکنان ==========
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS players (
+            user_id INTEGER PRIMARY KEY,
+            username TEXT,
+            country TEXT,
+            gold INTEGER DEFAULT 1000,
+            iron INTEGER DEFAULT 500,
+            stone INTEGER DEFAULT 500,
+            food INTEGER DEFAULT 1000,
+            wood INTEGER DEFAULT 500,
+            army_infantry INTEGER DEFAULT 50,
+            army_archer INTEGER DEFAULT 30,
+            army_cavalry INTEGER DEFAULT 20,
+            army_spearman INTEGER DEFAULT 40,
+            army_thief INTEGER DEFAULT 10,
+            defense_wall INTEGER DEFAULT 50,
+            defense_tower INTEGER DEFAULT 20,
+            defense_gate INTEGER DEFAULT 30,
+            mine_gold_level INTEGER DEFAULT 1,
+            mine_iron_level INTEGER DEFAULT 1,
+            mine_stone_level INTEGER DEFAULT 1,
+            farm_level INTEGER DEFAULT 1,
+            barracks_level INTEGER DEFAULT 1,
+            join_date TIMESTAMP,
+            last_active TIMESTAMP,
+            diplomacy_notifications INTEGER DEFAULT 1
+        )
+    ''')
+
+    # ========== جدول کشورها ==========
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS countries (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            name TEXT UNIQUE,
+            special_resource TEXT,
+            controller TEXT DEFAULT 'AI',
+            player_id INTEGER,
+            capital_x INTEGER DEFAULT 100,
+            capital_y INTEGER DEFAULT 100
+        )
+    ''')
+
+    # ========== کشورهای پیش‌فرض ==========
+    countries = [
+        ('پارس', 'اسب', 100, 100),
+        ('روم', 'آهن', 200, 100),
+        ('مصر', 'طلا', 100, 200),
+        ('چین', 'غذا', 200, 200),
+        ('یونان', 'سنگ', 150, 150),
+        ('بابل', 'دانش', 50, 150),
+        ('آشور', 'نفت', 150, 50),
+        ('کارتاژ', 'کشتی', 250, 100),
+        ('هند', 'ادویه', 100, 250),
+        ('مقدونیه', 'فیل', 200, 50)
+    ]
+
+    db.executemany(conn, 'INSERT OR IGNORE INTO countries (name, special_resource, capital_x, capital_y) VALUES (?, ?, ?, ?)',
+                   countries)
+
+    # ========== جدول نبردها ==========
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS battles (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            attacker_id INTEGER,
+            defender_id INTEGER,
+            attacker_country TEXT,
+            defender_country TEXT,
+            result TEXT,
+            attacker_losses INTEGER,
+            defender_losses INTEGER,
+            gold_looted INTEGER DEFAULT 0,
+            iron_looted INTEGER DEFAULT 0,
+            food_looted INTEGER DEFAULT 0,
+            battle_date TIMESTAMP
+        )
+    ''')
+
+    # ========== جدول دیپلماسی ==========
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS diplomacy (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            from_player_id INTEGER,
+            to_player_id INTEGER,
+            from_country TEXT,
+            to_country TEXT,
+            relation_type TEXT,
+            status TEXT DEFAULT 'pending',
+            message TEXT,
+            created_at TIMESTAMP,
+            expires_at TIMESTAMP
+        )
+    ''')
+
+def _migration_indexes(conn, db):
+    """مهاجرت ۲: ایندکس‌ها"""
+    cursor = conn.cursor()
+    # آخرین نبردها (ORDER BY battle_date DESC)
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_battles_date ON battles (battle_date)')
+    # جستجوی بازیکنان بر اساس نام کشور
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_players_country_name ON players (country)')
+
+def _migration_score_index(conn, db):
+    """مهاجرت ۴: ایندکس امتیاز برای برترین بازیکنان در /stats"""
+    cursor = conn.cursor()
+    cursor.execute(f'CREATE INDEX IF NOT EXISTS idx_players_score ON players (({SCORE_SQL})) '
+                   f'WHERE country IS NOT NULL')
+
+# ستون‌های زمانی؛ به صورت عدد صحیح (ثانیه از epoch، UTC) ذخیره می‌شوند
+EPOCH_COLUMNS = (
+    ('players', 'join_date'),
+    ('players', 'last_active'),
+    ('battles', 'battle_date'),
+    ('diplomacy', 'created_at'),
+    ('diplomacy', 'expires_at'),
+)
+
+def _migration_epoch_timestamps(conn, db):
+    """مهاجرت ۳: تبدیل زمان‌ها به ثانیه epoch"""
+    for table, column in EPOCH_COLUMNS:
+        if db.backend == 'sqlite':
+            # نوع ستون در SQLite مهم نیست؛ فقط مقادیر متنی قدیمی تبدیل می‌شوند
+            db.execute(conn, f"UPDATE {table} SET {column} = {timeutil.text_to_epoch_sql(column)} "
+                             f"WHERE typeof({column}) = 'text'")
+        else:
+            db.execute(conn, f'ALTER TABLE {table} ALTER COLUMN {column} TYPE BIGINT '
+                             f'USING EXTRACT(EPOCH FROM {column})::BIGINT')
+
+# ========== مهاجرت‌های دیتابیس ==========
+# فقط به انتها اضافه شود؛ تعداد اجرا شده در schema_migrations ذخیره می‌شود
+DATABASE_MIGRATIONS = (
+    _migration_tables,
+    _migration_indexes,
+    _migration_epoch_timestamps,
+    _migration_score_index,
+)
+
+def init_database():
+    """اولیه‌سازی دیتابیس (اگر schema به‌روز باشد فقط یک SELECT اجرا می‌شود)"""
+    with db_pool.connection() as conn:
+        try:
+            if migrate(conn, 'bot', DATABASE_MIGRATIONS, db_pool):
+                logger.info("✅ دیتابیس اولیه‌سازی شد")
+
+        except Exception as e:
+            logger.error(f"❌ خطا در اولیه‌سازی دیتابیس: {e}")
+            conn.rollback()
 
 # ========== اجرای اولیه‌سازی دیتابیس ==========
 init_database()
 
+# ========== صف نوشتن ==========
+# در SQLite فقط یک thread با اتصال اختصاصی خودش می‌نویسد و نوشتن‌های پشت سر هم
+# با هم commit می‌شوند؛ PostgreSQL قفل سطری دارد و مستقیم از pool می‌نویسد
+db_writer = WriteQueue(db_pool.open_connection, name='bot-writer') if db_pool.backend == 'sqlite' else None
+
+def run_write(fn, *args):
+    """اجرای تابع نوشتنی fn(*args, conn=...) در یک تراکنش و برگرداندن نتیجه آن بعد از commit"""
+    if db_writer is not None:
+        return db_writer.call(fn, *args)
+    with db_pool.connection() as conn:
+        result = fn(*args, conn=conn)
+        conn.commit()
+        return result
+
+def _execute_write(query, params, conn):
+    return db_pool.execute(conn, query, params).rowcount
+
 # ========== توابع کمکی ==========
 def execute_query(query, params=(), fetchone=False, fetchall=False, commit=False):
-    """تابع کمکی برای اجرای کوئری‌ها"""
-    conn = get_db_connection()
-    cursor = conn.cursor()
-    
-    try:
-        cursor.execute(query, params)
-        
-        if commit:
-            conn.commit()
-        
-        if fetchone:
-            result = cursor.fetchone()
-        elif fetchall:
-            result = cursor.fetchall()
-        else:
-            result = None
-        
-        return result
-    except Exception as e:
-        logger.error(f"خطا در اجرای کوئری: {e}")
-        if commit:
-            conn.rollback()
-        raise e
-    finally:
-        conn.close()
+    """تابع کمکی برای اجرای کوئری‌ها
+
+    داخل `with db_pool.connection():` همه کوئری‌ها از همان اتصال قرض گرفته شده استفاده می‌کنند.
+    کوئری‌های commit=True از طریق run_write اجرا می‌شوند.
+    """
+    if commit:
+        try:
+            run_write(_execute_write, query, params)
+            return None
+        except Exception as e:
+            logger.error(f"خطا در اجرای کوئری: {e}")
+            raise e
+
+    with db_pool.connection() as conn:
+        try:
+            cursor = db_pool.execute(conn, query, params)
+            
+            if fetchone:
+                result = cursor.fetchone()
+            elif fetchall:
+                result = cursor.fetchall()
+            else:
+                result = None
+            
+            return result
+        except Exception as e:
+            logger.error(f"خطا در اجرای کوئری: {e}")
+            raise e
 
 # ========== توابع محاسباتی ==========
 def calculate_army_power(player_data):
@@ -217,49 +279,67 @@ def calculate_army_power(player_data):
     )
     return power
 
+# ========== جدول تولید (یک بار در شروع ساخته می‌شود) ==========
+# تولید روزانه هر سطح سازه
+PRODUCTION_PER_LEVEL = {'gold': 50, 'iron': 30, 'stone': 40, 'food': 100}
+BASE_WOOD_PRODUCTION = 20
+
+# بونس منبع ویژه هر کشور: (نوع منبع، ضریب)
+SPECIAL_RESOURCE_BONUSES = {
+    'طلا': ('gold', 1.5),
+    'آهن': ('iron', 1.5),
+    'غذا': ('food', 1.5),
+    'سنگ': ('stone', 1.5),
+    'اسب': ('food', 1.3),
+    'دانش': ('gold', 1.2)
+}
+
+# سطوح بالاتر از این مقدار در لحظه محاسبه می‌شوند
+MAX_TABLE_LEVEL = 50
+
+def _production_at(resource, level, special_resource):
+    production = level * PRODUCTION_PER_LEVEL[resource]
+    bonus = SPECIAL_RESOURCE_BONUSES.get(special_resource)
+    if bonus and bonus[0] == resource:
+        production = int(production * bonus[1])
+    return production
+
+# PRODUCTION_TABLE[special_resource][resource][level]
+PRODUCTION_TABLE = {
+    special_resource: {
+        resource: [_production_at(resource, level, special_resource) for level in range(MAX_TABLE_LEVEL + 1)]
+        for resource in PRODUCTION_PER_LEVEL
+    }
+    for special_resource in list(SPECIAL_RESOURCE_BONUSES) + [None]
+}
+
+def production_for(mine_gold, mine_iron, mine_stone, farm, special_resource):
+    """تولید روزانه از روی سطح سازه‌ها و منبع ویژه، بدون کوئری"""
+    table = PRODUCTION_TABLE.get(special_resource, PRODUCTION_TABLE[None])
+    levels = {'gold': mine_gold, 'iron': mine_iron, 'stone': mine_stone, 'food': farm}
+    production = {}
+    for resource, level in levels.items():
+        if 0 <= level <= MAX_TABLE_LEVEL:
+            production[resource] = table[resource][level]
+        else:
+            production[resource] = _production_at(resource, level, special_resource)
+    production['wood'] = BASE_WOOD_PRODUCTION
+    return production
+
 def calculate_daily_production(user_id):
     """محاسبه تولید روزانه"""
     player = execute_query('''
-        SELECT mine_gold_level, mine_iron_level, mine_stone_level,
-               farm_level, barracks_level, country
-        FROM players WHERE user_id = ?
+        SELECT p.mine_gold_level, p.mine_iron_level, p.mine_stone_level,
+               p.farm_level, c.special_resource
+        FROM players p
+        LEFT JOIN countries c ON p.country = c.name
+        WHERE p.user_id = ?
     ''', (user_id,), fetchone=True)
-    
+
     if not player:
         return None
-    
-    mine_gold, mine_iron, mine_stone, farm, barracks, country = player
-    
-    # تولید پایه
-    production = {
-        'gold': mine_gold * 50,
-        'iron': mine_iron * 30,
-        'stone': mine_stone * 40,
-        'food': farm * 100,
-        'wood': 20
-    }
-    
-    # اعمال بونس کشور
-    if country:
-        country_data = execute_query(
-            'SELECT special_resource FROM countries WHERE name = ?',
-            (country,), fetchone=True
-        )
-        if country_data:
-            resource = country_data[0]
-            bonuses = {
-                'طلا': ('gold', 1.5),
-                'آهن': ('iron', 1.5),
-                'غذا': ('food', 1.5),
-                'سنگ': ('stone', 1.5),
-                'اسب': ('food', 1.3),
-                'دانش': ('gold', 1.2)
-            }
-            if resource in bonuses:
-                resource_type, multiplier = bonuses[resource]
-                production[resource_type] = int(production[resource_type] * multiplier)
-    
-    return production
+
+    return production_for(*player)
 
 # ========== منوها ==========
 def main_menu(user_id):
@@ -277,102 +357,102 @@ def main_menu(user_id):
     if is_owner:
         # منوی مالک
         keyboard.row(
-            InlineKeyboardButton("👑 افزودن بازیکن", callback_data="add_player"),
-            InlineKeyboardButton("🌍 کشورها", callback_data="view_countries")
+            InlineKeyboardButton("👑 افزودن بازیکن", callback_data=callback_router.encode("add_player")),
+            InlineKeyboardButton("🌍 کشورها", callback_data=callback_router.encode("view_countries"))
         )
         keyboard.row(
-            InlineKeyboardButton("📊 منابع", callback_data="view_resources"),
-            InlineKeyboardButton("⚔️ ارتش", callback_data="army_info")
+            InlineKeyboardButton("📊 منابع", callback_data=callback_router.encode("view_resources")),
+            InlineKeyboardButton("⚔️ ارتش", callback_data=callback_router.encode("army_info"))
         )
         keyboard.row(
-            InlineKeyboardButton("🤝 دیپلماسی", callback_data="diplomacy"),
-            InlineKeyboardButton("⛏️ معادن", callback_data="mines_farms")
+            InlineKeyboardButton("🤝 دیپلماسی", callback_data=callback_router.encode("diplomacy")),
+            InlineKeyboardButton("⛏️ معادن", callback_data=callback_router.encode("mines_farms"))
         )
         keyboard.row(
-            InlineKeyboardButton("▶️ شروع فصل", callback_data="start_season"),
-            InlineKeyboardButton("⏹️ پایان فصل", callback_data="end_season")
+            InlineKeyboardButton("▶️ شروع فصل", callback_data=callback_router.encode("start_season")),
+            InlineKeyboardButton("⏹️ پایان فصل", callback_data=callback_router.encode("end_season"))
         )
         keyboard.row(
-            InlineKeyboardButton("📈 آمار", callback_data="stats"),
-            InlineKeyboardButton("🔄 ریست", callback_data="reset_game")
+            InlineKeyboardButton("📈 آمار", callback_data=callback_router.encode("stats")),
+            InlineKeyboardButton("🔄 ریست", callback_data=callback_router.encode("reset_game"))
         )
     elif has_country:
         # منوی بازیکن عادی
         keyboard.row(
-            InlineKeyboardButton("🏛️ کشور من", callback_data="my_country"),
-            InlineKeyboardButton("📊 منابع", callback_data="view_resources")
+            InlineKeyboardButton("🏛️ کشور من", callback_data=callback_router.encode("my_country")),
+            InlineKeyboardButton("📊 منابع", callback_data=callback_router.encode("view_resources"))
         )
         keyboard.row(
-            InlineKeyboardButton("⚔️ ارتش", callback_data="army_info"),
-            InlineKeyboardButton("🤝 دیپلماسی", callback_data="diplomacy")
+            InlineKeyboardButton("⚔️ ارتش", callback_data=callback_router.encode("army_info")),
+            InlineKeyboardButton("🤝 دیپلماسی", callback_data=callback_router.encode("diplomacy"))
         )
         keyboard.row(
-            InlineKeyboardButton("⛏️ معادن", callback_data="mines_farms"),
-            InlineKeyboardButton("🌍 کشورها", callback_data="view_countries")
+            InlineKeyboardButton("⛏️ معادن", callback_data=callback_router.encode("mines_farms")),
+            InlineKeyboardButton("🌍 کشورها", callback_data=callback_router.encode("view_countries"))
         )
     else:
         # منوی کاربر بدون کشور
         keyboard.row(
-            InlineKeyboardButton("🌍 مشاهده کشورها", callback_data="view_countries"),
-            InlineKeyboardButton("📊 وضعیت من", callback_data="view_resources")
+            InlineKeyboardButton("🌍 مشاهده کشورها", callback_data=callback_router.encode("view_countries")),
+            InlineKeyboardButton("📊 وضعیت من", callback_data=callback_router.encode("view_resources"))
         )
     
-    keyboard.row(InlineKeyboardButton("ℹ️ راهنما", callback_data="help"))
+    keyboard.row(InlineKeyboardButton("ℹ️ راهنما", callback_data=callback_router.encode("help")))
     
     return keyboard
 
 def army_menu():
     keyboard = InlineKeyboardMarkup()
     keyboard.row(
-        InlineKeyboardButton("👮 پیاده نظام", callback_data="army_infantry"),
-        InlineKeyboardButton("🏹 کمانداران", callback_data="army_archer")
+        InlineKeyboardButton("👮 پیاده نظام", callback_data=callback_router.encode("army_infantry")),
+        InlineKeyboardButton("🏹 کمانداران", callback_data=callback_router.encode("army_archer"))
     )
     keyboard.row(
-        InlineKeyboardButton("🐎 سوارهنظام", callback_data="army_cavalry"),
-        InlineKeyboardButton("🗡️ نیزه‌داران", callback_data="army_spearman")
+        InlineKeyboardButton("🐎 سوارهنظام", callback_data=callback_router.encode("army_cavalry")),
+        InlineKeyboardButton("🗡️ نیزه‌داران", callback_data=callback_router.encode("army_spearman"))
     )
     keyboard.row(
-        InlineKeyboardButton("👤 دزدان", callback_data="army_thief"),
-        InlineKeyboardButton("⚔️ حمله", callback_data="attack_country")
+        InlineKeyboardButton("👤 دزدان", callback_data=callback_router.encode("army_thief")),
+        InlineKeyboardButton("⚔️ حمله", callback_data=callback_router.encode("attack_country"))
     )
     keyboard.row(
-        InlineKeyboardButton("🏰 دفاع", callback_data="defend_borders"),
-        InlineKeyboardButton("🔙 بازگشت", callback_data="main_menu")
+        InlineKeyboardButton("🏰 دفاع", callback_data=callback_router.encode("defend_borders")),
+        InlineKeyboardButton("🔙 بازگشت", callback_data=callback_router.encode("main_menu"))
     )
     return keyboard
 
 def diplomacy_menu():
     keyboard = InlineKeyboardMarkup()
     keyboard.row(
-        InlineKeyboardButton("🕊️ صلح", callback_data="peace_request"),
-        InlineKeyboardButton("⚔️ جنگ", callback_data="declare_war")
+        InlineKeyboardButton("🕊️ صلح", callback_data=callback_router.encode("peace_request")),
+        InlineKeyboardButton("⚔️ جنگ", callback_data=callback_router.encode("declare_war"))
     )
     keyboard.row(
-        InlineKeyboardButton("🤝 اتحاد", callback_data="request_alliance"),
-        InlineKeyboardButton("💰 تجارت", callback_data="trade_offer")
+        InlineKeyboardButton("🤝 اتحاد", callback_data=callback_router.encode("request_alliance")),
+        InlineKeyboardButton("💰 تجارت", callback_data=callback_router.encode("trade_offer"))
     )
     keyboard.row(
-        InlineKeyboardButton("📜 پیشنهادها", callback_data="view_diplomacy_offers"),
-        InlineKeyboardButton("🔙 بازگشت", callback_data="main_menu")
+        InlineKeyboardButton("📜 پیشنهادها", callback_data=callback_router.encode("view_diplomacy_offers")),
+        InlineKeyboardButton("🔙 بازگشت", callback_data=callback_router.encode("main_menu"))
     )
     return keyboard
 
 def mines_menu():
     keyboard = InlineKeyboardMarkup()
     keyboard.row(
-        InlineKeyboardButton("💰 طلا", callback_data="mine_gold"),
-        InlineKeyboardButton("⚒️ آهن", callback_data="mine_iron")
+        InlineKeyboardButton("💰 طلا", callback_data=callback_router.encode("mine_gold")),
+        InlineKeyboardButton("⚒️ آهن", callback_data=callback_router.encode("mine_iron"))
     )
     keyboard.row(
-        InlineKeyboardButton("🪨 سنگ", callback_data="mine_stone"),
-        InlineKeyboardButton("🌾 غذا", callback_data="farm_food")
+        InlineKeyboardButton("🪨 سنگ", callback_data=callback_router.encode("mine_stone")),
+        InlineKeyboardButton("🌾 غذا", callback_data=callback_router.encode("farm_food"))
     )
     keyboard.row(
-        InlineKeyboardButton("🏗️ سرباز", callback_data="barracks"),
-        InlineKeyboardButton("📦 جمع‌آوری", callback_data="collect_resources")
+        InlineKeyboardButton("🏗️ سرباز", callback_data=callback_router.encode("barracks")),
+        InlineKeyboardButton("📦 جمع‌آوری", callback_data=callback_router.encode("collect_resources"))
     )
     keyboard.row(
-        InlineKeyboardButton("🔙 بازگشت", callback_data="main_menu")
+        InlineKeyboardButton("🔙 بازگشت", callback_data=callback_router.encode("main_menu"))
     )
     return keyboard
 
@@ -381,7 +461,7 @@ def mines_menu():
 def start_handler(message):
     user_id = message.from_user.id
     username = message.from_user.username or message.from_user.first_name
-    now = datetime.now()
+    now = timeutil.now()
 
     # بررسی وجود کاربر
     exists = execute_query(
@@ -465,20 +545,24 @@ def start_handler(message):
 @bot.message_handler(commands=['status'])
 def show_status(message):
     """نمایش وضعیت ربات"""
-    user_count = execute_query('SELECT COUNT(*) FROM players', fetchone=True)[0]
-    country_count = execute_query('SELECT COUNT(*) FROM countries', fetchone=True)[0]
-    active_players = execute_query(
-        'SELECT COUNT(*) FROM players WHERE country IS NOT NULL',
-        fetchone=True
-    )[0]
+    # همه شمارش‌ها روی یک اتصال قرض گرفته شده
+    with db_pool.connection():
+        user_count = execute_query('SELECT COUNT(*) FROM players', fetchone=True)[0]
+        country_count = execute_query('SELECT COUNT(*) FROM countries', fetchone=True)[0]
+        active_players = execute_query(
+            'SELECT COUNT(*) FROM players WHERE country IS NOT NULL',
+            fetchone=True
+        )[0]
+        battle_count = execute_query('SELECT COUNT(*) FROM battles', fetchone=True)[0]
+        diplomacy_count = execute_query('SELECT COUNT(*) FROM diplomacy', fetchone=True)[0]
     
     status_text = f"""🤖 **وضعیت ربات جنگ جهانی باستان**
 
 👥 **کاربران:** {user_count} نفر
 🏛️ **کشورها:** {country_count} کشور
 🎮 **بازیکنان فعال:** {active_players} نفر
-⚔️ **نبردها:** {execute_query('SELECT COUNT(*) FROM battles', fetchone=True)[0]} نبرد
-🤝 **درخواست‌های دیپلماسی:** {execute_query('SELECT COUNT(*) FROM diplomacy', fetchone=True)[0]} درخواست
+⚔️ **نبردها:** {battle_count} نبرد
+🤝 **درخواست‌های دیپلماسی:** {diplomacy_count} درخواست
 
 🔧 **ورژن:** 3.0
 🌐 **میزبان:** Render
@@ -499,20 +583,9 @@ def show_stats(message):
     user_id = message.from_user.id
     
     # آمار کلی
-    top_players = execute_query('''
-        SELECT username, country, gold + iron * 2 + stone * 1.5 + food as score
-        FROM players 
-        WHERE country IS NOT NULL
-        ORDER BY score DESC 
-        LIMIT 5
-    ''', fetchall=True)
+    top_players = execute_query(TOP_PLAYERS_SQL, fetchall=True)
     
-    recent_battles = execute_query('''
-        SELECT attacker_country, defender_country, result, battle_date
-        FROM battles 
-        ORDER BY battle_date DESC 
-        LIMIT 5
-    ''', fetchall=True)
+    recent_battles = execute_query(RECENT_BATTLES_SQL, fetchall=True)
     
     stats_text = "📊 **آمار بازی جنگ جهانی باستان**\n\n"
     
@@ -522,7 +595,7 @@ def show_stats(message):
     
     stats_text += "\n⚔️ **آخرین نبردها:**\n"
     for attacker, defender, result, date in recent_battles:
-        date_str = date.strftime('%Y-%m-%d') if isinstance(date, datetime) else date[:10]
+        date_str = timeutil.format_epoch(date, '%Y-%m-%d')
         stats_text += f"• {attacker} vs {defender}: {result} ({date_str})\n"
     
     bot.send_message(
@@ -532,74 +605,138 @@ def show_stats(message):
         reply_markup=main_menu(user_id)
     )
 
+# ========== محدودیت کلیک ==========
+callback_limiter = RateLimiter()
+callback_coalescer = Coalescer()
+
 @bot.callback_query_handler(func=lambda call: True)
 def handle_callback(call):
+    """کلیک‌های تکراری نمایشی یکی می‌شوند، بقیه از محدودیت نرخ هر کاربر می‌گذرند"""
+    route, args = callback_router.resolve(call.data)
+    key = (call.from_user.id, call.message.message_id if call.message else None)
+    # مسیرهای read_only فقط نمایش می‌دهند؛ فقط کلیک تکراری پشت سر هم روی همان پیام یک بار اجرا می‌شود
+    if route is not None and route.read_only:
+        _, coalesced = callback_coalescer.run(key, call.data, _limited_callback, call, route, args)
+        if coalesced:
+            # پیام همین الان به‌روز شده؛ فقط به کلیک پاسخ می‌دهیم
+            bot.answer_callback_query(call.id)
+        return
+    # این کلیک ممکن است پیام را عوض کند؛ نتیجه قبلی دیگر معتبر نیست
+    callback_coalescer.forget(key)
+    _limited_callback(call, route, args)
+
+def _limited_callback(call, route=None, args=()):
+    if not callback_limiter.allow(call.from_user.id):
+        bot.answer_callback_query(call.id, "⏳ کمی آهسته‌تر! لطفاً چند لحظه صبر کنید.")
+        return
+    _handle_callback(call, route, args)
+
+def _handle_callback(call, route=None, args=()):
     """مدیریت کلیک روی دکمه‌ها"""
+    try:
+        if not callback_router.dispatch(call, route, args):
+            bot.answer_callback_query(call.id, "⚠️ این دکمه هنوز فعال نشده است!")
+    except Exception as e:
+        logger.error(f"خطا در هندلر کالبک: {e}")
+        bot.answer_callback_query(call.id, "⚠️ خطایی رخ داد! لطفاً دوباره تلاش کنید.")
+
+# ========== ویرایش صفحه ==========
+# آخرین صفحه هر پیام؛ ویرایشی که چیزی را عوض نمی‌کند به تلگرام فرستاده نمی‌شود
+screen_cache = ScreenCache()
+
+def edit_screen(call, text, parse_mode=None, reply_markup=None):
+    """ویرایش پیام کلیک‌شده، فقط اگر متن یا دکمه‌ها تغییر کرده باشند"""
+    chat_id = call.message.chat.id
+    message_id = call.message.message_id
+    if not screen_cache.update(chat_id, message_id, text, reply_markup, parse_mode):
+        bot.answer_callback_query(call.id)
+        return False
+    try:
+        bot.edit_message_text(
+            chat_id=chat_id,
+            message_id=message_id,
+            text=text,
+            parse_mode=parse_mode,
+            reply_markup=reply_markup
+        )
+    except telebot.apihelper.ApiTelegramException as e:
+        # بعد از راه‌اندازی مجدد، کش خالی است و تلگرام همان صفحه را دارد
+        if 'message is not modified' in str(e):
+            bot.answer_callback_query(call.id)
+            return False
+        screen_cache.forget(chat_id, message_id)
+        raise
+    except Exception:
+        screen_cache.forget(chat_id, message_id)
+        raise
+    return True
+
+# ========== منوی اصلی ==========
+@callback_router.route("main_menu", read_only=True)
+def _on_main_menu(call):
     user_id = call.from_user.id
+    edit_screen(
+        call,
+        text="🏛️ **منوی اصلی**\n\nلطفاً گزینه مورد نظر را انتخاب کنید:",
+        parse_mode='Markdown',
+        reply_markup=main_menu(user_id)
+    )
+
+# ========== مشاهده کشورها ==========
+@callback_router.route("view_countries", read_only=True)
+def _on_view_countries(call):
+    user_id = call.from_user.id
+    countries = execute_query('''
+        SELECT c.name, c.special_resource, c.controller, 
+               COALESCE(p.username, 'AI') as controller_name
+        FROM countries c
+        LEFT JOIN players p ON c.player_id = p.user_id
+        ORDER BY c.name
+    ''', fetchall=True)
     
-    try:
-        # ========== منوی اصلی ==========
-        if call.data == "main_menu":
-            bot.edit_message_text(
-                chat_id=call.message.chat.id,
-                message_id=call.message.message_id,
-                text="🏛️ **منوی اصلی**\n\nلطفاً گزینه مورد نظر را انتخاب کنید:",
-                parse_mode='Markdown',
-                reply_markup=main_menu(user_id)
-            )
+    text = "🌍 **لیست کشورهای باستانی:**\n\n"
+    for name, resource, controller, controller_name in countries:
+        emoji = "🤖" if controller == "AI" else "👤"
+        text += f"🏛️ **{name}**\n"
+        text += f"   📦 منبع ویژه: {resource}\n"
+        text += f"   👥 کنترل: {emoji} {controller_name}\n"
+        text += f"   {'─'*20}\n"
+    
+    keyboard = InlineKeyboardMarkup()
+    keyboard.row(
+        InlineKeyboardButton("🔙 بازگشت", callback_data=callback_router.encode("main_menu")),
+        InlineKeyboardButton("🔄 رفرش", callback_data=callback_router.encode("view_countries"))
+    )
+    
+    edit_screen(
+        call,
+        text=text,
+        parse_mode='Markdown',
+        reply_markup=keyboard
+    )
+
+# ========== کشور من ==========
+@callback_router.route("my_country", read_only=True)
+def _on_my_country(call):
+    user_id = call.from_user.id
+    player = execute_query('''
+        SELECT p.country, p.gold, p.iron, p.stone, p.food, p.wood,
+               p.army_infantry, p.army_archer, p.army_cavalry,
+               p.army_spearman, p.army_thief,
+               p.defense_wall, p.defense_tower, p.defense_gate,
+               c.special_resource
+        FROM players p
+        LEFT JOIN countries c ON p.country = c.name
+        WHERE p.user_id = ?
+    ''', (user_id,), fetchone=True)
+    
+    if player and player[0]:
+        country, gold, iron, stone, food, wood, infantry, archer, cavalry, spearman, thief, wall, tower, gate, resource = player
         
-        # ========== مشاهده کشورها ==========
-        elif call.data == "view_countries":
-            countries = execute_query('''
-                SELECT c.name, c.special_resource, c.controller, 
-                       COALESCE(p.username, 'AI') as controller_name
-                FROM countries c
-                LEFT JOIN players p ON c.player_id = p.user_id
-                ORDER BY c.name
-            ''', fetchall=True)
-            
-            text = "🌍 **لیست کشورهای باستانی:**\n\n"
-            for name, resource, controller, controller_name in countries:
-                emoji = "🤖" if controller == "AI" else "👤"
-                text += f"🏛️ **{name}**\n"
-                text += f"   📦 منبع ویژه: {resource}\n"
-                text += f"   👥 کنترل: {emoji} {controller_name}\n"
-                text += f"   {'─'*20}\n"
-            
-            keyboard = InlineKeyboardMarkup()
-            keyboard.row(
-                InlineKeyboardButton("🔙 بازگشت", callback_data="main_menu"),
-                InlineKeyboardButton("🔄 رفرش", callback_data="view_countries")
-            )
-            
-            bot.edit_message_text(
-                chat_id=call.message.chat.id,
-                message_id=call.message.message_id,
-                text=text,
-                parse_mode='Markdown',
-                reply_markup=keyboard
-            )
+        # محاسبه قدرت
+        army_power = calculate_army_power((infantry, archer, cavalry, spearman, thief))
         
-        # ========== کشور من ==========
-        elif call.data == "my_country":
-            player = execute_query('''
-                SELECT p.country, p.gold, p.iron, p.stone, p.food, p.wood,
-                       p.army_infantry, p.army_archer, p.army_cavalry,
-                       p.army_spearman, p.army_thief,
-                       p.defense_wall, p.defense_tower, p.defense_gate,
-                       c.special_resource
-                FROM players p
-                LEFT JOIN countries c ON p.country = c.name
-                WHERE p.user_id = ?
-            ''', (user_id,), fetchone=True)
-            
-            if player and player[0]:
-                country, gold, iron, stone, food, wood, infantry, archer, cavalry, spearman, thief, wall, tower, gate, resource = player
-                
-                # محاسبه قدرت
-                army_power = calculate_army_power((infantry, archer, cavalry, spearman, thief))
-                
-                text = f"""🏛️ **کشور شما: {country}**
+        text = f"""🏛️ **کشور شما: {country}**
 
 🎁 منبع ویژه: {resource}
 
@@ -624,33 +761,35 @@ def handle_callback(call):
 
 ⚡ **قدرت کلی:**
 • قدرت حمله: {army_power:.1f}"""
-            else:
-                text = "⚠️ شما هنوز کشوری ندارید!\nلطفاً از مالک درخواست کشور کنید."
-            
-            bot.edit_message_text(
-                chat_id=call.message.chat.id,
-                message_id=call.message.message_id,
-                text=text,
-                parse_mode='Markdown',
-                reply_markup=main_menu(user_id)
-            )
+    else:
+        text = "⚠️ شما هنوز کشوری ندارید!\nلطفاً از مالک درخواست کشور کنید."
+    
+    edit_screen(
+        call,
+        text=text,
+        parse_mode='Markdown',
+        reply_markup=main_menu(user_id)
+    )
+
+# ========== مشاهده منابع ==========
+@callback_router.route("view_resources", read_only=True)
+def _on_view_resources(call):
+    user_id = call.from_user.id
+    player = execute_query('''
+        SELECT p.gold, p.iron, p.stone, p.food, p.wood, c.name,
+               p.mine_gold_level, p.mine_iron_level, p.mine_stone_level, p.farm_level,
+               c.special_resource
+        FROM players p
+        LEFT JOIN countries c ON p.country = c.name
+        WHERE p.user_id = ?
+    ''', (user_id,), fetchone=True)
+    
+    if player:
+        gold, iron, stone, food, wood, country, mine_gold, mine_iron, mine_stone, farm, special_resource = player
         
-        # ========== مشاهده منابع ==========
-        elif call.data == "view_resources":
-            player = execute_query('''
-                SELECT p.gold, p.iron, p.stone, p.food, p.wood, c.name,
-                       p.mine_gold_level, p.mine_iron_level, p.mine_stone_level, p.farm_level
-                FROM players p
-                LEFT JOIN countries c ON p.country = c.name
-                WHERE p.user_id = ?
-            ''', (user_id,), fetchone=True)
-            
-            if player:
-                gold, iron, stone, food, wood, country, mine_gold, mine_iron, mine_stone, farm = player
-                
-                production = calculate_daily_production(user_id)
-                
-                text = f"""📊 **وضعیت منابع{' - ' + country if country else ''}**
+        production = production_for(mine_gold, mine_iron, mine_stone, farm, special_resource)
+
+        text = f"""📊 **وضعیت منابع{' - ' + country if country else ''}**
 
 💰 **ذخایر:**
 • طلا: {gold}
@@ -673,33 +812,34 @@ def handle_callback(call):
 • چوب: {production['wood'] if production else 0}
 
 💡 برای جمع‌آوری منابع به بخش معادن بروید."""
-            else:
-                text = "⚠️ شما هنوز ثبت‌نام نکرده‌اید."
-            
-            bot.edit_message_text(
-                chat_id=call.message.chat.id,
-                message_id=call.message.message_id,
-                text=text,
-                parse_mode='Markdown',
-                reply_markup=main_menu(user_id)
-            )
+    else:
+        text = "⚠️ شما هنوز ثبت‌نام نکرده‌اید."
+    
+    edit_screen(
+        call,
+        text=text,
+        parse_mode='Markdown',
+        reply_markup=main_menu(user_id)
+    )
+
+# ========== بخش ارتش ==========
+@callback_router.route("army_info", read_only=True)
+def _on_army_info(call):
+    user_id = call.from_user.id
+    player = execute_query('''
+        SELECT army_infantry, army_archer, army_cavalry, 
+               army_spearman, army_thief,
+               defense_wall, defense_tower, defense_gate,
+               country
+        FROM players WHERE user_id = ?
+    ''', (user_id,), fetchone=True)
+    
+    if player and player[8]:  # اگر کشور دارد
+        infantry, archer, cavalry, spearman, thief, wall, tower, gate, country = player
         
-        # ========== بخش ارتش ==========
-        elif call.data == "army_info":
-            player = execute_query('''
-                SELECT army_infantry, army_archer, army_cavalry, 
-                       army_spearman, army_thief,
-                       defense_wall, defense_tower, defense_gate,
-                       country
-                FROM players WHERE user_id = ?
-            ''', (user_id,), fetchone=True)
-            
-            if player and player[8]:  # اگر کشور دارد
-                infantry, archer, cavalry, spearman, thief, wall, tower, gate, country = player
-                
-                army_power = calculate_army_power((infantry, archer, cavalry, spearman, thief))
-                
-                text = f"""⚔️ **ارتش و جنگ - {country}**
+        army_power = calculate_army_power((infantry, archer, cavalry, spearman, thief))
+        
+        text = f"""⚔️ **ارتش و جنگ - {country}**
 
 👮 **نیروهای شما:**
 • پیاده نظام: {infantry}
@@ -717,36 +857,35 @@ def handle_callback(call):
 • قدرت حمله: {army_power:.1f}
 
 از گزینه‌های زیر برای مدیریت ارتش استفاده کنید:"""
-                
-                bot.edit_message_text(
-                    chat_id=call.message.chat.id,
-                    message_id=call.message.message_id,
-                    text=text,
-                    parse_mode='Markdown',
-                    reply_markup=army_menu()
-                )
-            else:
-                bot.edit_message_text(
-                    chat_id=call.message.chat.id,
-                    message_id=call.message.message_id,
-                    text="⚠️ شما هنوز کشوری ندارید!",
-                    reply_markup=main_menu(user_id)
-                )
         
-        # ========== دیپلماسی ==========
-        elif call.data == "diplomacy":
-            player = execute_query('SELECT country FROM players WHERE user_id = ?', (user_id,), fetchone=True)
-            
-            if not player or not player[0]:
-                bot.edit_message_text(
-                    chat_id=call.message.chat.id,
-                    message_id=call.message.message_id,
-                    text="⚠️ شما کشوری ندارید!",
-                    reply_markup=main_menu(user_id)
-                )
-                return
-            
-            text = """🤝 **دیپلماسی**
+        edit_screen(
+            call,
+            text=text,
+            parse_mode='Markdown',
+            reply_markup=army_menu()
+        )
+    else:
+        edit_screen(
+            call,
+            text="⚠️ شما هنوز کشوری ندارید!",
+            reply_markup=main_menu(user_id)
+        )
+
+# ========== دیپلماسی ==========
+@callback_router.route("diplomacy", read_only=True)
+def _on_diplomacy(call):
+    user_id = call.from_user.id
+    player = execute_query('SELECT country FROM players WHERE user_id = ?', (user_id,), fetchone=True)
+    
+    if not player or not player[0]:
+        edit_screen(
+            call,
+            text="⚠️ شما کشوری ندارید!",
+            reply_markup=main_menu(user_id)
+        )
+        return
+    
+    text = """🤝 **دیپلماسی**
 
 از طریق دیپلماسی می‌توانید با دیگر کشورها:
 • درخواست صلح کنید
@@ -757,30 +896,33 @@ def handle_callback(call):
 پیشنهادهای دریافتی خود را نیز می‌توانید مشاهده و پاسخ دهید.
 
 لطفاً گزینه مورد نظر را انتخاب کنید:"""
-            
-            bot.edit_message_text(
-                chat_id=call.message.chat.id,
-                message_id=call.message.message_id,
-                text=text,
-                parse_mode='Markdown',
-                reply_markup=diplomacy_menu()
-            )
+    
+    edit_screen(
+        call,
+        text=text,
+        parse_mode='Markdown',
+        reply_markup=diplomacy_menu()
+    )
+
+# ========== معادن و مزارع ==========
+@callback_router.route("mines_farms", read_only=True)
+def _on_mines_farms(call):
+    user_id = call.from_user.id
+    player = execute_query('''
+        SELECT p.mine_gold_level, p.mine_iron_level, p.mine_stone_level,
+               p.farm_level, p.barracks_level, p.country,
+               p.gold, p.iron, p.stone, p.food, p.wood, c.special_resource
+        FROM players p
+        LEFT JOIN countries c ON p.country = c.name
+        WHERE p.user_id = ?
+    ''', (user_id,), fetchone=True)
+    
+    if player:
+        mine_gold, mine_iron, mine_stone, farm, barracks, country, gold, iron, stone, food, wood, special_resource = player
         
-        # ========== معادن و مزارع ==========
-        elif call.data == "mines_farms":
-            player = execute_query('''
-                SELECT mine_gold_level, mine_iron_level, mine_stone_level,
-                       farm_level, barracks_level, country,
-                       gold, iron, stone, food, wood
-                FROM players WHERE user_id = ?
-            ''', (user_id,), fetchone=True)
-            
-            if player:
-                mine_gold, mine_iron, mine_stone, farm, barracks, country, gold, iron, stone, food, wood = player
-                
-                production = calculate_daily_production(user_id)
-                
-                text = f"""⛏️ **معادن و مزارع{' - ' + country if country else ''}**
+        production = production_for(mine_gold, mine_iron, mine_stone, farm, special_resource)
+
+        text = f"""⛏️ **معادن و مزارع{' - ' + country if country else ''}**
 
 🏭 **سطح سازه‌های شما:**
 💰 معدن طلا: سطح {mine_gold} (تولید: {production['gold'] if production else 0}/روز)
@@ -797,43 +939,44 @@ def handle_callback(call):
 • چوب: {wood}
 
 💡 برای ارتقاء سازه‌ها یا جمع‌آوری منابع گزینه مورد نظر را انتخاب کنید:"""
-            else:
-                text = "⚠️ شما هنوز کشوری ندارید!"
-            
-            bot.edit_message_text(
-                chat_id=call.message.chat.id,
-                message_id=call.message.message_id,
-                text=text,
-                parse_mode='Markdown',
-                reply_markup=mines_menu()
-            )
+    else:
+        text = "⚠️ شما هنوز کشوری ندارید!"
+    
+    edit_screen(
+        call,
+        text=text,
+        parse_mode='Markdown',
+        reply_markup=mines_menu()
+    )
+
+# ========== جمع‌آوری منابع ==========
+@callback_router.route("collect_resources")
+def _on_collect_resources(call):
+    user_id = call.from_user.id
+    production = calculate_daily_production(user_id)
+    
+    if production:
+        # افزودن منابع
+        execute_query('''
+            UPDATE players 
+            SET gold = gold + ?, 
+                iron = iron + ?, 
+                stone = stone + ?, 
+                food = food + ?,
+                wood = wood + ?,
+                last_active = ?
+            WHERE user_id = ?
+        ''', (
+            production['gold'],
+            production['iron'],
+            production['stone'],
+            production['food'],
+            production['wood'],
+            timeutil.now(),
+            user_id
+        ), commit=True)
         
-        # ========== جمع‌آوری منابع ==========
-        elif call.data == "collect_resources":
-            production = calculate_daily_production(user_id)
-            
-            if production:
-                # افزودن منابع
-                execute_query('''
-                    UPDATE players 
-                    SET gold = gold + ?, 
-                        iron = iron + ?, 
-                        stone = stone + ?, 
-                        food = food + ?,
-                        wood = wood + ?,
-                        last_active = ?
-                    WHERE user_id = ?
-                ''', (
-                    production['gold'],
-                    production['iron'],
-                    production['stone'],
-                    production['food'],
-                    production['wood'],
-                    datetime.now(),
-                    user_id
-                ), commit=True)
-                
-                text = f"""📦 **منابع جمع‌آوری شد!**
+        text = f"""📦 **منابع جمع‌آوری شد!**
 
 💰 طلا: +{production['gold']}
 ⚒️ آهن: +{production['iron']}
@@ -842,20 +985,21 @@ def handle_callback(call):
 🌲 چوب: +{production['wood']}
 
 منابع به حساب شما اضافه شدند."""
-            else:
-                text = "⚠️ خطا در محاسبه تولید!"
-            
-            bot.edit_message_text(
-                chat_id=call.message.chat.id,
-                message_id=call.message.message_id,
-                text=text,
-                parse_mode='Markdown',
-                reply_markup=mines_menu()
-            )
-        
-        # ========== راهنما ==========
-        elif call.data == "help":
-            text = """ℹ️ **راهنمای بازی جنگ جهانی باستان**
+    else:
+        text = "⚠️ خطا در محاسبه تولید!"
+    
+    edit_screen(
+        call,
+        text=text,
+        parse_mode='Markdown',
+        reply_markup=mines_menu()
+    )
+
+# ========== راهنما ==========
+@callback_router.route("help", read_only=True)
+def _on_help(call):
+    user_id = call.from_user.id
+    text = """ℹ️ **راهنمای بازی جنگ جهانی باستان**
 
 🎮 **چگونه بازی کنیم؟**
 1. با دستور /start بازی را شروع کنید
@@ -873,190 +1017,203 @@ def handle_callback(call):
 • **مزرعه:** تولید غذا
 
 📞 **پشتیبانی:** @amele55"""
-            
-            bot.edit_message_text(
-                chat_id=call.message.chat.id,
-                message_id=call.message.message_id,
-                text=text,
-                parse_mode='Markdown',
-                reply_markup=main_menu(user_id)
-            )
-        
-        # ========== افزودن بازیکن (مالک) ==========
-        elif call.data == "add_player":
-            if user_id != OWNER_ID:
-                bot.answer_callback_query(call.id, "⛔ دسترسی ممنوع!")
-                return
-            
-            # نمایش کشورهای آزاد
-            countries = execute_query('SELECT name FROM countries WHERE controller = "AI"', fetchall=True)
-            
-            if not countries:
-                bot.edit_message_text(
-                    chat_id=call.message.chat.id,
-                    message_id=call.message.message_id,
-                    text="⚠️ هیچ کشور آزادی وجود ندارد!",
-                    reply_markup=main_menu(user_id)
-                )
-                return
-            
-            keyboard = InlineKeyboardMarkup()
-            for country in countries:
-                keyboard.row(InlineKeyboardButton(
-                    f"🏛️ {country[0]}",
-                    callback_data=f"select_{country[0]}"
-                ))
-            keyboard.row(InlineKeyboardButton("🔙 بازگشت", callback_data="main_menu"))
-            
-            bot.edit_message_text(
-                chat_id=call.message.chat.id,
-                message_id=call.message.message_id,
-                text="🏛️ انتخاب کشور برای بازیکن جدید:\n\nکشورهای آزاد:",
-                reply_markup=keyboard
-            )
-        
-        # ========== انتخاب کشور برای بازیکن جدید ==========
-        elif call.data.startswith("select_"):
-            if user_id != OWNER_ID:
-                return
-            
-            country_name = call.data.replace("select_", "")
-            bot.edit_message_text(
-                chat_id=call.message.chat.id,
-                message_id=call.message.message_id,
-                text=f"کشور '{country_name}' انتخاب شد.\n\nلطفاً آیدی عددی کاربر را ارسال کنید:"
-            )
-            bot.register_next_step_handler(call.message, lambda m: add_player_step(m, country_name))
-        
-        # ========== شروع فصل ==========
-        elif call.data == "start_season":
-            if user_id != OWNER_ID:
-                bot.answer_callback_query(call.id, "⛔ دسترسی ممنوع!")
-                return
-            
-            try:
-                if CHANNEL_ID:
-                    bot.send_message(
-                        CHANNEL_ID,
-                        "🎉 **شروع فصل جدید جنگ‌های باستان!**\n\n"
-                        "جهان باستان زنده شد! کشورها برای فتح جهان آماده می‌شوند...\n\n"
-                        "ساخته شده توسط @amele55\n"
-                        "ورژن 3.0 ربات"
-                    )
-                
-                bot.edit_message_text(
-                    chat_id=call.message.chat.id,
-                    message_id=call.message.message_id,
-                    text="✅ فصل جدید با موفقیت شروع شد!",
-                    reply_markup=main_menu(user_id)
-                )
-            except Exception as e:
-                bot.edit_message_text(
-                    chat_id=call.message.chat.id,
-                    message_id=call.message.message_id,
-                    text=f"❌ خطا در شروع فصل: {str(e)}",
-                    reply_markup=main_menu(user_id)
-                )
-        
-        # ========== ریست بازی ==========
-        elif call.data == "reset_game":
-            if user_id != OWNER_ID:
-                bot.answer_callback_query(call.id, "⛔ دسترسی ممنوع!")
-                return
-            
-            keyboard = InlineKeyboardMarkup()
-            keyboard.row(
-                InlineKeyboardButton("✅ بله، ریست کن", callback_data="confirm_reset"),
-                InlineKeyboardButton("❌ خیر، لغو", callback_data="main_menu")
-            )
-            
-            bot.edit_message_text(
-                chat_id=call.message.chat.id,
-                message_id=call.message.message_id,
-                text="⚠️ **هشدار: ریست کامل بازی**\n\nآیا مطمئن هستید؟\nهمه داده‌ها پاک می‌شوند!",
-                reply_markup=keyboard
+    
+    edit_screen(
+        call,
+        text=text,
+        parse_mode='Markdown',
+        reply_markup=main_menu(user_id)
+    )
+
+# ========== افزودن بازیکن (مالک) ==========
+@callback_router.route("add_player")
+def _on_add_player(call):
+    user_id = call.from_user.id
+    if user_id != OWNER_ID:
+        bot.answer_callback_query(call.id, "⛔ دسترسی ممنوع!")
+        return
+    
+    # نمایش کشورهای آزاد
+    countries = execute_query('SELECT name FROM countries WHERE controller = "AI"', fetchall=True)
+    
+    if not countries:
+        edit_screen(
+            call,
+            text="⚠️ هیچ کشور آزادی وجود ندارد!",
+            reply_markup=main_menu(user_id)
+        )
+        return
+    
+    keyboard = InlineKeyboardMarkup()
+    for country in countries:
+        keyboard.row(InlineKeyboardButton(
+            f"🏛️ {country[0]}",
+            callback_data=callback_router.encode("select", country[0])
+        ))
+    keyboard.row(InlineKeyboardButton("🔙 بازگشت", callback_data=callback_router.encode("main_menu")))
+    
+    edit_screen(
+        call,
+        text="🏛️ انتخاب کشور برای بازیکن جدید:\n\nکشورهای آزاد:",
+        reply_markup=keyboard
+    )
+
+# ========== انتخاب کشور برای بازیکن جدید ==========
+@callback_router.route("select", str)
+def _on_select(call, country_name):
+    user_id = call.from_user.id
+    if user_id != OWNER_ID:
+        return
+    
+    edit_screen(
+        call,
+        text=f"کشور '{country_name}' انتخاب شد.\n\nلطفاً آیدی عددی کاربر را ارسال کنید:"
+    )
+    bot.register_next_step_handler(call.message, lambda m: add_player_step(m, country_name))
+
+# ========== شروع فصل ==========
+@callback_router.route("start_season")
+def _on_start_season(call):
+    user_id = call.from_user.id
+    if user_id != OWNER_ID:
+        bot.answer_callback_query(call.id, "⛔ دسترسی ممنوع!")
+        return
+    
+    try:
+        if CHANNEL_ID:
+            bot.send_message(
+                CHANNEL_ID,
+                "🎉 **شروع فصل جدید جنگ‌های باستان!**\n\n"
+                "جهان باستان زنده شد! کشورها برای فتح جهان آماده می‌شوند...\n\n"
+                "ساخته شده توسط @amele55\n"
+                "ورژن 3.0 ربات"
             )
         
-        elif call.data == "confirm_reset":
-            if user_id != OWNER_ID:
-                return
-            
-            try:
-                # ریست بازیکنان
-                execute_query('''
-                    UPDATE players 
-                    SET country = NULL, 
-                        gold = 1000, iron = 500, stone = 500, food = 1000, wood = 500,
-                        army_infantry = 50, army_archer = 30, army_cavalry = 20,
-                        army_spearman = 40, army_thief = 10,
-                        defense_wall = 50, defense_tower = 20, defense_gate = 30,
-                        mine_gold_level = 1, mine_iron_level = 1, mine_stone_level = 1,
-                        farm_level = 1, barracks_level = 1
-                ''', commit=True)
-                
-                # ریست کشورها
-                execute_query('UPDATE countries SET controller = "AI", player_id = NULL', commit=True)
-                
-                # پاک کردن جدول‌های دیگر
-                execute_query('DELETE FROM battles', commit=True)
-                execute_query('DELETE FROM diplomacy', commit=True)
-                
-                bot.edit_message_text(
-                    chat_id=call.message.chat.id,
-                    message_id=call.message.message_id,
-                    text="✅ بازی با موفقیت ریست شد!\nهمه کشورها آزاد شدند.",
-                    reply_markup=main_menu(user_id)
-                )
-            except Exception as e:
-                bot.edit_message_text(
-                    chat_id=call.message.chat.id,
-                    message_id=call.message.message_id,
-                    text=f"❌ خطا در ریست بازی: {str(e)}",
-                    reply_markup=main_menu(user_id)
-                )
-        
-        # ========== سایر دکمه‌ها ==========
-        elif call.data in ["army_infantry", "army_archer", "army_cavalry", "army_spearman", "army_thief",
-                          "attack_country", "defend_borders", "peace_request", "declare_war", 
-                          "request_alliance", "trade_offer", "view_diplomacy_offers",
-                          "mine_gold", "mine_iron", "mine_stone", "farm_food", "barracks"]:
-            
-            # برای سادگی، فعلاً پیام در حال توسعه نشان می‌دهیم
-            action_names = {
-                "army_infantry": "👮 پیاده نظام",
-                "army_archer": "🏹 کمانداران",
-                "army_cavalry": "🐎 سوارهنظام",
-                "army_spearman": "🗡️ نیزه‌داران",
-                "army_thief": "👤 دزدان",
-                "attack_country": "⚔️ حمله به کشور",
-                "defend_borders": "🏰 دفاع از مرز",
-                "peace_request": "🕊️ درخواست صلح",
-                "declare_war": "⚔️ اعلام جنگ",
-                "request_alliance": "🤝 درخواست اتحاد",
-                "trade_offer": "💰 پیشنهاد تجارت",
-                "view_diplomacy_offers": "📜 مشاهده پیشنهادها",
-                "mine_gold": "💰 معدن طلا",
-                "mine_iron": "⚒️ معدن آهن",
-                "mine_stone": "🪨 معدن سنگ",
-                "farm_food": "🌾 مزرعه غذا",
-                "barracks": "🏗️ کارخانه سرباز"
-            }
-            
-            action_name = action_names.get(call.data, call.data)
-            
-            bot.edit_message_text(
-                chat_id=call.message.chat.id,
-                message_id=call.message.message_id,
-                text=f"🛠️ **{action_name}**\n\nاین بخش به زودی فعال خواهد شد!\nدر حال حاضر می‌توانید از سایر بخش‌ها استفاده کنید.",
-                reply_markup=main_menu(user_id)
-            )
+        edit_screen(
+            call,
+            text="✅ فصل جدید با موفقیت شروع شد!",
+            reply_markup=main_menu(user_id)
+        )
+    except Exception as e:
+        edit_screen(
+            call,
+            text=f"❌ خطا در شروع فصل: {str(e)}",
+            reply_markup=main_menu(user_id)
+        )
+
+# ========== ریست بازی ==========
+@callback_router.route("reset_game")
+def _on_reset_game(call):
+    user_id = call.from_user.id
+    if user_id != OWNER_ID:
+        bot.answer_callback_query(call.id, "⛔ دسترسی ممنوع!")
+        return
+    
+    keyboard = InlineKeyboardMarkup()
+    keyboard.row(
+        InlineKeyboardButton("✅ بله، ریست کن", callback_data=callback_router.encode("confirm_reset")),
+        InlineKeyboardButton("❌ خیر، لغو", callback_data=callback_router.encode("main_menu"))
+    )
+    
+    edit_screen(
+        call,
+        text="⚠️ **هشدار: ریست کامل بازی**\n\nآیا مطمئن هستید؟\nهمه داده‌ها پاک می‌شوند!",
+        reply_markup=keyboard
+    )
+
+@callback_router.route("confirm_reset")
+def _on_confirm_reset(call):
+    user_id = call.from_user.id
+    if user_id != OWNER_ID:
+        return
+    
+    try:
+        # همه مراحل ریست در یک تراکنش
+        run_write(reset_game)
         
-        else:
-            bot.answer_callback_query(call.id, "⚠️ این دکمه هنوز فعال نشده است!")
-            
+        edit_screen(
+            call,
+            text="✅ بازی با موفقیت ریست شد!\nهمه کشورها آزاد شدند.",
+            reply_markup=main_menu(user_id)
+        )
     except Exception as e:
-        logger.error(f"خطا در هندلر کالبک: {e}")
-        bot.answer_callback_query(call.id, "⚠️ خطایی رخ داد! لطفاً دوباره تلاش کنید.")
+        edit_screen(
+            call,
+            text=f"❌ خطا در ریست بازی: {str(e)}",
+            reply_markup=main_menu(user_id)
+        )
+
+# ========== بخش‌های در حال توسعه ==========
+# برای سادگی، فعلاً پیام در حال توسعه نشان می‌دهیم
+UNDER_DEVELOPMENT = {
+    "army_infantry": "👮 پیاده نظام",
+    "army_archer": "🏹 کمانداران",
+    "army_cavalry": "🐎 سوارهنظام",
+    "army_spearman": "🗡️ نیزه‌داران",
+    "army_thief": "👤 دزدان",
+    "attack_country": "⚔️ حمله به کشور",
+    "defend_borders": "🏰 دفاع از مرز",
+    "peace_request": "🕊️ درخواست صلح",
+    "declare_war": "⚔️ اعلام جنگ",
+    "request_alliance": "🤝 درخواست اتحاد",
+    "trade_offer": "💰 پیشنهاد تجارت",
+    "view_diplomacy_offers": "📜 مشاهده پیشنهادها",
+    "mine_gold": "💰 معدن طلا",
+    "mine_iron": "⚒️ معدن آهن",
+    "mine_stone": "🪨 معدن سنگ",
+    "farm_food": "🌾 مزرعه غذا",
+    "barracks": "🏗️ کارخانه سرباز"
+}
+
+def _on_under_development(call, action):
+    user_id = call.from_user.id
+    action_name = UNDER_DEVELOPMENT.get(action, action)
+    
+    edit_screen(
+        call,
+        text=f"🛠️ **{action_name}**\n\nاین بخش به زودی فعال خواهد شد!\nدر حال حاضر می‌توانید از سایر بخش‌ها استفاده کنید.",
+        reply_markup=main_menu(user_id)
+    )
+
+for _action in UNDER_DEVELOPMENT:
+    callback_router.define(_action, handler=partial(_on_under_development, action=_action), read_only=True)
+
+# دکمه‌هایی که هنوز پاسخی ندارند
+callback_router.define("end_season")
+callback_router.define("stats")
+
+def reset_game(conn):
+    """ریست کامل بازی (تابع نوشتنی برای run_write)"""
+    # ریست بازیکنان
+    db_pool.execute(conn, '''
+        UPDATE players 
+        SET country = NULL, 
+            gold = 1000, iron = 500, stone = 500, food = 1000, wood = 500,
+            army_infantry = 50, army_archer = 30, army_cavalry = 20,
+            army_spearman = 40, army_thief = 10,
+            defense_wall = 50, defense_tower = 20, defense_gate = 30,
+            mine_gold_level = 1, mine_iron_level = 1, mine_stone_level = 1,
+            farm_level = 1, barracks_level = 1
+    ''')
+    
+    # ریست کشورها
+    db_pool.execute(conn, 'UPDATE countries SET controller = "AI", player_id = NULL')
+    
+    # پاک کردن جدول‌های دیگر
+    db_pool.execute(conn, 'DELETE FROM battles')
+    db_pool.execute(conn, 'DELETE FROM diplomacy')
+
+def assign_country(new_user_id, country_name, conn):
+    """اختصاص کشور به بازیکن (تابع نوشتنی برای run_write)"""
+    db_pool.execute(conn, 'UPDATE countries SET controller = "HUMAN", player_id = ? WHERE name = ?',
+                    (new_user_id, country_name))
+    
+    # به‌روزرسانی بازیکن، و اگر بازیکن وجود ندارد ایجاد کن
+    updated = db_pool.execute(conn, 'UPDATE players SET country = ? WHERE user_id = ?',
+                              (country_name, new_user_id)).rowcount
+    if updated == 0:
+        db_pool.execute(conn, 'INSERT INTO players (user_id, country, join_date, last_active) VALUES (?, ?, ?, ?)',
+                        (new_user_id, country_name, timeutil.now(), timeutil.now()))
 
 def add_player_step(message, country_name):
     """افزودن بازیکن جدید"""
@@ -1076,18 +1233,9 @@ def add_player_step(message, country_name):
             bot.reply_to(message, "❌ این کشور قبلاً اشغال شده است!")
             return
         
-        # اختصاص کشور به بازیکن
-        execute_query('UPDATE countries SET controller = "HUMAN", player_id = ? WHERE name = ?',
-                     (new_user_id, country_name), commit=True)
-        
-        # به‌روزرسانی بازیکن
-        execute_query('UPDATE players SET country = ? WHERE user_id = ?', (country_name, new_user_id), commit=True)
-        
-        # اگر بازیکن وجود ندارد، ایجاد کن
-        if execute_query('SELECT COUNT(*) FROM players WHERE user_id = ?', (new_user_id,), fetchone=True)[0] == 0:
-            execute_query('INSERT INTO players (user_id, country, join_date, last_active) VALUES (?, ?, ?, ?)',
-                         (new_user_id, country_name, datetime.now(), datetime.now()), commit=True)
-        
+        # اختصاص کشور به بازیکن (یک تراکنش)
+        run_write(assign_country, new_user_id, country_name)
+
         # اطلاع به مالک
         bot.reply_to(
             message,
@@ -1112,6 +1260,26 @@ def add_player_step(message, country_name):
     except Exception as e:
         bot.reply_to(message, f"❌ خطا: {str(e)}")
 
+# ========== صف آپدیت‌ها ==========
+def update_key(update):
+    """کلید ترتیب: آپدیت‌های یک کاربر به ترتیب و پشت سر هم پردازش می‌شوند"""
+    for event in (update.message, update.edited_message, update.callback_query, update.inline_query):
+        if event is not None and getattr(event, 'from_user', None) is not None:
+            return event.from_user.id
+    if update.message is not None:
+        return update.message.chat.id
+    return update.update_id
+
+update_dispatcher = OrderedDispatcher(
+    lambda update: bot.process_new_updates([update]),
+    workers=UPDATE_WORKERS,
+    capacity=UPDATE_QUEUE_SIZE,
+    name='update-worker',
+).start()
+
+# آپدیت‌های تکراری (ارسال مجدد تلگرام) قبل از هر پردازشی کنار گذاشته می‌شوند
+update_dedupe = DedupeWindow(path=UPDATE_DEDUPE_DB or None)
+
 # ========== Webhook برای Render ==========
 @app.route('/', methods=['GET'])
 def index():
@@ -1189,7 +1357,13 @@ def webhook():
     if request.headers.get('content-type') == 'application/json':
         json_string = request.get_data().decode('utf-8')
         update = telebot.types.Update.de_json(json_string)
-        bot.process_new_updates([update])
+        keys = update_keys(update)
+        if update_dedupe.seen(*keys):
+            return '', 200
+        # پاسخ فوری؛ پردازش در صف. اگر صف پر باشد 503 تا تلگرام بعداً دوباره بفرستد
+        if not update_dispatcher.submit(update_key(update), update):
+            update_dedupe.forget(*keys)
+            return 'Busy', 503
         return '', 200
     return 'Bad Request', 400
 
@@ -1200,7 +1374,10 @@ def health_check():
         'status': 'healthy',
         'service': 'Ancient War Bot',
         'version': '3.0',
-        'timestamp': datetime.now().isoformat()
+        'timestamp': datetime.now().isoformat(),
+        'updates': dict(update_dispatcher.stats(), duplicates=update_dedupe.duplicates),
+        'routes': callback_router.stats(),
+        'screens': screen_cache.stats()
     }), 200
 
 # ========== راه‌اندازی ==========
@@ -1215,6 +1392,11 @@ if __name__ == '__main__':
     logger.info(f"🌐 پورت: {port}")
     logger.info("=" * 50)
     
+    # پشتیبان‌گیری آنلاین دوره‌ای (فقط SQLite)
+    if BACKUP_INTERVAL and db_pool.backend == 'sqlite':
+        BackupScheduler(BACKUP_INTERVAL, sources=(db_pool.path,)).start()
+        logger.info(f"💾 پشتیبان‌گیری هر {BACKUP_INTERVAL} ثانیه")
+    
     # تنظیم Webhook روی Render
     if 'RENDER' in os.environ or WEBHOOK_URL:
         logger.info("🚀 راه‌اندازی در حالت Production (Webhook)")
@@ -0,0 +1,131 @@
+"""Versioned schema migrations.
+
+Each component that owns tables in the database (the game logic schema in
+database.py, the bot schema in main.py) keeps an ordered list of migration
+functions and its applied version in schema_migrations. Startup costs one
+SELECT when the schema is current; otherwise only the missing migrations
+run, all in one transaction.
+
+A migration is a function (conn, db) where db is a pool from db_pool (or
+SQLiteExecutor for a plain sqlite3 connection) providing execute(conn, query,
+params) and executemany(conn, query, seq_of_params) with qmark placeholders.
+Migrations must never be reordered or edited once shipped; append new ones.
+"""
+import logging
+import re
+
+from timeutil import NOW_SQL, text_to_epoch_sql
+
+logger = logging.getLogger(__name__)
+
+MIGRATIONS_TABLE_SQL = '''
+    CREATE TABLE IF NOT EXISTS schema_migrations (
+        component TEXT PRIMARY KEY,
+        version INTEGER NOT NULL,
+        applied_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+    )
+'''
+
+
+class SQLiteExecutor:
+    """db_pool-style executor for a plain sqlite3 connection"""
+
+    backend = 'sqlite'
+
+    @staticmethod
+    def execute(conn, query, params=()):
+        return conn.execute(query, params)
+
+    @staticmethod
+    def executemany(conn, query, seq_of_params):
+        return conn.executemany(query, seq_of_params)
+
+
+def current_version(conn, component, db=SQLiteExecutor):
+    row = db.execute(
+        conn, 'SELECT version FROM schema_migrations WHERE component = ?', (component,)
+    ).fetchone()
+    return row[0] if row else 0
+
+
+def _lock(conn, db):
+    """Start the migration transaction, serialising concurrent boots"""
+    if db.backend == 'sqlite':
+        # sqlite3 does not open a transaction for DDL on its own
+        if conn.in_transaction:
+            conn.commit()
+        conn.execute('BEGIN IMMEDIATE')
+    else:
+        db.execute(conn, 'LOCK TABLE schema_migrations IN SHARE ROW EXCLUSIVE MODE')
+
+
+def migrate(conn, component, migrations, db=SQLiteExecutor):
+    """Apply the migrations of component not yet recorded; returns how many ran"""
+    db.execute(conn, MIGRATIONS_TABLE_SQL)
+    if current_version(conn, component, db) >= len(migrations):
+        conn.commit()
+        return 0
+
+    _lock(conn, db)
+    try:
+        # Another worker may have migrated while we waited for the lock
+        version = current_version(conn, component, db)
+        for migration in migrations[version:]:
+            migration(conn, db)
+        db.execute(conn, '''
+            INSERT INTO schema_migrations (component, version)
+            VALUES (?, ?)
+            ON CONFLICT (component) DO UPDATE
+            SET version = excluded.version, applied_at = CURRENT_TIMESTAMP
+        ''', (component, len(migrations)))
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+
+    applied = len(migrations) - version
+    if applied:
+        logger.info("Applied %d %s migration(s), schema at version %d", applied, component, len(migrations))
+    return applied
+
+
+def high_water(conn, table):
+    """AUTOINCREMENT high-water mark of a SQLite table, or None"""
+    if not conn.execute("SELECT 1 FROM sqlite_master WHERE name = 'sqlite_sequence'").fetchone():
+        return None
+    row = conn.execute('SELECT seq FROM sqlite_sequence WHERE name = ?', (table,)).fetchone()
+    return row[0] if row else None
+
+
+def restore_high_water(conn, table, seq):
+    """Keep a rebuilt AUTOINCREMENT table from reusing ids the old one handed out"""
+    if seq is not None:
+        conn.execute('UPDATE sqlite_sequence SET seq = MAX(seq, ?) WHERE name = ?', (seq, table))
+
+
+def rebuild_with_epoch_columns(conn, table, columns):
+    """Rebuild a SQLite table so TIMESTAMP columns hold integer epoch seconds
+
+    SQLite cannot change a column's type or default in place, so the table
+    is recreated from its stored DDL with the columns retyped INTEGER and
+    CURRENT_TIMESTAMP defaults replaced by the epoch, then copied across
+    with text values converted. The AUTOINCREMENT high-water mark is kept.
+    Indexes on the table are dropped with it; recreate them afterwards.
+    """
+    sql = conn.execute(
+        "SELECT sql FROM sqlite_master WHERE type = 'table' AND name = ?", (table,)
+    ).fetchone()[0]
+    for column in columns:
+        sql = re.sub(rf'\b{column}\s+TIMESTAMP\s+DEFAULT\s+CURRENT_TIMESTAMP',
+                     f'{column} INTEGER DEFAULT ({NOW_SQL})', sql)
+        sql = re.sub(rf'\b{column}\s+TIMESTAMP\b', f'{column} INTEGER', sql)
+    sql = re.sub(rf'^CREATE TABLE\s+(IF NOT EXISTS\s+)?"?{table}"?', f'CREATE TABLE {table}_epoch', sql)
+
+    names = [row[1] for row in conn.execute(f'PRAGMA table_info({table})')]
+    select = ', '.join(text_to_epoch_sql(name) if name in columns else name for name in names)
+    conn.execute(sql)
+    conn.execute(f"INSERT INTO {table}_epoch ({', '.join(names)}) SELECT {select} FROM {table}")
+    seq = high_water(conn, table)
+    conn.execute(f'DROP TABLE {table}')
+    conn.execute(f'ALTER TABLE {table}_epoch RENAME TO {table}')
+    restore_high_water(conn, table, seq)
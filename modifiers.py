@@ -0,0 +1,46 @@
+"""Precomputed army stat tables.
+
+Final attack/defense/speed for every (army level, unique bonus) pair is built
+once at import from config, so upgrades are a dict lookup instead of a
+formula plus an if/elif chain over bonuses.
+"""
+from config import COUNTRIES, MAX_ARMY_LEVEL, ARMY_BASE_STATS
+
+STAT_NAMES = ('attack', 'defense', 'speed')
+STAT_GROWTH_PER_LEVEL = {'attack': 25, 'defense': 25, 'speed': 15}
+
+# Stat multipliers granted by each country's unique bonus
+ARMY_BONUS_MULTIPLIERS = {
+    'cavalry_speed': {'speed': 1.2},
+    'fortress_defense': {'defense': 1.25},
+    'phalanx': {'attack': 1.2},
+    'siege_masters': {'attack': 1.25},
+    'elephant_warfare': {'attack': 1.2},
+    'companion_cavalry': {'attack': 1.25, 'speed': 1.15},
+}
+
+# Every country's bonus, plus None for "no bonus"
+BONUSES = tuple(country['bonus'] for country in COUNTRIES) + (None,)
+
+
+def _compute_stats(level, bonus):
+    stats = {
+        stat: ARMY_BASE_STATS[stat] + (level - 1) * STAT_GROWTH_PER_LEVEL[stat]
+        for stat in STAT_NAMES
+    }
+    for stat, multiplier in ARMY_BONUS_MULTIPLIERS.get(bonus, {}).items():
+        stats[stat] = int(stats[stat] * multiplier)
+    return tuple(stats[stat] for stat in STAT_NAMES)
+
+
+# (level, bonus) -> (attack, defense, speed)
+ARMY_STATS = {
+    (level, bonus): _compute_stats(level, bonus)
+    for level in range(1, MAX_ARMY_LEVEL + 1)
+    for bonus in BONUSES
+}
+
+
+def army_stats(level, bonus):
+    """(attack, defense, speed) of an army at level for a country with bonus"""
+    return ARMY_STATS.get((level, bonus)) or ARMY_STATS[(level, None)]
@@ -0,0 +1,58 @@
+"""SQL for the hot read paths, shared with query_plans.py.
+
+Only constants live here, so the plan checker can import them without
+opening or migrating a database.
+"""
+import accrual
+import events
+from timeutil import DAY, ago_sql
+
+# ---- database.py schema ----
+
+# Human players with their country's current state; the owner is excluded
+ADVISOR_PLAYERS_SQL = f'''
+    SELECT p.country_id, p.telegram_id, c.name as country_name, c.unique_bonus,
+           a.level, a.attack_power, a.defense, a.speed,
+           {accrual.balance_columns('r')}
+    FROM players p
+    JOIN countries c ON p.country_id = c.id
+    JOIN army a ON c.id = a.country_id
+    JOIN resources r ON c.id = r.country_id
+    WHERE p.telegram_id != ?
+'''
+
+# Wars declared on a country in the last week, for one country or all of them
+RECENT_ATTACKS_SQL = f'''
+    SELECT COUNT(*) as hostile_count
+    FROM events e
+    WHERE e.event_type = {events.WAR}
+      AND e.country2_id = ? 
+      AND e.timestamp > {ago_sql(7 * DAY)}
+'''
+RECENT_ATTACKS_BY_COUNTRY_SQL = f'''
+    SELECT e.country2_id, COUNT(*) as hostile_count
+    FROM events e
+    WHERE e.event_type = {events.WAR}
+      AND e.timestamp > {ago_sql(7 * DAY)}
+    GROUP BY e.country2_id
+'''
+
+# ---- main.py schema ----
+
+# Player score on /stats; idx_players_score is built on exactly this expression
+SCORE_SQL = 'gold + iron * 2 + stone * 1.5 + food'
+
+TOP_PLAYERS_SQL = f'''
+    SELECT username, country, {SCORE_SQL} as score
+    FROM players
+    WHERE country IS NOT NULL
+    ORDER BY score DESC
+    LIMIT 5
+'''
+
+RECENT_BATTLES_SQL = '''
+    SELECT attacker_country, defender_country, result, battle_date
+    FROM battles
+    ORDER BY battle_date DESC
+    LIMIT 5
+'''
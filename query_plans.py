@@ -0,0 +1,127 @@
+"""EXPLAIN QUERY PLAN check for the hot queries.
+
+Every query in HOT_QUERIES must be answered through an index: a plan step
+that scans a whole table, or sorts through a temp b-tree, counts as a
+regression. Run against a database to verify its indexes:
+
+    python query_plans.py [path/to/game.db]
+
+The database is opened read-only. Queries are grouped by the schema
+component that owns their tables (database.py is 'game', main.py is 'bot');
+a component is checked when schema_migrations records it, and a query that
+fails to plan there (missing table or column) is a failure. Exits with
+status 1 if any query failed.
+"""
+import re
+import sqlite3
+import sys
+
+import season_archive
+from queries import (
+    ADVISOR_PLAYERS_SQL, RECENT_ATTACKS_SQL, RECENT_ATTACKS_BY_COUNTRY_SQL,
+    TOP_PLAYERS_SQL, RECENT_BATTLES_SQL,
+)
+
+# database.DB_PATH; not imported because importing database may create the schema
+DB_PATH = 'game.db'
+
+# (component, name, query, sample parameters)
+HOT_QUERIES = (
+    ('game', 'advisor_player', ADVISOR_PLAYERS_SQL + ' AND p.country_id = ?', (0, 1)),
+    ('game', 'advisor_players_batch', ADVISOR_PLAYERS_SQL + ' ORDER BY p.country_id, p.id', (0,)),
+    ('game', 'recent_attacks', RECENT_ATTACKS_SQL, (1,)),
+    ('game', 'recent_attacks_by_country', RECENT_ATTACKS_BY_COUNTRY_SQL, ()),
+    ('game', 'active_alliances', 'SELECT id, country1_id, country2_id FROM alliances WHERE end_date IS NULL', ()),
+    ('game', 'season_winner_player', 'SELECT id FROM players WHERE country_id = ? LIMIT 1', (1,)),
+    ('game', 'counter_window', '''
+        SELECT SUM(attacks_launched), SUM(attacks_received)
+        FROM country_counters
+        WHERE country_id = ? AND day > ?
+    ''', (1, 0)),
+    ('game', 'season_history', season_archive.HISTORY_SQL, (1, 10)),
+    ('bot', 'top_players', TOP_PLAYERS_SQL, ()),
+    ('bot', 'recent_battles', RECENT_BATTLES_SQL, ()),
+    ('bot', 'player_with_country', '''
+        SELECT p.mine_gold_level, p.mine_iron_level, p.mine_stone_level,
+               p.farm_level, c.special_resource
+        FROM players p
+        LEFT JOIN countries c ON p.country = c.name
+        WHERE p.user_id = ?
+    ''', (1,)),
+    ('bot', 'country_player', '''
+        SELECT p.user_id
+        FROM countries c
+        JOIN players p ON p.country = c.name
+        WHERE c.name = ?
+    ''', ('',)),
+    ('bot', 'players_with_country', 'SELECT COUNT(*) FROM players WHERE country IS NOT NULL', ()),
+)
+
+# "SCAN events" / "SCAN e" with no index after it
+FULL_SCAN = re.compile(r'^SCAN \S+$')
+
+
+def plan(cursor, query, params=()):
+    """Plan step details of a query"""
+    cursor.execute('EXPLAIN QUERY PLAN ' + query, params)
+    return [row[3] for row in cursor.fetchall()]
+
+
+def regressions(steps):
+    """Plan steps that scan a whole table or sort without an index"""
+    return [
+        step for step in steps
+        if FULL_SCAN.match(step) or step.startswith('USE TEMP B-TREE')
+    ]
+
+
+def components(conn):
+    """Schema components recorded in schema_migrations"""
+    try:
+        return {row[0] for row in conn.execute('SELECT component FROM schema_migrations')}
+    except sqlite3.OperationalError:
+        return set()
+
+
+def check(conn, queries=HOT_QUERIES):
+    """Check queries against conn; returns ({name: bad steps or error}, [skipped names])
+
+    Queries of components missing from the database are skipped.
+    """
+    present = components(conn)
+    cursor = conn.cursor()
+    failures = {}
+    skipped = []
+    for component, name, query, params in queries:
+        if component not in present:
+            skipped.append(name)
+            continue
+        try:
+            steps = plan(cursor, query, params)
+        except sqlite3.OperationalError as e:
+            failures[name] = [str(e)]
+            continue
+        bad = regressions(steps)
+        if bad:
+            failures[name] = bad
+    return failures, skipped
+
+
+def main(path=DB_PATH):
+    conn = sqlite3.connect(f'file:{path}?mode=ro', uri=True)
+    try:
+        failures, skipped = check(conn)
+    finally:
+        conn.close()
+    for component, name, query, params in HOT_QUERIES:
+        if name in skipped:
+            print(f'skip  {name} (no {component} schema)')
+        elif name in failures:
+            print(f'FAIL  {name}: {"; ".join(failures[name])}')
+        else:
+            print(f'ok    {name}')
+    return 1 if failures else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main(*sys.argv[1:2]))
@@ -0,0 +1,94 @@
+"""In-process cache of reference data: countries and the active season.
+
+Country rows (name, bonus, AI flag) only change when a country changes
+controller, and the active season only changes at season start/end, so both
+are loaded once and kept in memory. The write paths that change them update
+or invalidate the cache explicitly; after a rolled-back transaction call
+invalidate() so the next lookup reloads from the tables.
+"""
+import threading
+from collections import namedtuple
+
+from database import get_db_connection
+
+Country = namedtuple('Country', 'id name is_ai_controlled unique_bonus bonus_description')
+
+_UNKNOWN = object()
+
+
+class ReferenceData:
+    """Countries by id and name, plus the active season id"""
+
+    def __init__(self):
+        self._lock = threading.RLock()
+        self._countries = None  # country_id -> Country
+        self._by_name = None
+        self._season_id = _UNKNOWN
+
+    def _ensure_countries(self):
+        if self._countries is None:
+            cursor = get_db_connection().cursor()
+            cursor.execute('''
+                SELECT id, name, is_ai_controlled, unique_bonus, bonus_description
+                FROM countries ORDER BY id
+            ''')
+            self._countries = {
+                row[0]: Country(row[0], row[1], bool(row[2]), row[3], row[4])
+                for row in cursor.fetchall()
+            }
+            self._by_name = {country.name: country for country in self._countries.values()}
+
+    # ---- countries ----
+
+    def country(self, country_id):
+        """Country tuple for an id, or None"""
+        with self._lock:
+            self._ensure_countries()
+            return self._countries.get(country_id)
+
+    def name(self, country_id):
+        country = self.country(country_id)
+        return country.name if country else None
+
+    def country_by_name(self, name):
+        with self._lock:
+            self._ensure_countries()
+            return self._by_name.get(name)
+
+    def countries(self):
+        """All countries in id order"""
+        with self._lock:
+            self._ensure_countries()
+            return list(self._countries.values())
+
+    def invalidate_countries(self):
+        """Drop cached countries, e.g. after a controller change"""
+        with self._lock:
+            self._countries = None
+            self._by_name = None
+
+    # ---- season ----
+
+    def active_season_id(self):
+        """Id of the active season, or None between seasons"""
+        with self._lock:
+            if self._season_id is _UNKNOWN:
+                cursor = get_db_connection().cursor()
+                cursor.execute('SELECT id FROM seasons WHERE is_active = TRUE LIMIT 1')
+                row = cursor.fetchone()
+                self._season_id = row[0] if row else None
+            return self._season_id
+
+    def set_active_season(self, season_id):
+        """Record the season start_season/end_season just wrote (None when none is active)"""
+        with self._lock:
+            self._season_id = season_id
+
+    def invalidate(self):
+        """Drop everything; it is reloaded on next use"""
+        with self._lock:
+            self.invalidate_countries()
+            self._season_id = _UNKNOWN
+
+
+reference = ReferenceData()
@@ -0,0 +1,191 @@
+"""Callback router with compact, typed callback_data.
+
+Buttons carry '~' followed by URL-safe base64 (no padding) of the route code
+and its parameters, all as varints (strings length-prefixed UTF-8), e.g.
+main_menu is 4 characters. The code is derived from the route name
+(CRC-32, 16 bits), so it stays the same across deploys and old buttons keep
+working; a collision is reported when the route is registered.
+
+Data without the '~' marker is parsed in the old `name_param1_param2` form,
+so buttons already sent to chats before the switch still route.
+
+Lookups are dict hits by code (or name), and every route counts its calls,
+failures and time spent.
+"""
+import base64
+import threading
+import time
+import zlib
+
+MARKER = '~'
+MAX_DATA = 64  # Telegram's callback_data limit in bytes
+
+
+def _varint(value):
+    if value < 0:
+        raise ValueError("callback parameters must be non-negative")
+    out = bytearray()
+    while True:
+        byte = value & 0x7f
+        value >>= 7
+        if value:
+            out.append(byte | 0x80)
+        else:
+            out.append(byte)
+            return bytes(out)
+
+
+def _read_varint(data, pos):
+    value = shift = 0
+    while True:
+        byte = data[pos]
+        pos += 1
+        value |= (byte & 0x7f) << shift
+        if not byte & 0x80:
+            return value, pos
+        shift += 7
+
+
+def _pack(value, kind):
+    if kind is int:
+        return _varint(value)
+    raw = str(value).encode('utf-8')
+    return _varint(len(raw)) + raw
+
+
+def _unpack(data, pos, kind):
+    value, pos = _read_varint(data, pos)
+    if kind is int:
+        return value, pos
+    return data[pos:pos + value].decode('utf-8'), pos + value
+
+
+class Route:
+    """A callback name, its parameter types, handler and counters"""
+
+    __slots__ = ('name', 'code', 'params', 'handler', 'read_only', 'calls', 'failures', 'seconds')
+
+    def __init__(self, name, code, params, handler=None, read_only=False):
+        self.name = name
+        self.code = code
+        self.params = params
+        self.handler = handler
+        self.read_only = read_only
+        self.calls = 0
+        self.failures = 0
+        self.seconds = 0.0
+
+
+class CallbackRouter:
+    """Maps callback_data to registered handlers"""
+
+    def __init__(self):
+        self._by_code = {}
+        self._by_name = {}
+        self._stats_lock = threading.Lock()
+
+    def define(self, name, *params, handler=None, read_only=False):
+        """Register a route; params are int or str. Returns the Route"""
+        code = zlib.crc32(name.encode('utf-8')) & 0xffff
+        clash = self._by_code.get(code)
+        if clash is not None and clash.name != name:
+            raise ValueError(f"callback routes {name!r} and {clash.name!r} share code {code}")
+        route = Route(name, code, params, handler, read_only)
+        self._by_code[code] = route
+        self._by_name[name] = route
+        return route
+
+    def route(self, name, *params, read_only=False):
+        """Decorator registering handler(call, *params) for name"""
+        def register(handler):
+            self.define(name, *params, handler=handler, read_only=read_only)
+            return handler
+        return register
+
+    # ---- callback_data ----
+
+    def encode(self, name, *args):
+        route = self._by_name[name]
+        if len(args) != len(route.params):
+            raise TypeError(f"{name} takes {len(route.params)} parameter(s), got {len(args)}")
+        raw = _varint(route.code) + b''.join(_pack(arg, kind) for arg, kind in zip(args, route.params))
+        data = MARKER + base64.urlsafe_b64encode(raw).rstrip(b'=').decode('ascii')
+        if len(data.encode('utf-8')) > MAX_DATA:
+            raise ValueError(f"callback_data for {name} exceeds {MAX_DATA} bytes")
+        return data
+
+    def resolve(self, data):
+        """(route, args) for callback_data, or (None, ()) if it matches no route"""
+        if not data:
+            return None, ()
+        if data.startswith(MARKER):
+            return self._decode(data[1:])
+        return self._legacy(data)
+
+    def _decode(self, text):
+        try:
+            raw = base64.urlsafe_b64decode(text + '=' * (-len(text) % 4))
+            code, pos = _read_varint(raw, 0)
+            route = self._by_code.get(code)
+            if route is None:
+                return None, ()
+            args = []
+            for kind in route.params:
+                value, pos = _unpack(raw, pos, kind)
+                args.append(value)
+        except (ValueError, IndexError, UnicodeDecodeError):
+            return None, ()
+        return route, tuple(args)
+
+    def _legacy(self, data):
+        route = self._by_name.get(data)
+        if route is not None and not route.params:
+            return route, ()
+        # name_param1_param2: try the prefixes that leave the right number of parameters
+        parts = data.split('_')
+        for split in range(len(parts) - 1, 0, -1):
+            route = self._by_name.get('_'.join(parts[:split]))
+            if route is None or not route.params:
+                continue
+            values = parts[split:]
+            if len(route.params) == 1:
+                values = ['_'.join(values)]
+            if len(values) != len(route.params):
+                continue
+            try:
+                return route, tuple(kind(value) for kind, value in zip(route.params, values))
+            except ValueError:
+                continue
+        return None, ()
+
+    # ---- dispatch ----
+
+    def dispatch(self, call, route=None, args=()):
+        """Run the handler for call.data; returns False if no handler matches"""
+        if route is None:
+            route, args = self.resolve(call.data)
+        if route is None or route.handler is None:
+            return False
+        started = time.perf_counter()
+        try:
+            route.handler(call, *args)
+        except Exception:
+            with self._stats_lock:
+                route.failures += 1
+            raise
+        finally:
+            with self._stats_lock:
+                route.calls += 1
+                route.seconds += time.perf_counter() - started
+        return True
+
+    def stats(self):
+        """{name: {calls, failures, avg_ms}} for routes that have been called"""
+        return {
+            route.name: {
+                'calls': route.calls,
+                'failures': route.failures,
+                'avg_ms': round(route.seconds * 1000 / route.calls, 2),
+            }
+            for route in self._by_name.values() if route.calls
+        }
@@ -0,0 +1,62 @@
+"""Skip message edits that would not change what the user sees.
+
+Most callbacks re-render a whole screen (text plus inline keyboard) and edit
+the message in place, even when nothing changed. Telegram rejects such an
+edit with "message is not modified" after a full round trip. ScreenCache
+remembers a hash of the last screen rendered into each (chat, message) and
+reports whether a new one differs, so the caller can skip the edit.
+
+The cache is an LRU bounded to max_entries messages. A message edited by
+any other path must be forgotten, or a later identical render is skipped.
+"""
+import hashlib
+import threading
+from collections import OrderedDict
+
+MAX_ENTRIES = 10000
+
+
+def fingerprint(text, reply_markup=None, parse_mode=None):
+    """Digest of a rendered screen; markups are hashed by their JSON"""
+    digest = hashlib.blake2b(digest_size=16)
+    for part in (text, parse_mode or '', reply_markup.to_json() if reply_markup is not None else ''):
+        raw = part.encode('utf-8')
+        digest.update(len(raw).to_bytes(4, 'big'))
+        digest.update(raw)
+    return digest.digest()
+
+
+class ScreenCache:
+    """Last rendered screen per (chat_id, message_id), bounded"""
+
+    def __init__(self, max_entries=MAX_ENTRIES):
+        self.max_entries = max_entries
+        self._screens = OrderedDict()  # (chat_id, message_id) -> fingerprint, oldest first
+        self._lock = threading.Lock()
+        self.skipped = 0
+        self.edited = 0
+
+    def update(self, chat_id, message_id, text, reply_markup=None, parse_mode=None):
+        """Record the screen; False if it is identical to the one already shown"""
+        key = (chat_id, message_id)
+        screen = fingerprint(text, reply_markup, parse_mode)
+        with self._lock:
+            if self._screens.get(key) == screen:
+                self._screens.move_to_end(key)
+                self.skipped += 1
+                return False
+            self._screens[key] = screen
+            self._screens.move_to_end(key)
+            while len(self._screens) > self.max_entries:
+                self._screens.popitem(last=False)
+            self.edited += 1
+            return True
+
+    def forget(self, chat_id, message_id):
+        """Drop a message whose content is no longer known (failed or outside edit)"""
+        with self._lock:
+            self._screens.pop((chat_id, message_id), None)
+
+    def stats(self):
+        with self._lock:
+            return {'entries': len(self._screens), 'edited': self.edited, 'skipped': self.skipped}
@@ -0,0 +1,174 @@
+"""End-of-season archiving and per-country rollups.
+
+When a season finishes its events, and the alliances that have ended, move
+out of the live tables into game_archive.db, attached to the writer
+connection as `archive`. A compact per-country summary of the season is
+written to season_rollups in the live database first. The live tables then
+only ever hold the running season, and season history reads season_rollups.
+
+Attached databases in WAL mode do not commit atomically together, so a
+season moves in two transactions: close_season copies it into the archive,
+and once that has committed purge_season deletes from the live tables only
+the rows the archive holds. A crash in between leaves rows in both places,
+never in neither. Copies are INSERT OR IGNORE on (season archived with,
+live id), so running either step again is harmless; the season is part of
+the key because a re-formed alliance reuses its live row.
+"""
+import events
+
+ARCHIVE_PATH = 'game_archive.db'
+
+ARCHIVE_PRAGMAS = (
+    'PRAGMA archive.journal_mode = WAL',
+    'PRAGMA archive.synchronous = NORMAL',
+)
+
+ROLLUP_COLUMNS = (
+    'attacks_launched', 'attacks_won', 'attacks_received', 'alliances_formed',
+    'betrayals', 'tribute_sent', 'tribute_received', 'peak_level',
+)
+
+# One pass over the season's events, each country seen as actor and as target
+ROLLUP_SQL = f'''
+    WITH season_events AS (
+        SELECT event_type, outcome, country1_id, country2_id, value
+        FROM events WHERE season_id = :season_id
+    ),
+    per_country (country_id, {', '.join(ROLLUP_COLUMNS)}) AS (
+        SELECT country1_id,
+               SUM(event_type = {events.WAR}),
+               SUM(event_type = {events.WAR} AND outcome != {events.DEFEAT}),
+               0,
+               SUM(event_type = {events.ALLIANCE}),
+               SUM(event_type = {events.BETRAYAL}),
+               SUM(CASE WHEN event_type = {events.TRIBUTE} THEN value ELSE 0 END),
+               0,
+               MAX(CASE WHEN event_type = {events.ARMY_UPGRADE} THEN value END)
+        FROM season_events WHERE country1_id IS NOT NULL
+        GROUP BY country1_id
+        UNION ALL
+        SELECT country2_id,
+               0,
+               0,
+               SUM(event_type = {events.WAR}),
+               SUM(event_type = {events.ALLIANCE}),
+               0,
+               0,
+               SUM(CASE WHEN event_type = {events.TRIBUTE} THEN value ELSE 0 END),
+               NULL
+        FROM season_events WHERE country2_id IS NOT NULL
+        GROUP BY country2_id
+    )
+    INSERT OR REPLACE INTO season_rollups (season_id, country_id, {', '.join(ROLLUP_COLUMNS)})
+    SELECT :season_id, a.country_id,
+           {', '.join(f'COALESCE(SUM(p.{column}), 0)' for column in ROLLUP_COLUMNS[:-1])},
+           MAX(a.level, COALESCE(MAX(p.peak_level), 1))
+    FROM army a
+    LEFT JOIN per_country p ON p.country_id = a.country_id
+    GROUP BY a.country_id
+'''
+
+HISTORY_SQL = f'''
+    SELECT r.season_id, s.start_time, s.end_time, s.winner_country_id, {', '.join(f'r.{c}' for c in ROLLUP_COLUMNS)}
+    FROM season_rollups r
+    JOIN seasons s ON s.id = r.season_id
+    WHERE r.country_id = ?
+    ORDER BY r.season_id DESC
+    LIMIT ?
+'''
+
+
+def create_rollups_table(cursor):
+    cursor.execute(f'''
+        CREATE TABLE IF NOT EXISTS season_rollups (
+            country_id INTEGER NOT NULL,
+            season_id INTEGER NOT NULL,
+            {' '.join(f'{column} INTEGER NOT NULL DEFAULT 0,' for column in ROLLUP_COLUMNS)}
+            PRIMARY KEY (country_id, season_id),
+            FOREIGN KEY (country_id) REFERENCES countries(id),
+            FOREIGN KEY (season_id) REFERENCES seasons(id)
+        ) WITHOUT ROWID
+    ''')
+
+
+def attach(conn, path=ARCHIVE_PATH):
+    """Attach the archive database to conn as `archive` and create its tables
+
+    ATTACH is not allowed inside a transaction, so call this right after
+    connecting.
+    """
+    conn.execute('ATTACH DATABASE ? AS archive', (path,))
+    for pragma in ARCHIVE_PRAGMAS:
+        conn.execute(pragma)
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS archive.events (
+            archived_season INTEGER NOT NULL,
+            id INTEGER NOT NULL,
+            event_type INTEGER NOT NULL,
+            outcome INTEGER,
+            country1_id INTEGER,
+            country2_id INTEGER,
+            value INTEGER,
+            timestamp INTEGER,
+            season_id INTEGER,
+            PRIMARY KEY (archived_season, id)
+        ) WITHOUT ROWID
+    ''')
+    # A re-formed alliance reuses its live row, so its id can be archived in several seasons
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS archive.alliances (
+            archived_season INTEGER NOT NULL,
+            id INTEGER NOT NULL,
+            country1_id INTEGER NOT NULL,
+            country2_id INTEGER NOT NULL,
+            start_date INTEGER,
+            end_date INTEGER,
+            broken_by INTEGER,
+            PRIMARY KEY (archived_season, id)
+        ) WITHOUT ROWID
+    ''')
+
+
+def rollup(cursor, season_id):
+    """Write season_id's per-country summary; run before the army is reset"""
+    cursor.execute(ROLLUP_SQL, {'season_id': season_id})
+
+
+def archive_season(cursor, season_id):
+    """Copy season_id's events (and those outside any season) and all ended alliances to the archive"""
+    cursor.execute('''
+        INSERT OR IGNORE INTO archive.events
+        SELECT ?, id, event_type, outcome, country1_id, country2_id, value, timestamp, season_id
+        FROM main.events WHERE season_id = ? OR season_id IS NULL
+    ''', (season_id, season_id))
+    cursor.execute('''
+        INSERT OR IGNORE INTO archive.alliances
+        SELECT ?, id, country1_id, country2_id, start_date, end_date, broken_by
+        FROM main.alliances WHERE end_date IS NOT NULL
+    ''', (season_id,))
+
+
+def purge_season(cursor, season_id):
+    """Delete the live rows archived with season_id; run after archive_season has committed"""
+    cursor.execute('''
+        DELETE FROM main.events
+        WHERE (season_id = ? OR season_id IS NULL)
+          AND id IN (SELECT id FROM archive.events WHERE archived_season = ?)
+    ''', (season_id, season_id))
+    cursor.execute('''
+        DELETE FROM main.alliances
+        WHERE end_date IS NOT NULL
+          AND id IN (SELECT id FROM archive.alliances WHERE archived_season = ?)
+    ''', (season_id,))
+
+
+def close_season(cursor, season_id):
+    """Roll up a finished season and copy it to the archive; purge_season it after the commit"""
+    rollup(cursor, season_id)
+    archive_season(cursor, season_id)
+
+
+def history(cursor, country_id, limit=10):
+    """A country's past seasons, newest first, from the rollups"""
+    cursor.execute(HISTORY_SQL, (country_id, limit))
+    return [dict(row) for row in cursor.fetchall()]
@@ -0,0 +1,115 @@
+import sqlite3
+import threading
+
+import pytest
+
+import ledger
+from timeutil import NOW_SQL
+
+ALL = {'gold': 0, 'iron': 0, 'stone': 0, 'food': 0}
+
+
+def connect(path):
+    conn = sqlite3.connect(path, timeout=10, isolation_level=None)
+    conn.execute('PRAGMA journal_mode = WAL')
+    return conn
+
+
+@pytest.fixture
+def db(tmp_path):
+    path = str(tmp_path / 'ledger.db')
+    conn = connect(path)
+    conn.execute('CREATE TABLE countries (id INTEGER PRIMARY KEY, is_ai_controlled BOOLEAN)')
+    conn.execute('''
+        CREATE TABLE resources (
+            country_id INTEGER PRIMARY KEY,
+            gold INTEGER, iron INTEGER, stone INTEGER, food INTEGER,
+            last_collected INTEGER
+        )
+    ''')
+    for country_id, gold in ((1, 1000), (2, 0), (3, 300)):
+        conn.execute('INSERT INTO countries VALUES (?, FALSE)', (country_id,))
+        # Collected just now, so no production accrues during the test
+        conn.execute(f'INSERT INTO resources VALUES (?, ?, 0, 0, 0, {NOW_SQL})', (country_id, gold))
+    conn.close()
+    return path
+
+
+def gold(path, country_id):
+    conn = connect(path)
+    try:
+        return conn.execute('SELECT gold FROM resources WHERE country_id = ?', (country_id,)).fetchone()[0]
+    finally:
+        conn.close()
+
+
+def test_debit_is_all_or_nothing(db):
+    conn = connect(db)
+    assert ledger.debit(conn.cursor(), 3, {'gold': 200})
+    assert not ledger.debit(conn.cursor(), 3, {'gold': 200})
+    assert not ledger.debit(conn.cursor(), 3, dict(ALL, gold=50, iron=1))
+    assert gold(db, 3) == 100
+
+
+def test_concurrent_debits_never_overspend(db):
+    successes = []
+    start = threading.Barrier(20)
+
+    def spend():
+        conn = connect(db)
+        start.wait()
+        successes.append(ledger.debit(conn.cursor(), 1, {'gold': 100}))
+        conn.close()
+
+    threads = [threading.Thread(target=spend) for _ in range(20)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert successes.count(True) == 10
+    assert gold(db, 1) == 0
+
+
+def test_transfer_many_applies_every_transfer(db):
+    conn = connect(db)
+    assert ledger.transfer_many(conn.cursor(), [(1, 2, {'gold': 400}), (3, 2, {'gold': 100})])
+    assert [gold(db, c) for c in (1, 2, 3)] == [600, 500, 200]
+
+
+def test_transfer_many_needs_only_net_cover(db):
+    conn = connect(db)
+    # Country 2 has no gold but receives more than it sends
+    assert ledger.transfer_many(conn.cursor(), [(2, 3, {'gold': 500}), (1, 2, {'gold': 800})])
+    assert [gold(db, c) for c in (1, 2, 3)] == [200, 300, 800]
+
+
+def test_transfer_many_rolls_back_on_shortfall(db):
+    conn = connect(db)
+    assert not ledger.transfer_many(conn.cursor(), [(1, 2, {'gold': 100}), (3, 2, {'gold': 301})])
+    assert [gold(db, c) for c in (1, 2, 3)] == [1000, 0, 300]
+
+
+def test_transfer_many_rolls_back_on_missing_country(db):
+    conn = connect(db)
+    assert not ledger.transfer_many(conn.cursor(), [(1, 2, {'gold': 100}), (1, 99, {'gold': 100})])
+    assert [gold(db, c) for c in (1, 2)] == [1000, 0]
+
+
+def test_concurrent_transfers_keep_the_total(db):
+    start = threading.Barrier(10)
+    results = []
+
+    def move(sender, receiver):
+        conn = connect(db)
+        start.wait()
+        if ledger.transfer(conn.cursor(), sender, receiver, {'gold': 250}):
+            results.append(250 if sender == 3 else -250)
+        conn.close()
+
+    threads = [threading.Thread(target=move, args=((1, 3) if i % 2 else (3, 1))) for i in range(10)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert gold(db, 1) == 1000 + sum(results)
+    assert gold(db, 1) + gold(db, 3) == 1300
@@ -0,0 +1,103 @@
+import pytest
+
+from router import MARKER, MAX_DATA, CallbackRouter
+
+
+class Call:
+    def __init__(self, data):
+        self.data = data
+
+
+@pytest.fixture
+def router():
+    router = CallbackRouter()
+    router.define('main_menu')
+    router.define('select', str)
+    router.define('assign_country', int)
+    router.define('alliance_break', int, int)
+    return router
+
+
+def test_encode_is_compact(router):
+    data = router.encode('main_menu')
+    assert data.startswith(MARKER)
+    assert len(data) <= 4
+
+
+@pytest.mark.parametrize('name, args', [
+    ('main_menu', ()),
+    ('assign_country', (0,)),
+    ('assign_country', (7,)),
+    ('alliance_break', (12345, 2 ** 40)),
+    ('select', ('پارس',)),
+    ('select', ('under_score name',)),
+])
+def test_round_trip(router, name, args):
+    route, decoded = router.resolve(router.encode(name, *args))
+    assert route.name == name
+    assert decoded == args
+
+
+def test_legacy_data_still_routes(router):
+    assert router.resolve('main_menu')[0].name == 'main_menu'
+    route, args = router.resolve('select_Persia')
+    assert (route.name, args) == ('select', ('Persia',))
+    # A str parameter keeps the underscores of the rest of the data
+    assert router.resolve('select_New_Rome')[1] == ('New_Rome',)
+    route, args = router.resolve('alliance_break_3_4')
+    assert (route.name, args) == ('alliance_break', (3, 4))
+    assert router.resolve('assign_country_12')[1] == (12,)
+
+
+@pytest.mark.parametrize('data', ['', 'unknown', 'assign_country_x', 'alliance_break_3', MARKER + '!!', MARKER])
+def test_unknown_data_resolves_to_none(router, data):
+    assert router.resolve(data) == (None, ())
+
+
+def test_encode_checks_arguments(router):
+    with pytest.raises(TypeError):
+        router.encode('assign_country')
+    with pytest.raises(ValueError):
+        router.encode('assign_country', -1)
+    with pytest.raises(ValueError):
+        router.encode('select', 'x' * MAX_DATA)
+
+
+def test_codes_are_stable():
+    assert CallbackRouter().define('main_menu').code == CallbackRouter().define('main_menu').code
+
+
+def test_code_collision_is_reported(router):
+    existing = router.resolve('main_menu')[0]
+    clash = next(
+        name for name in (f'route_{i}' for i in range(200000))
+        if CallbackRouter().define(name).code == existing.code
+    )
+    with pytest.raises(ValueError):
+        router.define(clash)
+
+
+def test_dispatch_calls_handler_and_counts(router):
+    seen = []
+
+    @router.route('view', int, read_only=True)
+    def view(call, item):
+        seen.append(item)
+
+    @router.route('boom')
+    def boom(call):
+        raise RuntimeError('boom')
+
+    assert router.dispatch(Call(router.encode('view', 5)))
+    assert router.dispatch(Call('view_6'))
+    assert seen == [5, 6]
+    with pytest.raises(RuntimeError):
+        router.dispatch(Call(router.encode('boom')))
+    # Defined without a handler, or unknown: not dispatched
+    assert not router.dispatch(Call(router.encode('main_menu')))
+    assert not router.dispatch(Call('nothing'))
+
+    stats = router.stats()
+    assert stats['view']['calls'] == 2 and stats['view']['failures'] == 0
+    assert stats['boom'] == dict(stats['boom'], calls=1, failures=1)
+    assert 'main_menu' not in stats
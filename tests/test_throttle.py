@@ -0,0 +1,79 @@
+import threading
+
+from throttle import Coalescer, RateLimiter
+
+MESSAGE = (1, 100)  # (user id, message id)
+
+
+def render(screens, screen):
+    screens.append(screen)
+    return screen
+
+
+def test_repeated_tap_is_coalesced():
+    coalescer = Coalescer(window=60)
+    screens = []
+    assert coalescer.run(MESSAGE, 'main_menu', render, screens, 'menu') == ('menu', False)
+    assert coalescer.run(MESSAGE, 'main_menu', render, screens, 'menu') == ('menu', True)
+    assert screens == ['menu']
+
+
+def test_a_b_a_renders_every_screen():
+    coalescer = Coalescer(window=60)
+    screens = []
+    for data, screen in [('main_menu', 'menu'), ('view_countries', 'countries'), ('main_menu', 'menu')]:
+        _, coalesced = coalescer.run(MESSAGE, data, render, screens, screen)
+        assert not coalesced
+    assert screens == ['menu', 'countries', 'menu']
+
+
+def test_forget_after_other_edit():
+    coalescer = Coalescer(window=60)
+    screens = []
+    coalescer.run(MESSAGE, 'main_menu', render, screens, 'menu')
+    coalescer.forget(MESSAGE)  # e.g. collect_resources edited the message
+    _, coalesced = coalescer.run(MESSAGE, 'main_menu', render, screens, 'menu')
+    assert not coalesced
+    assert screens == ['menu', 'menu']
+
+
+def test_in_flight_tap_waits_for_leader():
+    coalescer = Coalescer(window=60)
+    started, release = threading.Event(), threading.Event()
+    results = []
+
+    def slow():
+        started.set()
+        release.wait(5)
+        return 'menu'
+
+    leader = threading.Thread(target=lambda: results.append(coalescer.run(MESSAGE, 'main_menu', slow)))
+    leader.start()
+    started.wait(5)
+    follower = threading.Thread(target=lambda: results.append(coalescer.run(MESSAGE, 'main_menu', slow)))
+    follower.start()
+    release.set()
+    leader.join(5)
+    follower.join(5)
+    assert sorted(results) == [('menu', False), ('menu', True)]
+
+
+def test_failed_leader_is_retried():
+    coalescer = Coalescer(window=60)
+
+    def fail():
+        raise RuntimeError('boom')
+
+    try:
+        coalescer.run(MESSAGE, 'main_menu', fail)
+    except RuntimeError:
+        pass
+    assert coalescer.run(MESSAGE, 'main_menu', lambda: 'menu') == ('menu', False)
+
+
+def test_rate_limiter_burst():
+    limiter = RateLimiter(rate=0.001, burst=2)
+    assert limiter.allow('user')
+    assert limiter.allow('user')
+    assert not limiter.allow('user')
+    assert limiter.allow('other')
@@ -0,0 +1,107 @@
+"""Per-user rate limiting and coalescing of repeated taps.
+
+RateLimiter is a token bucket per key: `rate` tokens per second up to
+`burst`, one token per action. Coalescer runs a function once for a burst
+of identical requests: a request that matches the one in flight for its
+key, or the one that finished there less than `window` seconds ago, gets
+the leader's result instead of running again. Only the latest request per
+key is remembered, so A, B, A runs all three. Use it only for read-only
+work, where repeating adds nothing, and forget() a key when something else
+changes what it would produce.
+"""
+import threading
+import time
+from concurrent.futures import Future
+
+RATE = 1.0          # tokens per second
+BURST = 5
+COALESCE_WINDOW = 2.0  # seconds
+MAX_KEYS = 10000    # entries kept before idle ones are dropped
+
+
+class RateLimiter:
+    """Token bucket per key"""
+
+    def __init__(self, rate=RATE, burst=BURST, max_keys=MAX_KEYS):
+        self.rate = rate
+        self.burst = burst
+        self.max_keys = max_keys
+        self._buckets = {}  # key -> (tokens, last refill)
+        self._lock = threading.Lock()
+        self.rejected = 0
+
+    def allow(self, key, cost=1):
+        """Take cost tokens from key's bucket; False (and nothing taken) if it has too few"""
+        now = time.monotonic()
+        with self._lock:
+            tokens, last = self._buckets.get(key, (self.burst, now))
+            tokens = min(self.burst, tokens + (now - last) * self.rate)
+            allowed = tokens >= cost
+            if allowed:
+                tokens -= cost
+            else:
+                self.rejected += 1
+            self._buckets[key] = (tokens, now)
+            if len(self._buckets) > self.max_keys:
+                self._drop_full(now)
+            return allowed
+
+    def _drop_full(self, now):
+        # A bucket that has refilled completely is the same as no bucket
+        refill = self.burst / self.rate
+        self._buckets = {
+            key: (tokens, last) for key, (tokens, last) in self._buckets.items()
+            if now - last < refill
+        }
+
+
+class Coalescer:
+    """Single execution for identical back-to-back requests per key"""
+
+    def __init__(self, window=COALESCE_WINDOW, max_keys=MAX_KEYS):
+        self.window = window
+        self.max_keys = max_keys
+        self._entries = {}  # key -> (request, future, finished_at or None)
+        self._lock = threading.Lock()
+        self.coalesced = 0
+
+    def run(self, key, request, fn, *args):
+        """Return (result, coalesced): fn(*args), or the result of the same request just run for key"""
+        now = time.monotonic()
+        with self._lock:
+            last, future, finished = self._entries.get(key, (None, None, None))
+            leader = (future is None or last != request
+                      or (finished is not None and now - finished >= self.window))
+            if leader:
+                future = Future()
+                self._entries[key] = (request, future, None)
+                if len(self._entries) > self.max_keys:
+                    self._drop_expired(now)
+            else:
+                self.coalesced += 1
+        if not leader:
+            return future.result(), True
+
+        try:
+            future.set_result(fn(*args))
+        except Exception as e:
+            future.set_exception(e)
+        with self._lock:
+            # A later, different request for key may have replaced this entry
+            if self._entries.get(key, (None, None, None))[1] is future:
+                if future.exception() is None:
+                    self._entries[key] = (request, future, time.monotonic())
+                else:
+                    del self._entries[key]  # let the next request try again
+        return future.result(), False
+
+    def forget(self, key):
+        """Stop reusing key's last result, e.g. after another path changed it"""
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def _drop_expired(self, now):
+        self._entries = {
+            key: (request, future, finished) for key, (request, future, finished) in self._entries.items()
+            if finished is None or now - finished < self.window
+        }
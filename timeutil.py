@@ -0,0 +1,42 @@
+"""Time helpers.
+
+Every timestamp in the database is an integer Unix epoch (UTC seconds), so
+range predicates are integer comparisons and nothing parses dates per row.
+"""
+import time
+from datetime import datetime, timezone
+
+MINUTE = 60
+HOUR = 60 * MINUTE
+DAY = 24 * HOUR
+
+# SQL expression for the current epoch second (SQLite)
+NOW_SQL = "CAST(strftime('%s', 'now') AS INTEGER)"
+
+
+def now():
+    """Current epoch second"""
+    return int(time.time())
+
+
+def ago_sql(seconds):
+    """SQL expression for the epoch second `seconds` ago"""
+    return f"({NOW_SQL} - {int(seconds)})"
+
+
+def to_datetime(epoch):
+    """Aware UTC datetime for an epoch second, or None"""
+    if epoch is None:
+        return None
+    return datetime.fromtimestamp(int(epoch), tz=timezone.utc)
+
+
+def format_epoch(epoch, fmt='%Y-%m-%d %H:%M'):
+    """Format an epoch second for display ('' for None)"""
+    moment = to_datetime(epoch)
+    return moment.strftime(fmt) if moment else ''
+
+
+def text_to_epoch_sql(column):
+    """SQL expression converting a legacy text timestamp column to epoch seconds (SQLite)"""
+    return f"CASE WHEN typeof({column}) = 'text' THEN CAST(strftime('%s', {column}) AS INTEGER) ELSE {column} END"
@@ -0,0 +1,171 @@
+"""Single-writer queue for SQLite mutations.
+
+One thread owns the only write connection. Mutations are submitted as
+commands and run on that thread; whatever is queued when the writer wakes
+up is group-committed in one transaction, each command inside its own
+SAVEPOINT so a failing command is rolled back alone. Callers get a Future
+that resolves once the transaction holding their command has committed.
+
+A command is a function called as fn(*args, conn=write_conn, **kwargs). It
+must not commit; it can register work to run after the commit (cache
+bumps, notifications) with after_commit().
+"""
+import logging
+import queue
+import threading
+from concurrent.futures import Future
+
+logger = logging.getLogger(__name__)
+
+# Most commands folded into one transaction
+MAX_BATCH = 64
+
+_STOP = object()
+
+
+class WriteQueue:
+    """Dedicated writer thread with group commit"""
+
+    def __init__(self, connect, name='db-writer', max_batch=MAX_BATCH):
+        self._connect = connect
+        self.name = name
+        self.max_batch = max_batch
+        self._queue = queue.Queue()
+        self._thread = None
+        self._start_lock = threading.Lock()
+        self._rollback_listeners = []
+        self._pending_hooks = None  # after_commit hooks of the running command
+        self.batches = 0
+        self.commands = 0
+
+    # ---- caller side ----
+
+    def submit(self, fn, *args, **kwargs):
+        """Queue fn to run on the writer; returns a Future of its result"""
+        if self.in_writer():
+            # Already inside a command: run inline, in the same transaction
+            future = Future()
+            try:
+                future.set_result(fn(*args, conn=self._conn, **kwargs))
+            except Exception as e:
+                future.set_exception(e)
+            return future
+        return self.defer(fn, *args, **kwargs)
+
+    def defer(self, fn, *args, **kwargs):
+        """Queue fn for a later transaction, even from inside a command; returns a Future"""
+        self._ensure_started()
+        future = Future()
+        self._queue.put((fn, args, kwargs, future))
+        return future
+
+    def call(self, fn, *args, **kwargs):
+        """Run fn on the writer and wait for it to commit"""
+        return self.submit(fn, *args, **kwargs).result()
+
+    def in_writer(self):
+        return threading.current_thread() is self._thread
+
+    def after_commit(self, callback, *args):
+        """Run callback(*args) once the current command has committed
+
+        Outside the writer thread the caller owns the transaction, so the
+        callback runs immediately.
+        """
+        if self.in_writer() and self._pending_hooks is not None:
+            self._pending_hooks.append((callback, args))
+        else:
+            callback(*args)
+
+    def on_rollback(self, listener):
+        """Call listener(write_conn) whenever a command or a batch is rolled back"""
+        self._rollback_listeners.append(listener)
+
+    def close(self, timeout=None):
+        """Finish queued commands and stop the writer thread"""
+        if self._thread is not None:
+            self._queue.put(_STOP)
+            self._thread.join(timeout)
+            self._thread = None
+
+    # ---- writer side ----
+
+    def _ensure_started(self):
+        with self._start_lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name=self.name, daemon=True)
+                self._thread.start()
+
+    def _run(self):
+        self._conn = self._connect()
+        self._conn.isolation_level = None  # transactions are managed explicitly
+        try:
+            while True:
+                batch = [self._queue.get()]
+                while len(batch) < self.max_batch:
+                    try:
+                        batch.append(self._queue.get_nowait())
+                    except queue.Empty:
+                        break
+                stop = _STOP in batch
+                batch = [command for command in batch if command is not _STOP]
+                if batch:
+                    self._run_batch(batch)
+                if stop:
+                    break
+        finally:
+            # database.PersistentConnection only really closes on shutdown()
+            getattr(self._conn, 'shutdown', self._conn.close)()
+
+    def _run_batch(self, batch):
+        conn = self._conn
+        outcomes = []  # (future, result, exception, hooks)
+        try:
+            conn.execute('BEGIN IMMEDIATE')
+            for fn, args, kwargs, future in batch:
+                if not future.set_running_or_notify_cancel():
+                    continue
+                self._pending_hooks = []
+                conn.execute('SAVEPOINT command')
+                try:
+                    result = fn(*args, conn=conn, **kwargs)
+                except Exception as e:
+                    conn.execute('ROLLBACK TO command')
+                    conn.execute('RELEASE command')
+                    self._notify_rollback(conn)
+                    outcomes.append((future, None, e, []))
+                else:
+                    conn.execute('RELEASE command')
+                    outcomes.append((future, result, None, self._pending_hooks))
+                finally:
+                    self._pending_hooks = None
+            conn.execute('COMMIT')
+        except Exception as e:
+            logger.exception("Write batch failed, rolling back %d command(s)", len(batch))
+            if conn.in_transaction:
+                conn.execute('ROLLBACK')
+            self._notify_rollback(conn)
+            for fn, args, kwargs, future in batch:
+                if not future.done():
+                    future.set_exception(e)
+            return
+
+        self.batches += 1
+        self.commands += len(outcomes)
+        for future, result, error, hooks in outcomes:
+            for callback, args in hooks:
+                try:
+                    callback(*args)
+                except Exception:
+                    logger.exception("after_commit hook failed")
+            if error is not None:
+                future.set_exception(error)
+            else:
+                future.set_result(result)
+
+    def _notify_rollback(self, conn):
+        for listener in self._rollback_listeners:
+            try:
+                listener(conn)
+            except Exception:
+                logger.exception("Rollback listener failed")